@@ -1,36 +1,51 @@
-import math
+import numpy as np
 import pandas as pd
-import config
+import storage
 
-def rms(series: pd.Series) -> float | None:
-    s = pd.to_numeric(series, errors="coerce").dropna().astype(float)
-    if len(s) == 0:
-        return None
-    return math.sqrt((s * s).mean())
+PRICE_QUANTILES = {"p25_price": 0.25, "median_price": 0.5, "p75_price": 0.75}
 
-def main():
-    ideas = pd.read_excel(config.INPUT_XLSX)
-    offers = pd.read_excel(config.OUTPUT_OFFERS_XLSX)
-
-    offers["offer_price_rub"] = pd.to_numeric(offers["offer_price_rub"], errors="coerce")
-    offers["offer_delivery_days"] = pd.to_numeric(offers["offer_delivery_days"], errors="coerce")
+def compute_stats(offers: pd.DataFrame) -> pd.DataFrame:
+    """
+    Статистика по idea_id за один групповой проход: все агрегаты, включая RMS
+    (корень из среднего квадрата), перцентили и std, считаются векторно.
+    """
+    price = pd.to_numeric(offers["offer_price_rub"], errors="coerce").astype(float)
+    frame = pd.DataFrame({
+        "idea_id": offers["idea_id"],
+        "price": price,
+        "price_sq": price * price,
+        "delivery": pd.to_numeric(offers["offer_delivery_days"], errors="coerce"),
+    })
 
-    g = offers.groupby("idea_id", dropna=False)
+    g = frame.groupby("idea_id", dropna=False, sort=True)
 
     stats = g.agg(
-        offers_count=("offer_price_rub", lambda x: int(pd.to_numeric(x, errors="coerce").dropna().shape[0])),
-        min_price=("offer_price_rub", "min"),
-        max_price=("offer_price_rub", "max"),
-        mean_price=("offer_price_rub", "mean"),
-        min_delivery_days=("offer_delivery_days", "min"),
-        max_delivery_days=("offer_delivery_days", "max"),
-    ).reset_index()
-
-    stats["rms_price"] = stats["idea_id"].apply(
-        lambda iid: rms(offers.loc[offers["idea_id"] == iid, "offer_price_rub"])
+        offers_count=("price", "count"),
+        min_price=("price", "min"),
+        max_price=("price", "max"),
+        mean_price=("price", "mean"),
+        std_price=("price", "std"),
+        mean_price_sq=("price_sq", "mean"),
+        min_delivery_days=("delivery", "min"),
+        max_delivery_days=("delivery", "max"),
     )
+    stats["rms_price"] = np.sqrt(stats.pop("mean_price_sq"))
+
+    q = g["price"].quantile(list(PRICE_QUANTILES.values())).unstack()
+    q.columns = list(PRICE_QUANTILES.keys())
+    stats = stats.join(q)
+
+    return stats.reset_index()
 
-    out = ideas.merge(stats, on="idea_id", how="left")
+def with_profit(ideas: pd.DataFrame, stats: pd.DataFrame) -> pd.DataFrame:
+    if "crawl_id" in ideas.columns:
+        # обходили только представителей кластеров dedup.py: раздаём их статистику всем идеям
+        key = ideas["crawl_id"].fillna(ideas["idea_id"])
+        out = ideas.assign(_crawl_id=key).merge(
+            stats.rename(columns={"idea_id": "_crawl_id"}), on="_crawl_id", how="left"
+        ).drop(columns="_crawl_id")
+    else:
+        out = ideas.merge(stats, on="idea_id", how="left")
 
     # прибыль (как "цена - себестоимость")
     out["material_cost_rub"] = pd.to_numeric(out["material_cost_rub"], errors="coerce")
@@ -38,9 +53,16 @@ def main():
     out["profit_min"] = out["min_price"] - out["material_cost_rub"]
     out["profit_rms"] = out["rms_price"] - out["material_cost_rub"]
     out["profit_max"] = out["max_price"] - out["material_cost_rub"]
+    return out
+
+def main():
+    ideas = storage.read_table("ideas")
+    offers = storage.read_table("offers", columns=["idea_id", "offer_price_rub", "offer_delivery_days"])
+
+    out = with_profit(ideas, compute_stats(offers))
 
-    out.to_excel(config.OUTPUT_STATS_XLSX, index=False)
-    print(f"Saved {config.OUTPUT_STATS_XLSX}")
+    path = storage.write_table(out, "stats")
+    print(f"Saved {path}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,82 @@
+import math
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from aggregate import compute_stats
+
+# Бенчмарк статистики aggregate на синтетических офферах:
+#   python bench_aggregate.py --rows 1000000 --ideas 2000 --legacy
+
+
+def synthetic_offers(rows: int, ideas: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    price = rng.lognormal(mean=6.5, sigma=0.6, size=rows).round()
+    price[rng.random(rows) < 0.05] = np.nan  # карточки без "Есть дешевле"
+    return pd.DataFrame({
+        "idea_id": rng.integers(1, ideas + 1, size=rows),
+        "offer_price_rub": price,
+        "offer_delivery_days": rng.integers(0, 15, size=rows).astype(float),
+    })
+
+
+def rms(series: pd.Series) -> float | None:
+    s = pd.to_numeric(series, errors="coerce").dropna().astype(float)
+    if len(s) == 0:
+        return None
+    return math.sqrt((s * s).mean())
+
+
+def legacy_stats(offers: pd.DataFrame) -> pd.DataFrame:
+    """Прежний aggregate.main: RMS пересканирует весь фрейм на каждую идею."""
+    offers = offers.copy()
+    offers["offer_price_rub"] = pd.to_numeric(offers["offer_price_rub"], errors="coerce")
+    offers["offer_delivery_days"] = pd.to_numeric(offers["offer_delivery_days"], errors="coerce")
+    g = offers.groupby("idea_id", dropna=False)
+    stats = g.agg(
+        offers_count=("offer_price_rub", lambda x: int(pd.to_numeric(x, errors="coerce").dropna().shape[0])),
+        min_price=("offer_price_rub", "min"),
+        max_price=("offer_price_rub", "max"),
+        mean_price=("offer_price_rub", "mean"),
+        min_delivery_days=("offer_delivery_days", "min"),
+        max_delivery_days=("offer_delivery_days", "max"),
+    ).reset_index()
+    stats["rms_price"] = stats["idea_id"].apply(
+        lambda iid: rms(offers.loc[offers["idea_id"] == iid, "offer_price_rub"])
+    )
+    return stats
+
+
+def timed(fn, *args):
+    t = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=1_000_000)
+    ap.add_argument("--ideas", type=int, default=2000)
+    ap.add_argument("--legacy", action="store_true", help="замерить и прежнюю реализацию (минуты на 10^6 строк)")
+    args = ap.parse_args()
+
+    offers = synthetic_offers(args.rows, args.ideas)
+    print(f"rows={args.rows} ideas={args.ideas}")
+
+    stats, dt = timed(compute_stats, offers)
+    print(f"compute_stats: {dt:.3f}s ({args.rows / dt:,.0f} rows/s)")
+
+    if args.legacy:
+        old, dt_old = timed(legacy_stats, offers)
+        print(f"legacy:        {dt_old:.3f}s (x{dt_old / dt:.1f})")
+
+        merged = old.merge(stats, on="idea_id", suffixes=("_old", ""))
+        for col in ["offers_count", "min_price", "max_price", "mean_price", "rms_price"]:
+            diff = (merged[col + "_old"].astype(float) - merged[col].astype(float)).abs().max()
+            print(f"  max |{col} diff| = {diff:.6g}")
+
+
+if __name__ == "__main__":
+    main()
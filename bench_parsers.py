@@ -0,0 +1,221 @@
+import time
+import argparse
+import tracemalloc
+import subprocess
+import os
+from datetime import datetime
+
+from DrissionPage.common import make_session_ele
+
+import config
+import fixtures
+import ozon_parser
+import text_parsing
+from fixtures import FixtureServer
+
+# Бенчмарк разбора страниц на записанных fixtures (см. fixtures.py), без живого Ozon:
+#   python bench_parsers.py                       — разбор строк и HTML без браузера
+#   python bench_parsers.py --drission --playwright — те же страницы в браузере с локального сервера
+# Корректность text_parsing проверяет tests/test_text_parsing.py (без fixtures и сети).
+# Без записанных fixtures (fixtures/manifest.json) меряется только пакетный разбор строк.
+# Для каждой функции: задержка (mean/p50/p95), страниц в минуту и пик памяти на вызов
+# (tracemalloc, отдельным проходом — чтобы не искажать время). Результат дописывается
+# в config.BENCH_OUTPUT с хэшем коммита: так удобно сравнивать коммиты между собой.
+
+
+class Bench:
+    def __init__(self, repeat=3):
+        self.repeat = repeat
+        self.rows = []
+
+    def run(self, name, fn, inputs, per_page=True):
+        """fn(x) для каждого x из inputs, repeat раз; per_page — считать страницы в минуту."""
+        inputs = list(inputs)
+        if not inputs:
+            print(f"{name}: нет входных данных")
+            return
+
+        times = []
+        for _ in range(self.repeat):
+            for x in inputs:
+                t = time.perf_counter()
+                fn(x)
+                times.append(time.perf_counter() - t)
+
+        tracemalloc.start()
+        peaks = []
+        for x in inputs:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            fn(x)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+        tracemalloc.stop()
+
+        times.sort()
+        mean = sum(times) / len(times)
+        self.rows.append({
+            "name": name,
+            "calls": len(times),
+            "mean_ms": mean * 1000,
+            "p50_ms": times[len(times) // 2] * 1000,
+            "p95_ms": times[min(len(times) - 1, int(len(times) * 0.95))] * 1000,
+            "pages_min": 60 / mean if per_page and mean else None,
+            "alloc_kib": sum(peaks) / len(peaks) / 1024,
+        })
+
+    def report(self):
+        lines = [f"{'function':<42}{'calls':>7}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'pages/min':>11}{'alloc KiB':>11}"]
+        for r in self.rows:
+            ppm = f"{r['pages_min']:,.0f}" if r["pages_min"] else "-"
+            lines.append(f"{r['name']:<42}{r['calls']:>7}{r['mean_ms']:>10.3f}{r['p50_ms']:>10.3f}"
+                         f"{r['p95_ms']:>10.3f}{ppm:>11}{r['alloc_kib']:>11.1f}")
+        return "\n".join(lines)
+
+
+def git_rev():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "-"
+
+
+def sample_texts(modals):
+    """Сырые строки цены и доставки из карточек продавцов записанных модалок."""
+    prices, deliveries = [], []
+    for html in modals:
+        for card in make_session_ele(html).eles('css:div.pdp_mb0'):
+            price_div = card.ele('css:div.pdp_l9b', timeout=0)
+            if price_div:
+                prices.append(price_div.text)
+            del_ele = card.ele('text:Доставим', timeout=0)
+            if del_ele:
+                deliveries.append(del_ele.text)
+    return prices, deliveries
+
+
+# колонка для пакетного разбора, если fixtures не записаны
+SAMPLE_PRICES = ["1\u2009234 ₽", "12\xa0990\xa0₽", "990₽", "от 1 050 ₽ за шт.", "нет в наличии"]
+SAMPLE_DELIVERIES = ["Доставим сегодня", "Доставим завтра", "Доставим 2\xa0января", "Доставим 14 февраля"]
+
+
+def bench_text_batch(bench, prices, deliveries, rows):
+    """Построчный разбор против пакетного на колонке из rows строк."""
+    prices = prices or SAMPLE_PRICES
+    deliveries = deliveries or SAMPLE_DELIVERIES
+    prices = prices * (rows // len(prices) + 1)
+    deliveries = deliveries * (rows // len(deliveries) + 1)
+    prices, deliveries = prices[:rows], deliveries[:rows]
+
+    bench.run(f"parse_price_rub [loop x{rows}]",
+              lambda xs: [text_parsing.parse_price_rub(x) for x in xs], [prices], per_page=False)
+    bench.run(f"parse_prices [batch x{rows}]", text_parsing.parse_prices, [prices], per_page=False)
+    bench.run(f"delivery_days_from_text [loop x{rows}]",
+              lambda xs: [text_parsing.delivery_days_from_text(x) for x in xs], [deliveries], per_page=False)
+    bench.run(f"delivery_days [batch x{rows}]", text_parsing.delivery_days, [deliveries], per_page=False)
+
+
+def bench_offline(bench, searches, cards, modals, batch_rows=100_000):
+    prices, deliveries = sample_texts(modals)
+    bench.run("parse_price_rub", text_parsing.parse_price_rub, prices, per_page=False)
+    bench.run("delivery_days_from_text", text_parsing.delivery_days_from_text, deliveries, per_page=False)
+    bench_text_batch(bench, prices, deliveries, batch_rows)
+
+    bench.run("extract_product_urls [html]",
+              lambda h: ozon_parser.extract_product_urls(make_session_ele(h), config.TOP_N_PRODUCTS), searches)
+    bench.run("parse_seller_from_card [html]",
+              lambda h: ozon_parser.parse_seller_from_card(make_session_ele(h)), cards)
+    bench.run("card_from_html", ozon_parser.card_from_html, cards)
+    bench.run("offers_from_html", ozon_parser.offers_from_html, modals)
+    bench.run("collect_cheaper_offers [html]",
+              lambda h: ozon_parser.collect_cheaper_offers(make_session_ele(h)), modals)
+
+
+def bench_drission(bench, card_urls, modal_urls):
+    page = ozon_parser.get_page_instance()
+    try:
+        def load(url):
+            page.get(url)
+            ozon_parser.waits.wait_doc(page)
+
+        bench.run("drission: page.get [card]", load, card_urls)
+
+        def on_card(fn):
+            def call(url):
+                page.get(url)
+                return fn(page)
+            return call
+
+        # время загрузки вычитается при сравнении с "page.get [card]"
+        bench.run("drission: parse_seller_from_card", on_card(ozon_parser.parse_seller_from_card), card_urls)
+        bench.run("drission: parse_card_price", on_card(ozon_parser.parse_card_price), card_urls)
+        bench.run("drission: collect_cheaper_offers", on_card(ozon_parser.collect_cheaper_offers), modal_urls)
+    finally:
+        page.quit()
+
+
+def bench_playwright(bench, card_urls):
+    from playwright.sync_api import sync_playwright
+    import parser_ozon
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        page = browser.new_page()
+
+        def on_card(fn):
+            def call(url):
+                page.goto(url, wait_until="domcontentloaded")
+                return fn(page)
+            return call
+
+        bench.run("playwright: page.goto [card]", on_card(lambda pg: None), card_urls)
+        bench.run("playwright: extract_seller_default", on_card(parser_ozon.extract_seller_default), card_urls)
+        bench.run("playwright: extract_ozon_card_price", on_card(parser_ozon.extract_ozon_card_price), card_urls)
+        browser.close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dir", default=config.FIXTURES_DIR)
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--limit", type=int, default=50, help="не больше N страниц каждого вида")
+    ap.add_argument("--batch-rows", type=int, default=100_000, help="длина колонки для пакетного разбора строк")
+    ap.add_argument("--drission", action="store_true", help="и в DrissionPage с локального сервера")
+    ap.add_argument("--playwright", action="store_true", help="и в Playwright с локального сервера")
+    args = ap.parse_args()
+
+    bench = Bench(args.repeat)
+    recorded = os.path.exists(os.path.join(args.dir, fixtures.MANIFEST))
+    if recorded:
+        pages = {"search": [], "card": [], "modal": []}
+        for kind, url, html in fixtures.iter_fixtures(fixtures_dir=args.dir):
+            if kind in pages and len(pages[kind]) < args.limit:
+                pages[kind].append((url, html))
+        print("fixtures: " + " ".join(f"{k}={len(v)}" for k, v in pages.items()))
+        searches, cards, modals = [[h for _, h in pages[k]] for k in ("search", "card", "modal")]
+        bench_offline(bench, searches, cards, modals, args.batch_rows)
+    else:
+        print(f"fixtures: нет {os.path.join(args.dir, fixtures.MANIFEST)} (python fixtures.py record) — "
+              f"только пакетный разбор строк")
+        bench_text_batch(bench, [], [], args.batch_rows)
+
+    if recorded and (args.drission or args.playwright):
+        # в браузере без ожиданий по таймауту: "Показать ещё" на статичной странице не догрузит карточки
+        config.READY_TIMEOUT_SEC = 1
+        with FixtureServer(args.dir) as srv:
+            card_urls = [srv.url_for("card", u) for u, _ in pages["card"]]
+            modal_urls = [srv.url_for("modal", u) for u, _ in pages["modal"]]
+            if args.drission:
+                bench_drission(bench, card_urls, modal_urls)
+            if args.playwright:
+                bench_playwright(bench, card_urls)
+
+    out = bench.report()
+    print(out)
+    with open(config.BENCH_OUTPUT, "a", encoding="utf-8") as f:
+        f.write(f"== {git_rev()} {datetime.now():%Y-%m-%d %H:%M} repeat={args.repeat} ==\n{out}\n\n")
+    print(f"Saved {config.BENCH_OUTPUT}")
+
+
+if __name__ == "__main__":
+    main()
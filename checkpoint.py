@@ -0,0 +1,110 @@
+import os
+import glob
+import json
+import threading
+
+import config
+
+# Журнал обхода в JSONL: каждая строка — завершённый шаг.
+#   {"type": "search", "idea_id": 1, "product_urls": [...]}
+#   {"type": "card", "idea_id": 1, "product_url": "...", "rows": [...]}
+# После падения/капчи/Ctrl-C обход перечитывает журнал и пропускает сделанное.
+
+
+def shard_path(shard_idx):
+    root, ext = os.path.splitext(config.CHECKPOINT_JSONL)
+    return f"{root}.shard{shard_idx}{ext}"
+
+
+def all_paths():
+    root, ext = os.path.splitext(config.CHECKPOINT_JSONL)
+    return sorted(set(glob.glob(config.CHECKPOINT_JSONL) + glob.glob(f"{root}.shard*{ext}")))
+
+
+class Checkpoint:
+    """
+    path — файл, куда пишет этот процесс (None — только в памяти).
+    При открытии читаются все журналы обхода, включая журналы шардов,
+    поэтому продолжить можно и с другим числом --shards.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.searches = {}  # idea_id -> [product_url, ...]
+        self.cards = {}     # (idea_id, product_url) -> строки выгрузки
+        self.fh = None
+
+        if path:
+            for p in all_paths():
+                self._load(p)
+            self.fh = open(path, "a", encoding="utf-8")
+
+    def _load(self, path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # недописанная строка при аварийном завершении
+                if rec["type"] == "search":
+                    self.searches[rec["idea_id"]] = rec["product_urls"]
+                elif rec["type"] == "card":
+                    self.cards[(rec["idea_id"], rec["product_url"])] = rec["rows"]
+
+    def _write(self, rec):
+        if not self.fh:
+            return
+        self.fh.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        self.fh.flush()
+        os.fsync(self.fh.fileno())
+
+    def record_search(self, idea_id, product_urls):
+        with self.lock:
+            self.searches[idea_id] = product_urls
+            self._write({"type": "search", "idea_id": idea_id, "product_urls": product_urls})
+
+    def record_card(self, idea_id, product_url, rows):
+        with self.lock:
+            self.cards[(idea_id, product_url)] = rows
+            self._write({"type": "card", "idea_id": idea_id, "product_url": product_url, "rows": rows})
+
+    def missing(self, ideas):
+        """Незавершённое для ideas: ([idea_id без поиска], [(idea_id, product_url) без карточки])."""
+        searches, cards = [], []
+        for idea_id, _ in ideas:
+            if idea_id not in self.searches:
+                searches.append(idea_id)
+                continue
+            cards.extend((idea_id, u) for u in self.searches[idea_id] if (idea_id, u) not in self.cards)
+        return searches, cards
+
+    def close(self):
+        if self.fh:
+            self.fh.close()
+            self.fh = None
+
+
+def discard_all():
+    for p in all_paths():
+        os.remove(p)
+
+
+def discard_if_complete(ckpt, ideas):
+    """
+    Журнал удаляется, только если для всех ideas записаны и поиск, и все карточки.
+    Иначе (капча, Blocked, ошибка вкладки) он остаётся: следующий запуск доберёт пропуски.
+    """
+    searches, cards = ckpt.missing(ideas)
+    if not searches and not cards:
+        discard_all()
+        return True
+
+    print(f"Обход не завершён: без поиска {len(searches)} идей, без карточек {len(cards)} — журнал сохранён, следующий запуск доберёт пропуски (--restart — начать заново)")
+    if searches:
+        print(f"  идеи без поиска: {searches[:20]}{' ...' if len(searches) > 20 else ''}")
+    for idea_id, url in cards[:20]:
+        print(f"  [{idea_id}] {url}")
+    if len(cards) > 20:
+        print("  ...")
+    return False
@@ -12,4 +12,143 @@ IDEAS_PER_SEED = 20  # вы просили 20
 # Паузы/таймауты (можно подкрутить при блокировках/медленной сети)
 NAV_TIMEOUT_MS = 45000
 ACTION_TIMEOUT_MS = 15000
-SCROLL_PAUSE_SEC = 0.9
\ No newline at end of file
+SCROLL_PAUSE_SEC = 0.9
+
+# Параллельный обход (ozon_parser --concurrency N)
+CRAWL_CONCURRENCY = 1          # вкладок браузера; 1 = последовательный обход
+
+# parser_ozon / drission_page (выгрузка по артикулам)
+OUTPUT_XLSX = "output.xlsx"
+MAX_PRODUCTS_PER_QUERY = TOP_N_PRODUCTS
+
+# Асинхронный Playwright (parser_ozon_async)
+PLAYWRIGHT_PAGES = 8           # страниц одного контекста одновременно
+
+# Шардирование по процессам (ozon_parser --shards K)
+SHARD_PROFILES_DIR = "profiles"  # профили Chromium шардов: profiles/shard0, shard1, ...
+
+# Кэш страниц (page_cache.py): повторный разбор без браузера — ozon_parser --offline
+PAGE_CACHE_ENABLED = True
+PAGE_CACHE_DB = "page_cache.sqlite"
+PAGE_CACHE_TTL_SEC = {
+    "search": 6 * 3600,
+    "card": 12 * 3600,
+    "modal": 12 * 3600,   # снимок списка "Есть дешевле" после всех "Показать ещё"
+    "api": 6 * 3600,      # JSON composer-api (HTTP-режим), ключ — путь страницы
+}
+PAGE_CACHE_MAX_BYTES = 2 * 1024 ** 3   # LRU-вытеснение сверх лимита (сжатый размер)
+
+# Журнал обхода (checkpoint.py): продолжение после падения, xlsx — только в конце
+CHECKPOINT_JSONL = "crawl_checkpoint.jsonl"
+
+# Извлечение данных карточки: "dom" — селекторы по живой странице,
+# "state" — JSON состояния виджетов из одного снимка HTML (DOM-селекторы как запасной вариант)
+EXTRACT_MODE = "dom"
+
+# Прямые HTTP-запросы к composer-api (ozon_parser --http), браузер — только при проверке
+FETCH_MODE = "browser"              # "browser" | "http"
+HTTP_API_BASE_URL = ""              # пусто — BASE_URL; записанные ответы: python fixtures.py serve -> "http://127.0.0.1:8765/"
+COMPOSER_API_PATH = "/api/composer-api.bx/page/json/v2"
+SELLER_LIST_PATH = "/modal/otherOffersFromSellers?product_id={product_id}&page_changed=true"
+HTTP_SELLER_LIST_MAX_PAGES = 30
+HTTP_POOL_SIZE = 8
+HTTP_TIMEOUT_SEC = 20
+HTTP_CHALLENGE_COOLDOWN_SEC = 600   # после проверки HTTP-режим отдыхает, работает браузер
+
+# Фильтр ресурсов (resource_filter.py): страницы читаем как текст
+RESOURCE_FILTER_ENABLED = True
+BLOCK_RESOURCE_TYPES = ["image", "media", "font"]
+BLOCK_DOMAINS = [
+    "mc.yandex.ru", "an.yandex.ru", "top-fwz1.mail.ru", "ad.mail.ru",
+    "google-analytics.com", "googletagmanager.com", "doubleclick.net", "vk.com",
+]
+ALLOW_DOMAINS = ["ozon.ru", "ozone.ru", "ozonusercontent.com"]
+BLOCK_THIRD_PARTY_SCRIPTS = True    # только Playwright: CDP-шаблоны не различают тип ресурса
+RESOURCE_REPORT = False             # печатать экономию по каждой странице
+TYPICAL_RESOURCE_BYTES = {           # оценка размера незагруженного ресурса
+    "image": 40 * 1024,
+    "media": 800 * 1024,
+    "font": 50 * 1024,
+    "script": 60 * 1024,
+    "other": 10 * 1024,
+}
+
+# Ожидание готовности страниц (waits.py) вместо фиксированных пауз
+READY_TIMEOUT_SEC = 15
+READY_POLL_SEC = 0.25
+# Бюджет вежливости: минимум между переходами одной вкладки (+ случайная добавка)
+POLITENESS_MIN_INTERVAL_SEC = 2.0
+POLITENESS_JITTER_SEC = 1.5
+
+# Общий регулятор частоты (rate_governor.py): token bucket + AIMD + circuit breaker
+RATE_START_RPS = 0.5
+RATE_MIN_RPS = 0.05
+RATE_MAX_RPS = 3.0
+RATE_BURST = 3
+RATE_INCREASE_RPS = 0.02       # +к rate за каждый удачный запрос
+RATE_DECREASE_FACTOR = 0.5     # ×rate при проверке/капче
+RATE_ERROR_FACTOR = 0.8        # ×rate при сетевой ошибке
+BREAKER_THRESHOLD = 3          # проверок подряд до паузы всего обхода
+BREAKER_COOLDOWN_SEC = 300
+CHALLENGE_RETRIES = 2          # повторов страницы после проверки (ozon_parser)
+RATE_METRICS_JSON = "rate_metrics.json"
+RATE_SHARED_DB = "rate_governor.sqlite"  # общий бюджет для всех процессов машины; None — на процесс
+RATE_SHARED_IDLE_RESET_SEC = 600    # состояние старше (и breaker закрыт) — начинаем с RATE_START_RPS
+
+# Хранилище между этапами (storage.py)
+STORAGE_FORMAT = "parquet"      # "parquet" | "feather" | "xlsx" (старое поведение)
+DATA_DIR = "data"               # data/<таблица>/run_date=YYYY-MM-DD/part-0.parquet
+EXPORT_XLSX = ["stats"]         # какие таблицы дополнительно выгружать в xlsx
+
+# История цен по запускам (price_history.py)
+PRICE_HISTORY_ENABLED = True
+PRICE_HISTORY_DB = "price_history.sqlite"
+
+# Потоковый обход (pipeline.py)
+PIPELINE_SEARCH_WORKERS = 1     # вкладок на поиск
+PIPELINE_CARD_WORKERS = 2       # вкладок на карточки
+PIPELINE_QUEUE_SIZE = 16        # очередь ссылок между стадиями (backpressure)
+STATS_FLUSH_SEC = 30            # как часто переписывать частичный output_stats
+
+# Генерация идей (idea_generator.py)
+SEEDS_FILE = "seeds.csv"        # колонки seed, material_cost_rub (.csv/.xlsx) или .txt по строке
+LLM_CONCURRENCY = 8             # запросов к модели одновременно
+LLM_CACHE_DB = "llm_cache.sqlite"
+LLM_MAX_RETRIES = 5
+LLM_BACKOFF_SEC = 2.0
+
+# Склейка похожих запросов (dedup.py)
+DEDUP_ENABLED = True
+DEDUP_THRESHOLD = 0.7           # Jaccard символьных 3-грамм нормализованных запросов
+DEDUP_NUM_PERM = 64             # длина MinHash-подписи
+DEDUP_BANDS = 16                # LSH-полос (по DEDUP_NUM_PERM // DEDUP_BANDS значений)
+
+# Записанные страницы и бенчмарк разбора (fixtures.py, bench_parsers.py)
+FIXTURES_DIR = "fixtures"
+FIXTURES_PORT = 8765
+BENCH_OUTPUT = "bench_output.txt"
+
+# "Есть дешевле": когда перестать листать "Показать ещё" (None — без ограничения)
+OFFERS_MAX_PER_PRODUCT = None   # не больше N офферов с карточки
+OFFERS_PRICE_CEILING_RUB = None # дороже не берём; список отсортирован по цене, дальше не листаем
+
+# Снимок сессии с выбранным ПВЗ (session_store.py): куки DrissionPage / storage_state Playwright
+SESSION_REUSE = True            # False — всегда проходить set_pvz заново
+SESSION_DIR = "sessions"
+SESSION_TTL_SEC = 12 * 3600     # старше — set_pvz и новый снимок
+
+# Резидентный обходчик с локальным API (crawler_daemon.py)
+DAEMON_HOST = "127.0.0.1"
+DAEMON_PORT = 8766
+DAEMON_TABS = 3                 # прогретых вкладок; столько карточек разбирается одновременно
+
+# Очередь заданий для нескольких воркеров одной машины (work_queue.py, ozon_parser --worker)
+QUEUE_URL = "sqlite:///work_queue.sqlite"
+QUEUE_LEASE_SEC = 600           # не подтверждённое за это время задание выдаётся снова
+QUEUE_MAX_ATTEMPTS = 3          # после стольких неудачных выдач — в dead
+QUEUE_RETRY_SEC = 30            # пауза перед повтором: QUEUE_RETRY_SEC * номер попытки
+QUEUE_IDLE_SEC = 2.0            # готовых заданий нет, но есть в аренде у других — ждём
+
+# Глубокий поиск: TOP_N_PRODUCTS больше одной страницы выдачи (ozon_parser --depth)
+SEARCH_PAGE_SIZE = 36           # товаров на странице выдачи &page=N
+SEARCH_PAGE_WORKERS = 4         # страниц выдачи одновременно (вкладки или HTTP)
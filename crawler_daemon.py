@@ -0,0 +1,285 @@
+import json
+import time
+import queue
+import argparse
+import threading
+from datetime import date
+import urllib.request
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import config
+import text_parsing
+import resource_filter
+import session_store
+from rate_governor import GOVERNOR
+from ozon_parser import (
+    get_page_instance, set_pvz, open_http, parse_card, find_top_product_urls, card_rows,
+)
+
+# Резидентный обходчик: браузер с выставленным ПВЗ и пулом прогретых вкладок живёт
+# между запросами, задания приходят по локальному HTTP.
+#   python crawler_daemon.py serve --tabs 3
+#   python crawler_daemon.py search "органайзер для кабелей" "подставка для ноутбука"
+#   python crawler_daemon.py card https://www.ozon.ru/product/...
+#
+# POST /search {"queries": ["..."], "top_n": 5}  -> поиск + карточки топ-N
+# POST /card   {"urls": ["https://www.ozon.ru/product/..."], "query": ""}
+# GET  /health -> вкладки, регулятор частоты
+#
+# Ответ — NDJSON, по строке на оффер в схеме ozon_parser (card_rows), строки идут
+# по мере разбора карточек. Ошибка задания — строка {"error": ..., "idea_id"/"product_url": ...}.
+# Неверное тело запроса — 400 и одна такая строка {"error": ...}.
+# idea_id — номер запроса в теле (0, 1, ...). Реестр запуска и кэш страниц не используются:
+# демону нужны свежие цены, а не повтор прошлого разбора.
+
+
+class TabPool:
+    """Вкладки одного браузера: куки и ПВЗ общие, задание берёт свободную вкладку."""
+
+    def __init__(self, page, size):
+        self.page = page
+        self.tabs = [page] + [page.new_tab() for _ in range(size - 1)]
+        if config.RESOURCE_FILTER_ENABLED:
+            for tab in self.tabs[1:]:
+                resource_filter.install_drission(tab)
+        self.free = queue.Queue()
+        for tab in self.tabs:
+            self.free.put(tab)
+
+    def acquire(self):
+        return self.free.get()
+
+    def acquire_extra(self, n):
+        """До n свободных вкладок без ожидания — под страницы глубокого поиска."""
+        tabs = []
+        while len(tabs) < n:
+            try:
+                tabs.append(self.free.get_nowait())
+            except queue.Empty:
+                break
+        return tabs
+
+    def release(self, tab):
+        self.free.put(tab)
+
+    def close(self):
+        for tab in self.tabs[1:]:
+            try: tab.close()
+            except: pass
+
+
+class Crawler:
+    def __init__(self, tabs, use_http=False):
+        self.page = get_page_instance()
+        try:
+            session_store.ensure_pvz(self.page, set_pvz)
+        except Exception as e:
+            print(f"Ошибка ПВЗ: {e}")
+        self.http = open_http(self.page) if use_http else None
+        self.pool = TabPool(self.page, tabs)
+        self.started = time.time()
+        # опорная дата "дней до доставки" — общая для всех потоков; ставим раз при старте
+        # и переставляем только при смене суток, а не на каждом запросе
+        self.date_lock = threading.Lock()
+        self.today = text_parsing.set_reference_date()
+
+    def refresh_reference_date(self):
+        with self.date_lock:
+            if date.today() != self.today:
+                self.today = text_parsing.set_reference_date()
+
+    def card(self, idea_id, query, product_url, out):
+        tab = self.pool.acquire()
+        try:
+            card_shop, card_price, offers = parse_card(tab, product_url, http=self.http)
+            out.put(card_rows(idea_id, query, product_url, card_shop, card_price, offers))
+        except Exception as e:
+            out.put([{"error": str(e), "idea_id": idea_id, "product_url": product_url}])
+        finally:
+            self.pool.release(tab)
+
+    def search(self, idea_id, query, top_n, out):
+        tab = self.pool.acquire()
+        # глубокий поиск — на свободных вкладках пула, сверх DAEMON_TABS вкладок не открываем
+        extra = self.pool.acquire_extra(config.SEARCH_PAGE_WORKERS - 1) if top_n > config.SEARCH_PAGE_SIZE else []
+        try:
+            urls = find_top_product_urls(tab, query, top_n=top_n, http=self.http, tabs=[tab] + extra)
+        except Exception as e:
+            out.put([{"error": str(e), "idea_id": idea_id, "query": query}])
+            return
+        finally:
+            for t in [tab] + extra:
+                self.pool.release(t)
+
+        if not urls:
+            out.put(card_rows(idea_id, query, "", "", None, []))
+            return
+        threads = [threading.Thread(target=self.card, args=(idea_id, query, u, out), daemon=True) for u in urls]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def run(self, jobs):
+        """jobs: [(fn, args)] -> строки по мере готовности; порядок — порядок завершения карточек."""
+        self.refresh_reference_date()  # демон живёт дольше суток
+        out = queue.Queue()
+        threads = [threading.Thread(target=fn, args=(*args, out), daemon=True) for fn, args in jobs]
+        for t in threads:
+            t.start()
+
+        pending = threads
+        while pending:
+            try:
+                yield from out.get(timeout=0.2)
+            except queue.Empty:
+                pass
+            pending = [t for t in pending if t.is_alive()]
+        while not out.empty():
+            yield from out.get()
+
+    def health(self):
+        return {
+            "tabs": len(self.pool.tabs),
+            "free_tabs": self.pool.free.qsize(),
+            "uptime_sec": round(time.time() - self.started),
+            "http": bool(self.http and self.http.available),
+            "governor": GOVERNOR.summary(),
+        }
+
+    def close(self):
+        self.pool.close()
+        if self.http:
+            self.http.close()
+        try: self.page.quit()
+        except: pass
+
+
+def is_str_list(value):
+    return isinstance(value, list) and bool(value) and all(isinstance(v, str) and v for v in value)
+
+
+def bad_request(path, body):
+    """Текст ошибки для ответа 400 или None, если тело задания годное."""
+    if not isinstance(body, dict):
+        return "тело запроса — не JSON-объект"
+    if path == "/search":
+        if not is_str_list(body.get("queries")):
+            return "queries — непустой список строк"
+        top_n = body.get("top_n")
+        if top_n is not None and (isinstance(top_n, bool) or not isinstance(top_n, int) or top_n < 1):
+            return "top_n — целое число больше 0"
+    else:
+        if not is_str_list(body.get("urls")):
+            return "urls — непустой список строк"
+        if not isinstance(body.get("query") or "", str):
+            return "query — строка"
+    return None
+
+
+def make_server(crawler, host=None, port=None):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            print(f"{self.address_string()} {fmt % args}")
+
+        def send_json(self, code, obj):
+            body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def send_error_row(self, code, error):
+            body = json.dumps({"error": error}, ensure_ascii=False).encode("utf-8") + b"\n"
+            self.send_response(code)
+            self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self.send_json(200, crawler.health())
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            except ValueError:
+                self.send_error_row(400, "тело запроса — не JSON")
+                return
+            if self.path not in ("/search", "/card"):
+                self.send_error(404)
+                return
+
+            error = bad_request(self.path, body)
+            if error:
+                self.send_error_row(400, error)
+                return
+            if self.path == "/search":
+                top_n = body.get("top_n") or config.TOP_N_PRODUCTS
+                jobs = [(crawler.search, (i, q, top_n)) for i, q in enumerate(body["queries"])]
+            else:
+                query = body.get("query") or ""
+                jobs = [(crawler.card, (i, query, u)) for i, u in enumerate(body["urls"])]
+
+            # HTTP/1.0 без Content-Length: конец ответа — закрытие соединения
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+            self.end_headers()
+            for row in crawler.run(jobs):
+                self.wfile.write(json.dumps(row, ensure_ascii=False).encode("utf-8") + b"\n")
+                self.wfile.flush()
+
+    return ThreadingHTTPServer((host or config.DAEMON_HOST, port or config.DAEMON_PORT), Handler)
+
+
+def request_offers(path, payload, host=None, port=None, timeout=None):
+    """Клиент: строки ответа демона по мере поступления. request_offers("/search", {"queries": [...]})"""
+    url = f"http://{host or config.DAEMON_HOST}:{port or config.DAEMON_PORT}{path}"
+    req = urllib.request.Request(url, data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+                                 headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        for line in resp:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("cmd", choices=["serve", "search", "card"])
+    ap.add_argument("items", nargs="*", help="search: запросы, card: ссылки на товары")
+    ap.add_argument("--host", default=config.DAEMON_HOST)
+    ap.add_argument("--port", type=int, default=config.DAEMON_PORT)
+    ap.add_argument("--tabs", type=int, default=config.DAEMON_TABS)
+    ap.add_argument("--top-n", type=int, default=config.TOP_N_PRODUCTS)
+    ap.add_argument("--http", action="store_true", default=config.FETCH_MODE == "http",
+                    help="поиск и продавцы через composer-api с куками браузера")
+    args = ap.parse_args()
+
+    if args.cmd == "search":
+        for row in request_offers("/search", {"queries": args.items, "top_n": args.top_n}, args.host, args.port):
+            print(json.dumps(row, ensure_ascii=False))
+        return
+    if args.cmd == "card":
+        for row in request_offers("/card", {"urls": args.items}, args.host, args.port):
+            print(json.dumps(row, ensure_ascii=False))
+        return
+
+    crawler = Crawler(args.tabs, args.http)
+    server = make_server(crawler, args.host, args.port)
+    print(f"crawler daemon: {args.tabs} вкладок на http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        crawler.close()
+        print(GOVERNOR.summary())
+
+
+if __name__ == "__main__":
+    main()
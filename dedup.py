@@ -0,0 +1,164 @@
+import re
+import zlib
+import argparse
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+import config
+import storage
+
+# Склейка почти одинаковых поисковых запросов между генерацией идей и обходом.
+# Разные seeds часто дают "органайзер для ванной пластиковый" и
+# "Пластиковый органайзер в ванную" — на Ozon это одна и та же выдача.
+#
+#  1) нормализация: регистр, ё -> е, без пунктуации и предлогов, грубый стемминг,
+#     слова по алфавиту;
+#  2) одинаковые нормальные формы — один кластер сразу;
+#  3) остальные — MinHash по символьным 3-граммам + LSH-корзины, кандидаты
+#     проверяются точным Jaccard >= DEDUP_THRESHOLD.
+#
+# Каждой идее ставится crawl_id — idea_id представителя кластера (наименьший).
+# ozon_parser обходит только представителей, aggregate раздаёт статистику по crawl_id.
+
+STOPWORDS = {"для", "и", "в", "во", "с", "со", "на", "из", "от", "по", "к", "под", "над", "без", "или", "a", "the", "for"}
+
+# окончания от длинных к коротким; отрезаем, если остаётся основа не короче 3 букв
+ENDINGS = sorted([
+    "иями", "ями", "ами", "ого", "его", "ому", "ему", "ыми", "ими", "ых", "их",
+    "ой", "ей", "ий", "ый", "ая", "яя", "ое", "ее", "ые", "ие", "ов", "ев",
+    "ах", "ях", "ам", "ям", "ом", "ем", "ую", "юю",
+    "а", "я", "ы", "и", "о", "е", "у", "ю", "ь",
+], key=len, reverse=True)
+
+TOKEN_RE = re.compile(r"[a-zа-я0-9]+")
+
+MERSENNE = (1 << 31) - 1
+
+
+def stem(word: str) -> str:
+    if word.isdigit():
+        return word
+    for end in ENDINGS:
+        if word.endswith(end) and len(word) - len(end) >= 3:
+            return word[:-len(end)]
+    return word
+
+
+def normalize_query(query: str) -> str:
+    t = str(query or "").lower().replace("ё", "е")
+    tokens = {stem(w) for w in TOKEN_RE.findall(t) if w not in STOPWORDS}
+    return " ".join(sorted(tokens))
+
+
+def shingles(norm: str, k: int = 3) -> set:
+    s = f" {norm} "
+    return {s[i:i + k] for i in range(max(len(s) - k + 1, 1))}
+
+
+def numbers(norm: str) -> set:
+    return {w for w in norm.split() if w.isdigit()}
+
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class MinHasher:
+    def __init__(self, num_perm=None, seed=1):
+        self.num_perm = num_perm or config.DEDUP_NUM_PERM
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, MERSENNE, size=self.num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE, size=self.num_perm, dtype=np.uint64)
+
+    def signature(self, sh: set) -> np.ndarray:
+        x = np.array([zlib.crc32(s.encode("utf-8")) for s in sh], dtype=np.uint64) % MERSENNE
+        # (a*x + b) mod p при a, x < 2^31 помещается в uint64
+        return ((np.outer(x, self.a) + self.b) % MERSENNE).min(axis=0)
+
+
+def candidate_pairs(signatures, bands=None):
+    """LSH: строки, совпавшие целиком хотя бы в одной полосе подписи."""
+    bands = bands or config.DEDUP_BANDS
+    rows = len(signatures[0]) // bands
+    pairs = set()
+    for b in range(bands):
+        buckets = defaultdict(list)
+        for i, sig in enumerate(signatures):
+            buckets[sig[b * rows:(b + 1) * rows].tobytes()].append(i)
+        for members in buckets.values():
+            for x in range(len(members)):
+                for y in range(x + 1, len(members)):
+                    pairs.add((members[x], members[y]))
+    return pairs
+
+
+def cluster_queries(queries, threshold=None):
+    """Номер кластера для каждого запроса (номер = индекс представителя)."""
+    threshold = config.DEDUP_THRESHOLD if threshold is None else threshold
+    parent = list(range(len(queries)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(i, j):
+        i, j = find(i), find(j)
+        if i != j:
+            parent[max(i, j)] = min(i, j)
+
+    norms = [normalize_query(q) for q in queries]
+
+    first = {}
+    for i, n in enumerate(norms):
+        if n in first:
+            union(first[n], i)
+        else:
+            first[n] = i
+
+    uniq = list(first.values())
+    if len(uniq) > 1 and threshold < 1:
+        sh = [shingles(norms[i]) for i in uniq]
+        hasher = MinHasher()
+        sigs = [hasher.signature(s) for s in sh]
+        for x, y in candidate_pairs(sigs):
+            # "коробка 10 л" и "коробка 20 л" — разные товары, числа должны совпасть
+            if numbers(norms[uniq[x]]) == numbers(norms[uniq[y]]) and jaccard(sh[x], sh[y]) >= threshold:
+                union(uniq[x], uniq[y])
+
+    return [find(i) for i in range(len(queries))]
+
+
+def assign_crawl_ids(ideas: pd.DataFrame, threshold=None) -> pd.DataFrame:
+    ideas = ideas.sort_values("idea_id").reset_index(drop=True)
+    roots = cluster_queries(ideas["query"].tolist(), threshold)
+    ideas["crawl_id"] = [ideas.at[r, "idea_id"] for r in roots]
+
+    jobs = ideas["crawl_id"].nunique()
+    if len(ideas):
+        print(f"dedup: ideas={len(ideas)} crawl jobs={jobs} (-{1 - jobs / len(ideas):.0%})")
+    return ideas
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threshold", type=float, default=config.DEDUP_THRESHOLD,
+                    help="минимальный Jaccard 3-грамм нормализованных запросов; 1 — только точные совпадения")
+    ap.add_argument("--show", action="store_true", help="напечатать склеенные группы")
+    args = ap.parse_args()
+
+    ideas = assign_crawl_ids(storage.read_table("ideas"), args.threshold)
+    if args.show:
+        for crawl_id, g in ideas.groupby("crawl_id"):
+            if len(g) > 1:
+                print(f"[{crawl_id}] " + " | ".join(g["query"]))
+
+    path = storage.write_table(ideas, "ideas")
+    print(f"Saved {path}")
+
+
+if __name__ == "__main__":
+    main()
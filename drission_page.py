@@ -1,13 +1,18 @@
-import re
 import time
 import random
 import pandas as pd
-from datetime import date
 from dataclasses import dataclass
 
 from DrissionPage import ChromiumPage, ChromiumOptions
 
 import config
+import text_parsing
+from text_parsing import PRICE_RE, SPACES, norm_text, parse_price_rub, delivery_days_from_text
+import resource_filter
+import waits
+import session_store
+from rate_governor import GOVERNOR, Blocked
+from waits import navigate
 
 
 @dataclass
@@ -17,28 +22,18 @@ class Row:
     ozon_card_price: str
 
 
-RU_MONTHS = {
-    "января": 1, "февраля": 2, "марта": 3, "апреля": 4, "мая": 5, "июня": 6,
-    "июля": 7, "августа": 8, "сентября": 9, "октября": 10, "ноября": 11, "декабря": 12
-}
-
-
 def random_sleep(min_s=1.5, max_s=4.0):
     time.sleep(random.uniform(min_s, max_s))
 
 
-def norm_text(text):
-    if not text:
-        return ""
-    return re.sub(r"\s+", " ", text).strip()
-
-
 def get_page_instance():
     co = ChromiumOptions()
     # co.incognito()  # Лучше НЕ использовать инкогнито для Озона, чтобы сохранять куки
     co.set_argument('--no-sandbox')
     co.set_argument('--disable-gpu')
     page = ChromiumPage(co)
+    if config.RESOURCE_FILTER_ENABLED:
+        resource_filter.install_drission(page)
     return page
 
 
@@ -68,43 +63,6 @@ def set_pvz(page, url):
 
 # ---------- helpers ----------
 
-def parse_price_rub(text: str) -> int | None:
-    if not text:
-        return None
-    t = text.replace('\u2009', ' ').replace('\xa0', ' ')
-    m = re.search(r'(\d[\d\s]*)\s*₽', t)
-    if not m:
-        return None
-    return int(m.group(1).replace(' ', ''))
-
-
-def delivery_days_from_text(text: str) -> int | None:
-    if not text:
-        return None
-    t = text.lower().replace('\xa0', ' ').strip()
-    today = date.today()
-
-    if "сегодня" in t:
-        return 0
-    if "завтра" in t:
-        return 1
-
-    m = re.search(r'(\d{1,2})\s+([а-я]+)', t)
-    if not m:
-        return None
-
-    day = int(m.group(1))
-    mon = RU_MONTHS.get(m.group(2))
-    if not mon:
-        return None
-
-    y = today.year
-    d = date(y, mon, day)
-    if d < today:
-        d = date(y + 1, mon, day)
-    return (d - today).days
-
-
 # ---------- seller on card ----------
 
 def parse_seller_from_card(page) -> str:
@@ -167,7 +125,11 @@ def open_cheaper_modal(page) -> bool:
         except:
             return False
 
-    return bool(page.ele('css:div[data-widget="webSellerList"]', timeout=4))
+    root = page.ele('css:div[data-widget="webSellerList"]', timeout=4)
+    if not root:
+        return False
+    waits.wait_seller_cards(root)
+    return True
 
 
 def close_modal(page):
@@ -181,15 +143,26 @@ def close_modal(page):
 
 
 def collect_cheaper_offers(page, max_more_clicks=30):
+    """
+    Карточки продавцов разбираются по одному разу: после "Показать ещё" — только новые.
+    Листать перестаём на OFFERS_MAX_PER_PRODUCT офферах или на ценах выше
+    OFFERS_PRICE_CEILING_RUB (список отсортирован по цене).
+    """
     offers = []
     seen = set()
+    cap = config.OFFERS_MAX_PER_PRODUCT
+    ceiling = config.OFFERS_PRICE_CEILING_RUB
 
     root = page.ele('css:div[data-widget="webSellerList"]', timeout=4)
     if not root:
         return offers
 
+    done = 0
     for _ in range(max_more_clicks):
-        cards = root.eles('css:div.pdp_mb0') or []
+        cards = waits.new_seller_cards(root, done)
+        done += len(cards)
+        stop = False
+
         for card in cards:
             try:
                 shop_a = card.ele('css:a.pdp_ea6', timeout=0.1)
@@ -198,6 +171,9 @@ def collect_cheaper_offers(page, max_more_clicks=30):
 
                 price_div = card.ele('css:div.pdp_l9b', timeout=0.1)
                 price_rub = parse_price_rub(price_div.text if price_div else "")
+                if ceiling and price_rub is not None and price_rub > ceiling:
+                    stop = True
+                    continue
 
                 del_ele = card.ele('text:Доставим', timeout=0.1)
                 delivery_text = norm_text(del_ele.text) if del_ele else ""
@@ -216,28 +192,28 @@ def collect_cheaper_offers(page, max_more_clicks=30):
             except:
                 continue
 
+        if stop or (cap and len(offers) >= cap):
+            break
+
         more_btn = root.ele('css:button.b25_5_2-b7', timeout=1)
         if not more_btn:
             break
 
         try:
             more_btn.click()
-            random_sleep(0.8, 1.5)
+            if not waits.wait_more_cards(root, done):
+                break
         except:
             break
 
-    return offers
+    return offers[:cap] if cap else offers
 
 
 # ---------- card parsing ----------
 
 def parse_card(page, url):
-    page.get(url)
-    random_sleep(2, 4)
-
-    if "captcha" in page.title.lower() or "доступ ограничен" in page.html:
-        print("Обнаружена капча! Решите её вручную в браузере.")
-        time.sleep(15)
+    # регулятор, бюджет вежливости вкладки и повторы при проверке/капче — как в ozon_parser
+    navigate(page, url, waits.wait_card_ready)
 
     seller = parse_seller_from_card(page)
 
@@ -246,8 +222,7 @@ def parse_card(page, url):
         ozon_card_ele = page.ele('text:Ozon Банк', timeout=2)
         if ozon_card_ele:
             container = ozon_card_ele.parent(3)
-            text = (container.text or "").replace('\u2009', ' ').replace('\xa0', ' ')
-            m = re.search(r'(\d[\d\s]*)\s?₽', text)
+            m = PRICE_RE.search((container.text or "").translate(SPACES))
             if m:
                 price = m.group(1).strip()
     except:
@@ -256,7 +231,6 @@ def parse_card(page, url):
     cheaper_offers = []
     try:
         if open_cheaper_modal(page):
-            random_sleep(1.0, 1.8)
             cheaper_offers = collect_cheaper_offers(page)
             close_modal(page)
     except:
@@ -268,11 +242,12 @@ def parse_card(page, url):
 def main():
     df = pd.read_excel(config.INPUT_XLSX, header=None)
     articles = df.iloc[:, 0].dropna().astype(str).tolist()
+    text_parsing.set_reference_date()
 
     page = get_page_instance()
 
     try:
-        set_pvz(page, config.PVZ_URL)
+        session_store.ensure_pvz(page, set_pvz)
     except Exception as e:
         print(f"Ошибка ПВЗ: {e}")
 
@@ -282,8 +257,11 @@ def main():
         print(f"Обработка: {art}")
 
         search_url = f"{config.BASE_URL}search/?text={art}&from_global=true"
-        page.get(search_url)
-        random_sleep(2, 3)
+        try:
+            navigate(page, search_url, waits.wait_search_ready)
+        except Blocked as e:
+            print(f"Ошибка поиска {art}: {e}")
+            continue
 
         links = page.eles('tag:a@@href:/product/')
         product_url = None
@@ -295,7 +273,11 @@ def main():
                 break
 
         if product_url:
-            seller, price, offers = parse_card(page, product_url)
+            try:
+                seller, price, offers = parse_card(page, product_url)
+            except Blocked as e:
+                print(f"Ошибка карточки {product_url}: {e}")
+                seller, price, offers = "", "", []
 
             if offers:
                 for off in offers:
@@ -337,6 +319,8 @@ def main():
             })
 
     pd.DataFrame(results).to_excel(config.OUTPUT_XLSX, index=False)
+    print(GOVERNOR.summary())
+    GOVERNOR.export_metrics()
     print("Готово")
 
 
@@ -0,0 +1,185 @@
+import os
+import re
+import json
+import argparse
+import threading
+from urllib.parse import urlsplit, parse_qs, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import config
+from page_cache import PageCache, page_key
+
+# Записанные страницы Ozon для офлайн-проверок и бенчмарков.
+#   python fixtures.py record            — выгрузить поиск/карточки/модалки и ответы composer-api из кэша
+#   python fixtures.py serve --port 8765 — отдать их локальным HTTP-сервером
+#
+# Записать один раз: обычный обход ozon_parser с включённым кэшем, затем record.
+# fixtures/manifest.json: [{"kind": "card", "url": "https://www.ozon.ru/product/...", "file": "card/<key>.html"}]
+#
+# Сервер отдаёт страницу и по пути исходного URL (/search/?text=..., /product/...),
+# и по /<kind>/<key>.html — модалка "Есть дешевле" доступна только так.
+# Ссылки на ozon.ru переписываются на адрес сервера, <script> вырезаются:
+# браузер видит статичный DOM и не ходит в сеть.
+# Ответы composer-api (kind "api", ключ — путь страницы) отдаются как JSON на
+# COMPOSER_API_PATH?url=<путь> — это HTTP_API_BASE_URL для обхода в HTTP-режиме.
+
+MANIFEST = "manifest.json"
+SCRIPT_RE = re.compile(r"<script\b[^>]*>.*?</script>", re.S | re.I)
+OZON_ORIGIN_RE = re.compile(r"https?://(?:www\.)?ozon\.ru")
+
+
+def fixture_file(kind, url):
+    ext = "json" if kind == "api" else "html"
+    return f"{kind}/{page_key(kind, url)[:16]}.{ext}"
+
+
+def record(out_dir=None, limit=None):
+    out_dir = out_dir or config.FIXTURES_DIR
+    cache = PageCache(offline=True)
+    manifest = []
+    counts = {}
+
+    for kind, url in cache.entries():
+        if limit and counts.get(kind, 0) >= limit:
+            continue
+        html = cache.get(kind, url)
+        if not html:
+            continue  # карточка без "Есть дешевле" — пустая модалка
+
+        name = fixture_file(kind, url)
+        os.makedirs(os.path.join(out_dir, kind), exist_ok=True)
+        with open(os.path.join(out_dir, name), "w", encoding="utf-8") as f:
+            f.write(html)
+        manifest.append({"kind": kind, "url": url, "file": name})
+        counts[kind] = counts.get(kind, 0) + 1
+
+    cache.close()
+    with open(os.path.join(out_dir, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    print(f"fixtures: {counts} -> {out_dir}")
+    return manifest
+
+
+def load_manifest(fixtures_dir=None):
+    fixtures_dir = fixtures_dir or config.FIXTURES_DIR
+    with open(os.path.join(fixtures_dir, MANIFEST), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def iter_fixtures(kind=None, fixtures_dir=None):
+    """(kind, url, html) записанных страниц."""
+    fixtures_dir = fixtures_dir or config.FIXTURES_DIR
+    for item in load_manifest(fixtures_dir):
+        if kind and item["kind"] != kind:
+            continue
+        with open(os.path.join(fixtures_dir, item["file"]), encoding="utf-8") as f:
+            yield item["kind"], item["url"], f.read()
+
+
+def url_route(url):
+    """Ключ маршрута: путь и query без %-кодирования — браузер и кэш кодируют кириллицу по-разному."""
+    parts = urlsplit(url)
+    return unquote(parts.path + (f"?{parts.query}" if parts.query else ""))
+
+
+class FixtureServer:
+    """
+    Локальный сервер записанных страниц для DrissionPage и Playwright.
+    with FixtureServer() as srv: page.get(srv.url_for("card", product_url))
+    """
+
+    def __init__(self, fixtures_dir=None, port=0, strip_scripts=True):
+        self.fixtures_dir = fixtures_dir or config.FIXTURES_DIR
+        self.strip_scripts = strip_scripts
+        self.routes = {}
+        self.api = {}
+        for item in load_manifest(self.fixtures_dir):
+            if item["kind"] == "api":
+                self.api[unquote(item["url"])] = item["file"]
+                continue
+            self.routes["/" + item["file"]] = item["file"]
+            if item["kind"] != "modal":
+                self.routes.setdefault(url_route(item["url"]), item["file"])
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                if parts.path == config.COMPOSER_API_PATH:
+                    name = server.api.get(unquote(parse_qs(parts.query).get("url", [""])[0]))
+                    content_type = "application/json; charset=utf-8"
+                else:
+                    name = server.routes.get(url_route(self.path))
+                    content_type = "text/html; charset=utf-8"
+                if not name:
+                    self.send_error(404)
+                    return
+                body = server.render(name).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.thread = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def render(self, name):
+        with open(os.path.join(self.fixtures_dir, name), encoding="utf-8") as f:
+            html = f.read()
+        if name.endswith(".json"):
+            return html  # JSON composer-api отдаём как записан
+        if self.strip_scripts:
+            html = SCRIPT_RE.sub("", html)
+        return OZON_ORIGIN_RE.sub(self.base_url, html)
+
+    def url_for(self, kind, url):
+        return f"{self.base_url}/{fixture_file(kind, url)}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("cmd", choices=["record", "serve"])
+    ap.add_argument("--dir", default=config.FIXTURES_DIR)
+    ap.add_argument("--limit", type=int, help="record: не больше N страниц каждого вида")
+    ap.add_argument("--port", type=int, default=config.FIXTURES_PORT)
+    args = ap.parse_args()
+
+    if args.cmd == "record":
+        record(args.dir, args.limit)
+        return
+
+    srv = FixtureServer(args.dir, args.port)
+    print(f"fixtures: {len(srv.routes)} routes, {len(srv.api)} api on {srv.base_url} "
+          f"(BASE_URL / HTTP_API_BASE_URL для обхода: {srv.base_url}/)")
+    try:
+        srv.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import re
+import json
+import time
+import threading
+import importlib.util
+from urllib.parse import urlparse, quote
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+import config
+import page_state
+from rate_governor import GOVERNOR
+
+# Прямые запросы к composer-api Ozon (тот же JSON, из которого фронтенд рисует страницы).
+# Куки (ПВЗ, антибот) берутся из браузерной сессии после set_pvz; на странице-проверке
+# бросаем ChallengeDetected, и вызывающий код уходит в браузер.
+# С кэшем страниц ответы пишутся в него как kind="api" (ключ — путь страницы), поэтому
+# --offline повторяет и обход в HTTP-режиме; fixtures.py записывает и отдаёт их же.
+
+PRODUCT_ID_RE = re.compile(r"/product/[^/?]*?-?(\d+)/?(?:\?|$)")
+
+
+class NotCached(Exception):
+    """Офлайн: ответа на этот путь в кэше нет."""
+
+
+class ChallengeDetected(Exception):
+    pass
+
+
+def is_challenge(status_code, text):
+    if status_code in (403, 429):
+        return True
+    head = (text or "")[:5000].lower()
+    return "captcha" in head or "доступ ограничен" in head
+
+
+def cookies_from_drission(page):
+    return [
+        {"name": c["name"], "value": c["value"], "domain": c.get("domain", ""), "path": c.get("path", "/")}
+        for c in page.cookies(all_domains=True)
+    ]
+
+
+def cookies_from_playwright(context):
+    return [
+        {"name": c["name"], "value": c["value"], "domain": c.get("domain", ""), "path": c.get("path", "/")}
+        for c in context.cookies()
+    ]
+
+
+def product_id(product_url):
+    m = PRODUCT_ID_RE.search(product_url)
+    return m.group(1) if m else None
+
+
+class OzonHttp:
+    """
+    Пул keep-alive соединений к composer-api. Если установлен httpx (и h2) — HTTP/2,
+    иначе requests.Session. base_url можно указать на fixtures.py serve с записанными ответами.
+    cache — PageCache: ответы берутся из него и пишутся в него; offline — только из кэша.
+    """
+
+    def __init__(self, cookies, user_agent=None, base_url=None, cache=None):
+        self.cache = cache
+        self.base_url = (base_url or config.HTTP_API_BASE_URL or config.BASE_URL).rstrip("/")
+        self.api_url = self.base_url + config.COMPOSER_API_PATH
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+        headers = {"Accept": "application/json", "Accept-Language": "ru-RU,ru;q=0.9"}
+        if user_agent:
+            headers["User-Agent"] = user_agent
+
+        if httpx:
+            self.client = httpx.Client(
+                http2=importlib.util.find_spec("h2") is not None,
+                headers=headers,
+                timeout=config.HTTP_TIMEOUT_SEC,
+                limits=httpx.Limits(max_keepalive_connections=config.HTTP_POOL_SIZE,
+                                    max_connections=config.HTTP_POOL_SIZE),
+                follow_redirects=True,
+            )
+        else:
+            self.client = requests.Session()
+            self.client.headers.update(headers)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.HTTP_POOL_SIZE)
+            self.client.mount("http://", adapter)
+            self.client.mount("https://", adapter)
+
+        host = urlparse(self.base_url).hostname or ""
+        for c in cookies:
+            domain = c["domain"] if host.endswith(c["domain"].lstrip(".")) else host
+            self.client.cookies.set(c["name"], c["value"], domain=domain, path=c["path"])
+
+    @property
+    def available(self):
+        return time.time() >= self.blocked_until
+
+    def page_json(self, page_path):
+        if self.cache:
+            cached = self.cache.get("api", page_path)
+            if cached is not None:
+                return json.loads(cached)
+            if self.cache.offline:
+                raise NotCached(page_path)
+
+        data = self.fetch_json(page_path)
+        if self.cache:
+            self.cache.put("api", page_path, json.dumps(data, ensure_ascii=False))
+        return data
+
+    def fetch_json(self, page_path):
+        if not self.available:
+            raise ChallengeDetected("HTTP-режим на паузе после проверки")
+
+        GOVERNOR.acquire()
+        try:
+            resp = self.client.get(self.api_url, params={"url": page_path}, timeout=config.HTTP_TIMEOUT_SEC)
+        except Exception:
+            GOVERNOR.error()
+            raise
+
+        if is_challenge(resp.status_code, resp.text) or "json" not in resp.headers.get("content-type", ""):
+            GOVERNOR.challenge()
+            with self.lock:
+                self.blocked_until = time.time() + config.HTTP_CHALLENGE_COOLDOWN_SEC
+            raise ChallengeDetected(f"{resp.status_code} {page_path}")
+
+        if resp.status_code >= 400:
+            GOVERNOR.error()
+        resp.raise_for_status()
+        GOVERNOR.success()
+        return resp.json()
+
+    def states(self, page_path):
+        return page_state.states_from_widget_states(self.page_json(page_path).get("widgetStates"))
+
+    def find_top_product_urls(self, query, top_n, page_no=1):
+        path = f"/search/?text={quote(query)}&from_global=true"
+        states = self.states(f"{path}&page={page_no}" if page_no > 1 else path)
+        return page_state.product_links_from_states(states, top_n)
+
+    def parse_card(self, product_url, norm_text, parse_delivery_days):
+        """(card_shop, card_price, offers) — как у браузерного parse_card."""
+        path = urlparse(product_url).path
+        card_shop, card_price = page_state.card_from_states(self.states(path), norm_text)
+
+        offers = []
+        seen = set()
+        pid = product_id(product_url)
+        if pid:
+            next_path = config.SELLER_LIST_PATH.format(product_id=pid)
+            for _ in range(config.HTTP_SELLER_LIST_MAX_PAGES):
+                data = self.page_json(next_path)
+                states = page_state.states_from_widget_states(data.get("widgetStates"))
+                for off in page_state.offers_from_states(states, parse_delivery_days, norm_text):
+                    key = (off["offer_shop"], off["offer_price_rub"], off["offer_delivery_text"], off["offer_shop_url"])
+                    if key not in seen:
+                        seen.add(key)
+                        offers.append(off)
+                next_path = data.get("nextPage")
+                if not next_path or self.enough_offers(offers):
+                    break
+
+        return card_shop, card_price, offers
+
+    @staticmethod
+    def enough_offers(offers):
+        """Дальше не листаем: набран лимит или цены уже выше потолка (список по возрастанию цены)."""
+        if config.OFFERS_MAX_PER_PRODUCT and len(offers) >= config.OFFERS_MAX_PER_PRODUCT:
+            return True
+        ceiling = config.OFFERS_PRICE_CEILING_RUB
+        return bool(ceiling and any((off["offer_price_rub"] or 0) > ceiling for off in offers))
+
+    def close(self):
+        self.client.close()
@@ -2,15 +2,26 @@ from dotenv import load_dotenv
 import os
 import json
 import re
+import time
+import random
+import asyncio
+import hashlib
+import sqlite3
 import pandas as pd
+import openai
 
 import config
+import storage
+import dedup
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import SystemMessage, HumanMessage
 
 
 load_dotenv()
 
+# перегрузка/лимиты провайдера — ждём и повторяем; остальные ошибки сразу наверх
+RETRYABLE = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
 SYSTEM = """Ты помощник по продуктовым идеям для маркетплейсов РФ.
 Верни результат СТРОГО в формате JSON без markdown и без пояснений.
 
@@ -44,50 +55,174 @@ def extract_json_object(text: str) -> str:
         return t[start:end+1]
     return t
 
-def generate_ideas(llm: ChatOpenAI, seed_text: str, seed_material_cost: float | None, n: int):
-    prompt = f"""Вход:
+def build_prompt(seed_text: str, seed_material_cost: float | None, n: int) -> str:
+    return f"""Вход:
 seed: {seed_text}
 material_cost_rub: {seed_material_cost if seed_material_cost is not None else "не задано"}
 
 Сгенерируй {n} идей.
 Верни только JSON-объект, как в формате выше.
 """
-    resp = llm.invoke([
-        SystemMessage(content=SYSTEM),
-        HumanMessage(content=prompt)
-    ])
-    content = resp.content if isinstance(resp.content, str) else str(resp.content)
+
+class LLMCache:
+    """
+    Ответы модели между запусками: ключ — (модель, температура, sha256 промпта).
+    Повторный запуск с одним новым seed платит только за него.
+    """
+
+    def __init__(self, path=None):
+        self.conn = sqlite3.connect(path or config.LLM_CACHE_DB)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "model TEXT NOT NULL, temperature REAL NOT NULL, prompt_sha TEXT NOT NULL, "
+            "content TEXT NOT NULL, created_at REAL NOT NULL, "
+            "PRIMARY KEY (model, temperature, prompt_sha))"
+        )
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(llm: ChatOpenAI, prompt: str):
+        sha = hashlib.sha256((SYSTEM + "\n" + prompt).encode("utf-8")).hexdigest()
+        return llm.model_name, float(llm.temperature or 0), sha
+
+    def get(self, llm: ChatOpenAI, prompt: str):
+        row = self.conn.execute(
+            "SELECT content FROM responses WHERE model = ? AND temperature = ? AND prompt_sha = ?",
+            self.key(llm, prompt),
+        ).fetchone()
+        if row:
+            self.hits += 1
+            return row[0]
+        self.misses += 1
+        return None
+
+    def put(self, llm: ChatOpenAI, prompt: str, content: str):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO responses (model, temperature, prompt_sha, content, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (*self.key(llm, prompt), content, time.time()),
+        )
+        self.conn.commit()
+
+    def stats(self) -> str:
+        return f"llm cache: hits={self.hits} misses={self.misses}"
+
+    def close(self):
+        self.conn.close()
+
+def retry_delay(e: Exception, attempt: int) -> float:
+    """Retry-After от сервера, иначе экспоненциальная пауза с разбросом."""
+    try:
+        return float(e.response.headers["retry-after"])
+    except Exception:
+        return config.LLM_BACKOFF_SEC * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+async def ainvoke_with_retry(llm: ChatOpenAI, prompt: str) -> str:
+    for attempt in range(config.LLM_MAX_RETRIES + 1):
+        try:
+            resp = await llm.ainvoke([
+                SystemMessage(content=SYSTEM),
+                HumanMessage(content=prompt)
+            ])
+            return resp.content if isinstance(resp.content, str) else str(resp.content)
+        except RETRYABLE as e:
+            if attempt == config.LLM_MAX_RETRIES:
+                raise
+            delay = retry_delay(e, attempt)
+            print(f"{type(e).__name__}: повтор через {delay:.1f} с")
+            await asyncio.sleep(delay)
+
+async def generate_ideas(llm: ChatOpenAI, sem: asyncio.Semaphore, cache: LLMCache,
+                         seed_text: str, seed_material_cost: float | None, n: int):
+    prompt = build_prompt(seed_text, seed_material_cost, n)
+
+    content = cache.get(llm, prompt)
+    if content is None:
+        async with sem:
+            content = await ainvoke_with_retry(llm, prompt)
+
     json_text = extract_json_object(content)
     data = json.loads(json_text)
+    # в кэш — только разобранный ответ, битый JSON при следующем запуске запросим заново
+    cache.put(llm, prompt, content)
     return data["items"]
 
+DEFAULT_SEEDS = [
+    {"seed": "коробка из прозрачного пластика", "material_cost_rub": 40},
+    {"seed": "металлический крючок для ванной", "material_cost_rub": 25},
+]
+
+def load_seeds(path=None):
+    """
+    Seeds из файла: .csv/.xlsx с колонками seed, material_cost_rub
+    или .txt — по одному seed в строке (себестоимость не задана).
+    Нет файла — встроенный пример.
+    """
+    path = path or config.SEEDS_FILE
+    if not os.path.exists(path):
+        print(f"{path} не найден, беру встроенные seeds")
+        return DEFAULT_SEEDS
+
+    if path.endswith(".txt"):
+        with open(path, encoding="utf-8") as f:
+            return [{"seed": line.strip()} for line in f if line.strip()]
+
+    df = pd.read_excel(path) if path.endswith(".xlsx") else pd.read_csv(path)
+    seeds = []
+    for _, r in df.iterrows():
+        seed = str(r.get("seed", "")).strip()
+        if not seed or seed == "nan":
+            continue
+        cost = pd.to_numeric(r.get("material_cost_rub"), errors="coerce")
+        seeds.append({"seed": seed, "material_cost_rub": None if pd.isna(cost) else float(cost)})
+    return seeds
+
+async def generate_all(llm: ChatOpenAI, seeds, cache: LLMCache):
+    """Все seeds сразу, но не больше LLM_CONCURRENCY запросов к модели одновременно."""
+    sem = asyncio.Semaphore(config.LLM_CONCURRENCY)
+
+    async def one(s):
+        try:
+            return await generate_ideas(llm, sem, cache, s["seed"], s.get("material_cost_rub"),
+                                        n=config.IDEAS_PER_SEED)
+        except Exception as e:
+            print(f"Ошибка seed={s['seed']!r}: {e}")
+            return []
+
+    return await asyncio.gather(*(one(s) for s in seeds))
+
 def main():
     # 1) Инициализация LLM
     # Если в другом проекте у вас прокси “заводится” через env — оставьте так же.
-    # Модель/температуру можете менять.
+    # Модель/температуру можете менять. OPENAI_API_URL может указывать и на локальный
+    # OpenAI-совместимый сервер (например, заглушку для проверки).
     
     llm = ChatOpenAI(
             base_url=os.getenv("OPENAI_API_URL"),
             model=os.getenv("OPENAI_MODEL"),
             api_key=os.getenv("OPENAI_API_KEY"),
             temperature=0.7,
+            max_retries=0,  # повторы с паузой — в ainvoke_with_retry
         )
 
-    # 2) Ваши seeds (+ себестоимость материала на входе)
-    seeds = [
-        {"seed": "коробка из прозрачного пластика", "material_cost_rub": 40},
-        {"seed": "металлический крючок для ванной", "material_cost_rub": 25},
-    ]
+    # 2) Seeds (+ себестоимость материала на входе) — из config.SEEDS_FILE
+    seeds = load_seeds()
+
+    cache = LLMCache()
+    t0 = time.time()
+    results = asyncio.run(generate_all(llm, seeds, cache))
+    print(f"{len(seeds)} seeds за {time.time() - t0:.1f} с, {cache.stats()}")
+    cache.close()
 
     rows = []
     idea_id = 1
 
-    for s in seeds:
+    # idea_id по порядку seeds, а не по порядку ответов
+    for s, items in zip(seeds, results):
         seed_text = s["seed"]
         seed_cost = s.get("material_cost_rub")
 
-        items = generate_ideas(llm, seed_text, seed_cost, n=config.IDEAS_PER_SEED)
-
         # небольшая валидация
         for it in items:
             title = str(it.get("title", "")).strip()
@@ -114,8 +249,10 @@ def main():
             idea_id += 1
 
     df = pd.DataFrame(rows)
-    df.to_excel(config.INPUT_XLSX, index=False)
-    print(f"Saved {config.INPUT_XLSX} rows={len(df)}")
+    if config.DEDUP_ENABLED and len(df):
+        df = dedup.assign_crawl_ids(df)
+    path = storage.write_table(df, "ideas")
+    print(f"Saved {path} rows={len(df)}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
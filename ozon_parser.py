@@ -1,29 +1,49 @@
-import re
+import os
 import time
+import queue
 import random
+import argparse
+import threading
+import multiprocessing as mp
 import pandas as pd
-from datetime import date
 from DrissionPage import ChromiumPage, ChromiumOptions
+from DrissionPage.common import make_session_ele
 import config
-
-RU_MONTHS = {
-    "января": 1, "февраля": 2, "марта": 3, "апреля": 4, "мая": 5, "июня": 6,
-    "июля": 7, "августа": 8, "сентября": 9, "октября": 10, "ноября": 11, "декабря": 12
-}
+import text_parsing
+from text_parsing import norm_text, parse_price_rub, delivery_days_from_text
+from page_cache import PageCache
+import checkpoint
+import storage
+import price_history
+import page_state
+import http_fetch
+from http_fetch import OzonHttp, ChallengeDetected, NotCached
+import resource_filter
+import waits
+from waits import navigate
+import session_store
+import work_queue
+from rate_governor import GOVERNOR, Blocked
+from product_registry import REGISTRY
+from checkpoint import Checkpoint
+
+RESOURCE_STATS = resource_filter.ResourceStats()
 
 def random_sleep(min_s=1.5, max_s=4.0):
     time.sleep(random.uniform(min_s, max_s))
 
-def norm_text(text):
-    if not text:
-        return ""
-    return re.sub(r"\s+", " ", text).strip()
-
-def get_page_instance():
+def get_page_instance(user_data_path=None):
     co = ChromiumOptions()
     co.set_argument('--no-sandbox')
     co.set_argument('--disable-gpu')
-    return ChromiumPage(co)
+    if user_data_path:
+        # отдельный профиль и порт: у каждого шарда свой браузер и свой отпечаток
+        co.set_user_data_path(user_data_path)
+        co.auto_port()
+    page = ChromiumPage(co)
+    if config.RESOURCE_FILTER_ENABLED:
+        resource_filter.install_drission(page)
+    return page
 
 def set_pvz(page, url):
     page.get(url)
@@ -44,41 +64,6 @@ def set_pvz(page, url):
 
     page.get(config.BASE_URL)
 
-def parse_price_rub(text: str):
-    if not text:
-        return None
-    t = text.replace('\u2009', ' ').replace('\xa0', ' ')
-    m = re.search(r'(\d[\d\s]*)\s*₽', t)
-    if not m:
-        return None
-    return int(m.group(1).replace(' ', ''))
-
-def delivery_days_from_text(text: str):
-    if not text:
-        return None
-    t = text.lower().replace('\xa0', ' ').strip()
-    today = date.today()
-
-    if "сегодня" in t:
-        return 0
-    if "завтра" in t:
-        return 1
-
-    m = re.search(r'(\d{1,2})\s+([а-я]+)', t)
-    if not m:
-        return None
-
-    day = int(m.group(1))
-    mon = RU_MONTHS.get(m.group(2))
-    if not mon:
-        return None
-
-    y = today.year
-    d = date(y, mon, day)
-    if d < today:
-        d = date(y + 1, mon, day)
-    return (d - today).days
-
 def parse_seller_from_card(page) -> str:
     try:
         shop_title = page.ele('text:Магазин', timeout=2)
@@ -110,7 +95,11 @@ def open_cheaper_modal(page) -> bool:
         try: btn.parent().click()
         except: return False
 
-    return bool(page.ele('css:div[data-widget="webSellerList"]', timeout=4))
+    root = page.ele('css:div[data-widget="webSellerList"]', timeout=4)
+    if not root:
+        return False
+    waits.wait_seller_cards(root)
+    return True
 
 def close_modal(page):
     try:
@@ -120,6 +109,93 @@ def close_modal(page):
     except:
         pass
 
+def absolute_url(href):
+    if href and href.startswith('/'):
+        return config.BASE_URL.rstrip('/') + href
+    return href or ""
+
+def offer_texts(card):
+    """Сырые поля карточки продавца: магазин, ссылка, строка цены, строка доставки."""
+    shop_a = card.ele('css:a.pdp_ea6', timeout=0.1)
+    price_div = card.ele('css:div.pdp_l9b', timeout=0.1)
+    del_ele = card.ele('text:Доставим', timeout=0.1)
+    return {
+        "offer_shop": norm_text(shop_a.text) if shop_a else "",
+        "offer_shop_url": absolute_url(shop_a.attr('href')) if shop_a else "",
+        "price_text": price_div.text if price_div else "",
+        "offer_delivery_text": norm_text(del_ele.text) if del_ele else "",
+    }
+
+def offer_from_card(card):
+    t = offer_texts(card)
+    return {
+        "offer_shop": t["offer_shop"],
+        "offer_shop_url": t["offer_shop_url"],
+        "offer_price_rub": parse_price_rub(t["price_text"]),
+        "offer_delivery_text": t["offer_delivery_text"],
+        "offer_delivery_days": delivery_days_from_text(t["offer_delivery_text"])
+    }
+
+def offers_from_cards(cards):
+    """Снимок модалки: сначала сырые строки всех карточек, затем цены и доставка одной колонкой."""
+    texts = []
+    for card in cards:
+        try:
+            texts.append(offer_texts(card))
+        except:
+            continue
+
+    prices = text_parsing.parse_prices([t["price_text"] for t in texts])
+    days = text_parsing.delivery_days([t["offer_delivery_text"] for t in texts])
+    return [{
+        "offer_shop": t["offer_shop"],
+        "offer_shop_url": t["offer_shop_url"],
+        "offer_price_rub": None if pd.isna(p) else int(p),
+        "offer_delivery_text": t["offer_delivery_text"],
+        "offer_delivery_days": None if pd.isna(d) else int(d),
+    } for t, p, d in zip(texts, prices, days)]
+
+def over_ceiling(off):
+    ceiling = config.OFFERS_PRICE_CEILING_RUB
+    return bool(ceiling and off["offer_price_rub"] is not None and off["offer_price_rub"] > ceiling)
+
+def limit_offers(offers):
+    """Потолок цены и лимит числа офферов для готового списка (state/HTTP-разбор)."""
+    offers = [off for off in offers if not over_ceiling(off)]
+    if config.OFFERS_MAX_PER_PRODUCT:
+        offers = offers[:config.OFFERS_MAX_PER_PRODUCT]
+    return offers
+
+def add_offers(cards, offers, seen, batch=False):
+    """
+    Разбирает карточки продавцов в offers. True — дальше листать не нужно:
+    набран OFFERS_MAX_PER_PRODUCT или попались цены выше OFFERS_PRICE_CEILING_RUB
+    (список "Есть дешевле" отсортирован по цене, дальше только дороже).
+    """
+    if batch:
+        parsed = offers_from_cards(cards)
+    else:
+        parsed = []
+        for card in cards:
+            try:
+                parsed.append(offer_from_card(card))
+            except:
+                continue
+
+    cap = config.OFFERS_MAX_PER_PRODUCT
+    stop = False
+    for off in parsed:
+        if over_ceiling(off):
+            stop = True
+            continue
+        key = (off["offer_shop"], off["offer_price_rub"], off["offer_delivery_text"], off["offer_shop_url"])
+        if off["offer_shop"] and key not in seen:
+            seen.add(key)
+            offers.append(off)
+            if cap and len(offers) >= cap:
+                return True
+    return stop
+
 def collect_cheaper_offers(page, max_more_clicks=30):
     offers = []
     seen = set()
@@ -128,88 +204,169 @@ def collect_cheaper_offers(page, max_more_clicks=30):
     if not root:
         return offers
 
+    # каждая карточка разбирается один раз: после клика берём только новые по индексу
+    done = 0
     for _ in range(max_more_clicks):
-        cards = root.eles('css:div.pdp_mb0') or []
-        for card in cards:
-            try:
-                shop_a = card.ele('css:a.pdp_ea6', timeout=0.1)
-                offer_shop = norm_text(shop_a.text) if shop_a else ""
-                offer_shop_url = shop_a.attr('href') if shop_a else ""
-
-                price_div = card.ele('css:div.pdp_l9b', timeout=0.1)
-                offer_price_rub = parse_price_rub(price_div.text if price_div else "")
-
-                del_ele = card.ele('text:Доставим', timeout=0.1)
-                offer_delivery_text = norm_text(del_ele.text) if del_ele else ""
-                offer_delivery_days = delivery_days_from_text(offer_delivery_text)
-
-                key = (offer_shop, offer_price_rub, offer_delivery_text, offer_shop_url)
-                if offer_shop and key not in seen:
-                    seen.add(key)
-                    offers.append({
-                        "offer_shop": offer_shop,
-                        "offer_shop_url": offer_shop_url,
-                        "offer_price_rub": offer_price_rub,
-                        "offer_delivery_text": offer_delivery_text,
-                        "offer_delivery_days": offer_delivery_days
-                    })
-            except:
-                continue
+        cards = waits.new_seller_cards(root, done)
+        done += len(cards)
+        if add_offers(cards, offers, seen):
+            break
 
         more_btn = root.ele('css:button.b25_5_2-b7', timeout=1)
         if not more_btn:
             break
         try:
             more_btn.click()
-            random_sleep(0.8, 1.5)
+            if not waits.wait_more_cards(root, done):
+                break
         except:
             break
 
     return offers
 
-def parse_card(page, product_url):
-    page.get(product_url)
-    random_sleep(2, 4)
-
-    card_shop = parse_seller_from_card(page)
+def expand_seller_list(root, max_more_clicks=30):
+    """Только "Показать ещё" до конца списка — карточки разбираются потом одним снимком."""
+    cap = config.OFFERS_MAX_PER_PRODUCT
+    for _ in range(max_more_clicks):
+        more_btn = root.ele('css:button.b25_5_2-b7', timeout=1)
+        if not more_btn:
+            break
+        try:
+            prev_count = waits.seller_card_count(root)
+            if cap and prev_count >= cap:
+                break
+            more_btn.click()
+            if not waits.wait_more_cards(root, prev_count):
+                break
+        except:
+            break
 
-    # цена карточки нам не нужна для RMS, но полезно сохранить
-    card_price = None
+def parse_card_price(page):
     try:
         ozon_card_ele = page.ele('text:Ozon Банк', timeout=2)
         if ozon_card_ele:
             container = ozon_card_ele.parent(3)
-            text = (container.text or "").replace('\u2009', ' ').replace('\xa0', ' ')
-            m = re.search(r'(\d[\d\s]*)\s?₽', text)
-            if m:
-                card_price = int(m.group(1).replace(' ', ''))
+            return parse_price_rub(container.text)
     except:
         pass
+    return None
+
+def card_from_html(card_html):
+    """
+    (card_shop, card_price) из HTML карточки. В режиме EXTRACT_MODE="state" сначала
+    читается JSON состояния виджетов, пустые поля добираются DOM-селекторами по тому же HTML.
+    """
+    card_shop, card_price = "", None
+    if config.EXTRACT_MODE == "state":
+        card_shop, card_price = page_state.card_from_states(page_state.states_from_html(card_html), norm_text)
+
+    if not card_shop or card_price is None:
+        doc = make_session_ele(card_html)
+        card_shop = card_shop or parse_seller_from_card(doc)
+        if card_price is None:
+            card_price = parse_card_price(doc)
+
+    return card_shop, card_price
+
+def offers_from_html(modal_html):
+    offers = []
+    if config.EXTRACT_MODE == "state":
+        offers = page_state.offers_from_states(
+            page_state.states_from_html(modal_html), delivery_days_from_text, norm_text
+        )
+
+    if not offers:
+        add_offers(make_session_ele(modal_html).eles('css:div.pdp_mb0'), offers, set(), batch=True)
+
+    return limit_offers(offers)
+
+def parse_card_snapshot(card_html, modal_html):
+    """Разбор карточки по сохранённому HTML, без браузера."""
+    card_shop, card_price = card_from_html(card_html)
+    offers = offers_from_html(modal_html) if modal_html else []
+    return card_shop, card_price, offers
+
+def parse_card(page, product_url, cache=None, http=None):
+    if cache:
+        card_html = cache.get("card", product_url)
+        modal_html = cache.get("modal", product_url)
+        if card_html is not None and modal_html is not None:
+            return parse_card_snapshot(card_html, modal_html)
+
+    if http and http.available:
+        try:
+            card_shop, card_price, offers = http.parse_card(product_url, norm_text, delivery_days_from_text)
+            return card_shop, card_price, limit_offers(offers)
+        except NotCached:
+            pass
+        except ChallengeDetected as e:
+            print(f"HTTP: проверка ({e}), карточка через браузер")
+        except Exception as e:
+            print(f"HTTP: ошибка {e}, карточка через браузер")
+
+    if cache and cache.offline:
+        return "", None, []
+
+    navigate(page, product_url, waits.wait_card_ready)
+    resource_filter.report_drission(page, RESOURCE_STATS, product_url)
+
+    # "state": один page.html на карточку и один root.html на модалку, разбор в Python
+    state_mode = config.EXTRACT_MODE == "state"
+
+    card_html = page.html if (cache or state_mode) else None
+    if cache:
+        cache.put("card", product_url, card_html)
+
+    if state_mode:
+        card_shop, card_price = card_from_html(card_html)
+    else:
+        card_shop = parse_seller_from_card(page)
+        # цена карточки нам не нужна для RMS, но полезно сохранить
+        card_price = parse_card_price(page)
 
     offers = []
+    modal_html = ""
     try:
         if open_cheaper_modal(page):
-            random_sleep(1.0, 1.8)
-            offers = collect_cheaper_offers(page)
+            if state_mode:
+                root = page.ele('css:div[data-widget="webSellerList"]', timeout=4)
+                if root:
+                    expand_seller_list(root)
+                    modal_html = root.html
+                    offers = offers_from_html(modal_html)
+            else:
+                offers = collect_cheaper_offers(page)
+                if cache:
+                    root = page.ele('css:div[data-widget="webSellerList"]', timeout=1)
+                    modal_html = root.html if root else ""
             close_modal(page)
     except:
         pass
 
+    if cache:
+        cache.put("modal", product_url, modal_html)
+
     return card_shop, card_price, offers
 
-def find_top_product_urls(page, query: str, top_n: int):
-    search_url = f"{config.BASE_URL}search/?text={query}&from_global=true"
-    page.get(search_url)
-    random_sleep(2, 3)
+def parse_card_once(page, product_url, cache=None, http=None):
+    """parse_card через реестр запуска: одна и та же карточка из разных идей разбирается один раз."""
+    return REGISTRY.get_or_parse(product_url, lambda: parse_card(page, product_url, cache=cache, http=http))
+
+def search_url_for(query, page_no=1):
+    url = f"{config.BASE_URL}search/?text={query}&from_global=true"
+    return f"{url}&page={page_no}" if page_no > 1 else url
 
+def extract_product_urls(doc, top_n):
     urls = []
     seen = set()
 
-    links = page.eles('tag:a@@href:/product/')
+    links = doc.eles('tag:a@@href:/product/')
     for link in links:
         href = link.attr('href')
         if not href:
             continue
+        if href.startswith('/'):
+            href = config.BASE_URL.rstrip('/') + href
         if 'ozon.ru/product/' not in href:
             continue
         u = href.split('?')[0]
@@ -222,69 +379,516 @@ def find_top_product_urls(page, query: str, top_n: int):
 
     return urls
 
-def main():
-    inp = pd.read_excel(config.INPUT_XLSX)
-    page = get_page_instance()
-
-    try:
-        set_pvz(page, config.PVZ_URL)
-    except Exception as e:
-        print(f"Ошибка ПВЗ: {e}")
+def search_page_urls(page, query: str, page_no: int, top_n: int, cache=None, http=None):
+    """Ссылки на товары одной страницы выдачи (page_no с 1): кэш, HTTP или браузер."""
+    search_url = search_url_for(query, page_no)
 
-    out_rows = []
+    if cache:
+        html = cache.get("search", search_url)
+        if html is not None:
+            return extract_product_urls(make_session_ele(html), top_n)
 
-    for _, r in inp.iterrows():
-        idea_id = int(r["idea_id"])
-        query = str(r["query"])
+    if http and http.available:
+        try:
+            urls = http.find_top_product_urls(query, top_n, page_no)
+            if urls:
+                return urls
+        except NotCached:
+            pass
+        except ChallengeDetected as e:
+            print(f"HTTP: проверка ({e}), поиск через браузер")
+        except Exception as e:
+            print(f"HTTP: ошибка {e}, поиск через браузер")
+
+    if cache and cache.offline:
+        return []
+
+    navigate(page, search_url, waits.wait_search_ready)
+
+    if cache:
+        cache.put("search", search_url, page.html)
+
+    return extract_product_urls(page, top_n)
+
+SEARCH_TABS = {}  # вкладка обхода -> её вспомогательные вкладки для страниц выдачи
+SEARCH_TABS_LOCK = threading.Lock()
+
+def new_tab(page):
+    tab = page.browser.new_tab()
+    if config.RESOURCE_FILTER_ENABLED:
+        resource_filter.install_drission(tab)
+    return tab
+
+def open_search_tabs(page):
+    """
+    Вспомогательные вкладки глубокого поиска для вкладки обхода page — только если
+    TOP_N_PRODUCTS не помещается на одну страницу выдачи. Закрывает close_search_tabs
+    там же, где закрывается сама page.
+    """
+    if page is None or config.TOP_N_PRODUCTS <= config.SEARCH_PAGE_SIZE:
+        return
+    extra = [new_tab(page) for _ in range(config.SEARCH_PAGE_WORKERS - 1)]
+    with SEARCH_TABS_LOCK:
+        SEARCH_TABS[page] = extra
+
+def close_search_tabs(page):
+    with SEARCH_TABS_LOCK:
+        extra = SEARCH_TABS.pop(page, [])
+    for tab in extra:
+        try: tab.close()
+        except: pass
+
+def open_tabs(page, n):
+    """page и n-1 новых вкладок, у каждой — свои вкладки глубокого поиска."""
+    tabs = [page] + [new_tab(page) for _ in range(n - 1)]
+    for tab in tabs:
+        open_search_tabs(tab)
+    return tabs
+
+def close_tabs(tabs):
+    """Закрывает всё, что открыл open_tabs (сама page остаётся)."""
+    for tab in tabs:
+        close_search_tabs(tab)
+    for tab in tabs[1:]:
+        try: tab.close()
+        except: pass
+
+def find_deep_product_urls(page, query: str, depth: int, cache=None, http=None, tabs=None):
+    """
+    Глубокая выдача: страницы &page=N грузятся волнами по SEARCH_PAGE_WORKERS параллельно
+    (вкладки или HTTP), сливаются в порядке ранжирования без повторов. Следующая волна —
+    только если depth ещё не набран; страница без новых товаров — конец выдачи.
+    """
+    if page is None:
+        tabs = [None] * config.SEARCH_PAGE_WORKERS  # офлайн: только кэш
+    elif tabs is None:
+        with SEARCH_TABS_LOCK:
+            tabs = [page] + SEARCH_TABS.get(page, [])
+    urls, seen = [], set()
+    page_no = 1
+
+    while len(urls) < depth:
+        need = -(-(depth - len(urls)) // config.SEARCH_PAGE_SIZE)
+        wave = list(range(page_no, page_no + min(need, len(tabs))))
+        results = [None] * len(wave)
+
+        def fetch(i, tab, n):
+            try:
+                results[i] = search_page_urls(tab, query, n, depth, cache, http)
+            except Exception as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=fetch, args=(i, tab, n), daemon=True)
+                   for i, (tab, n) in enumerate(zip(tabs, wave))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        for n, res in zip(wave, results):
+            if isinstance(res, Exception):
+                if not urls:
+                    raise res  # как у обычного поиска: первая страница не открылась
+                print(f"поиск {query!r}: страница {n}: {res}")
+                return urls
+            before = len(urls)
+            for u in res:
+                if u not in seen:
+                    seen.add(u)
+                    urls.append(u)
+            if len(urls) == before:
+                return urls
+            if len(urls) >= depth:
+                return urls[:depth]
+        page_no = wave[-1] + 1
 
-        print(f"[{idea_id}] query={query}")
+    return urls
 
-        product_urls = find_top_product_urls(page, query, top_n=config.TOP_N_PRODUCTS)
+def find_top_product_urls(page, query: str, top_n: int, cache=None, http=None, tabs=None):
+    """
+    Топ-N выдачи; больше, чем помещается на первой странице, — через find_deep_product_urls
+    (tabs — вкладки под страницы выдачи, по умолчанию page и её open_search_tabs).
+    """
+    if top_n <= config.SEARCH_PAGE_SIZE:
+        return search_page_urls(page, query, 1, top_n, cache, http)
+    return find_deep_product_urls(page, query, top_n, cache, http, tabs)
+
+def empty_row(idea_id, query, product_url="", card_shop="", card_price=None):
+    return {
+        "idea_id": idea_id,
+        "query": query,
+        "product_url": product_url,
+        "card_shop": card_shop,
+        "card_price_ozon_bank": card_price,
+        "offer_shop": "",
+        "offer_shop_url": "",
+        "offer_price_rub": None,
+        "offer_delivery_days": None,
+    }
+
+def card_rows(idea_id, query, product_url, card_shop, card_price, offers):
+    if not offers:
+        return [empty_row(idea_id, query, product_url, card_shop, card_price)]
+
+    rows = []
+    for off in offers:
+        rows.append({
+            "idea_id": idea_id,
+            "query": query,
+            "product_url": product_url,
+            "card_shop": card_shop,
+            "card_price_ozon_bank": card_price,
+            "offer_shop": off["offer_shop"],
+            "offer_shop_url": off["offer_shop_url"],
+            "offer_price_rub": off["offer_price_rub"],
+            "offer_delivery_days": off["offer_delivery_days"],
+        })
+    return rows
+
+def load_ideas():
+    """
+    Что обходить: (idea_id, query). Если dedup.py проставил crawl_id — только
+    представители кластеров, остальные идеи получат их статистику в aggregate.
+    """
+    inp = storage.read_table("ideas")
+    if "crawl_id" in inp.columns:
+        inp = inp[inp["crawl_id"].isna() | (inp["crawl_id"] == inp["idea_id"])]
+    return [(int(idea_id), str(query)) for idea_id, query in zip(inp["idea_id"], inp["query"])]
+
+def assemble_rows(ideas, ckpt):
+    """Экспорт: строки из журнала обхода в порядке input.xlsx."""
+    out_rows = []
+    for idea_id, query in ideas:
+        product_urls = ckpt.searches.get(idea_id) or []
         if not product_urls:
-            out_rows.append({
-                "idea_id": idea_id,
-                "query": query,
-                "product_url": "",
-                "card_shop": "",
-                "card_price_ozon_bank": None,
-                "offer_shop": "",
-                "offer_shop_url": "",
-                "offer_price_rub": None,
-                "offer_delivery_days": None,
-            })
+            out_rows.append(empty_row(idea_id, query))
             continue
 
         for product_url in product_urls:
-            card_shop, card_price, offers = parse_card(page, product_url)
-
-            if offers:
-                for off in offers:
-                    out_rows.append({
-                        "idea_id": idea_id,
-                        "query": query,
-                        "product_url": product_url,
-                        "card_shop": card_shop,
-                        "card_price_ozon_bank": card_price,
-                        "offer_shop": off["offer_shop"],
-                        "offer_shop_url": off["offer_shop_url"],
-                        "offer_price_rub": off["offer_price_rub"],
-                        "offer_delivery_days": off["offer_delivery_days"],
-                    })
-            else:
-                out_rows.append({
-                    "idea_id": idea_id,
-                    "query": query,
-                    "product_url": product_url,
-                    "card_shop": card_shop,
-                    "card_price_ozon_bank": card_price,
-                    "offer_shop": "",
-                    "offer_shop_url": "",
-                    "offer_price_rub": None,
-                    "offer_delivery_days": None,
-                })
-
-    pd.DataFrame(out_rows).to_excel(config.OUTPUT_OFFERS_XLSX, index=False)
-    print(f"Saved {config.OUTPUT_OFFERS_XLSX}")
+            rows = ckpt.cards.get((idea_id, product_url))
+            out_rows.extend(rows or [empty_row(idea_id, query, product_url)])
+    return out_rows
+
+def crawl_serial(page, ideas, ckpt, cache=None, http=None):
+    REGISTRY.seed_from_checkpoint(ckpt)
+    open_search_tabs(page)
+    try:
+        for idea_id, query in ideas:
+            print(f"[{idea_id}] query={query}")
+
+            if idea_id not in ckpt.searches:
+                try:
+                    urls = find_top_product_urls(page, query, top_n=config.TOP_N_PRODUCTS, cache=cache, http=http)
+                except Blocked as e:
+                    print(f"[{idea_id}] ошибка search: {e}")
+                    continue
+                ckpt.record_search(idea_id, urls)
+
+            for product_url in ckpt.searches[idea_id]:
+                if (idea_id, product_url) in ckpt.cards:
+                    continue
+                try:
+                    card_shop, card_price, offers = parse_card_once(page, product_url, cache=cache, http=http)
+                except Blocked as e:
+                    print(f"[{idea_id}] ошибка card: {e}")
+                    continue
+                ckpt.record_card(idea_id, product_url,
+                                 card_rows(idea_id, query, product_url, card_shop, card_price, offers))
+    finally:
+        close_search_tabs(page)
+
+def crawl_parallel(page, ideas, ckpt, concurrency, cache=None, http=None):
+    """
+    Пул из N вкладок одного браузера: куки и ПВЗ общие (их один раз ставит set_pvz),
+    вкладки разбирают задачи поиска и карточек из одной очереди.
+    Порядок строк задаёт assemble_rows, поэтому выгрузка совпадает с crawl_serial.
+    """
+    REGISTRY.seed_from_checkpoint(ckpt)
+    jobs = queue.Queue()
+    queries = dict(ideas)
+
+    def put_cards(idea_id):
+        for product_url in ckpt.searches[idea_id]:
+            if (idea_id, product_url) not in ckpt.cards:
+                jobs.put(("card", idea_id, product_url))
+
+    for idea_id, _ in ideas:
+        if idea_id in ckpt.searches:
+            put_cards(idea_id)
+        else:
+            jobs.put(("search", idea_id, None))
+
+    def worker(tab):
+        while True:
+            job = jobs.get()
+            if job is None:
+                jobs.task_done()
+                return
+
+            kind, idea_id, product_url = job
+            query = queries[idea_id]
+            try:
+                if kind == "search":
+                    print(f"[{idea_id}] query={query}")
+                    urls = find_top_product_urls(tab, query, top_n=config.TOP_N_PRODUCTS, cache=cache, http=http)
+                    ckpt.record_search(idea_id, urls)
+                    put_cards(idea_id)
+                else:
+                    card_shop, card_price, offers = parse_card_once(tab, product_url, cache=cache, http=http)
+                    ckpt.record_card(idea_id, product_url,
+                                     card_rows(idea_id, query, product_url, card_shop, card_price, offers))
+            except Exception as e:
+                print(f"[{idea_id}] ошибка {kind}: {e}")
+            finally:
+                jobs.task_done()
+
+    tabs = open_tabs(page, concurrency)
+    try:
+        threads = [threading.Thread(target=worker, args=(tab,), daemon=True) for tab in tabs]
+        for t in threads:
+            t.start()
+
+        jobs.join()
+        for _ in threads:
+            jobs.put(None)
+        for t in threads:
+            t.join()
+    finally:
+        close_tabs(tabs)
+
+def crawl(page, ideas, ckpt, concurrency, cache=None, http=None):
+    if concurrency > 1:
+        crawl_parallel(page, ideas, ckpt, concurrency, cache, http)
+    else:
+        crawl_serial(page, ideas, ckpt, cache, http)
+
+def open_http(page, cache=None):
+    """
+    HTTP-клиент на куках браузерной сессии (после set_pvz); ответы composer-api идут через cache.
+    page=None (офлайн) — только ответы из кэша, записанные прошлым обходом в HTTP-режиме.
+    """
+    try:
+        if page is None:
+            return OzonHttp([], cache=cache)
+        return OzonHttp(http_fetch.cookies_from_drission(page), user_agent=page.user_agent, cache=cache)
+    except Exception as e:
+        print(f"HTTP-режим недоступен: {e}")
+        return None
+
+def open_cache(args):
+    if args.offline:
+        return PageCache(offline=True)
+    if config.PAGE_CACHE_ENABLED and not args.no_cache:
+        return PageCache()
+    return None
+
+def run_shard(job):
+    """Рабочий процесс шарда: свой профиль Chromium, свой ПВЗ, свой журнал обхода."""
+    shard_idx, ideas, concurrency, use_cache, use_http, top_n = job
+    config.TOP_N_PRODUCTS = top_n  # spawn: процесс шарда читает config заново, --depth передаём явно
+    profile = os.path.abspath(os.path.join(config.SHARD_PROFILES_DIR, f"shard{shard_idx}"))
+    page = get_page_instance(profile)
+
+    try:
+        session_store.ensure_pvz(page, set_pvz, profile=f"shard{shard_idx}")
+    except Exception as e:
+        print(f"[shard {shard_idx}] Ошибка ПВЗ: {e}")
+
+    ckpt = Checkpoint(checkpoint.shard_path(shard_idx))
+    cache = PageCache() if use_cache else None
+    http = open_http(page, cache) if use_http else None
+    try:
+        crawl(page, ideas, ckpt, concurrency, cache, http)
+    finally:
+        print(f"[shard {shard_idx}] {REGISTRY.summary()}")
+        GOVERNOR.export_metrics(f"{os.path.splitext(config.RATE_METRICS_JSON)[0]}.shard{shard_idx}.json")
+        ckpt.close()
+        if cache:
+            cache.close()
+        if http:
+            http.close()
+        try: page.quit()
+        except: pass
+
+def split_shards(ideas, shards):
+    buckets = [[] for _ in range(shards)]
+    for idea_id, query in ideas:
+        buckets[idea_id % shards].append((idea_id, query))
+    return buckets
+
+def crawl_sharded(ideas, shards, concurrency, use_cache, use_http):
+    """
+    Делит идеи по idea_id на K шардов и обходит их в K процессах.
+    Каждый шард пишет свой журнал; сливает их экспорт в порядке input.xlsx,
+    поэтому результат не зависит от того, какой шард закончил первым.
+    """
+    jobs = [(i, bucket, concurrency, use_cache, use_http, config.TOP_N_PRODUCTS) for i, bucket in enumerate(split_shards(ideas, shards)) if bucket]
+
+    with mp.get_context("spawn").Pool(len(jobs)) as pool:
+        pool.map(run_shard, jobs)
+
+def handle_job(page, job, cache=None, http=None):
+    """Задание очереди (work_queue) -> результат: список product_url или строки выгрузки."""
+    if job.kind == "search":
+        print(f"[{job.idea_id}] query={job.query}")
+        return find_top_product_urls(page, job.query, top_n=config.TOP_N_PRODUCTS, cache=cache, http=http)
+    card_shop, card_price, offers = parse_card_once(page, job.product_url, cache=cache, http=http)
+    return card_rows(job.idea_id, job.query, job.product_url, card_shop, card_price, offers)
+
+def crawl_queue(page, wq, concurrency, cache=None, http=None):
+    """
+    Воркер общей очереди: N вкладок, каждая в своём потоке берёт задания, пока они есть.
+    Другие процессы этой машины с тем же QUEUE_URL работают параллельно и без повторов.
+    """
+    tabs = open_tabs(page, concurrency)
+    done = [0] * len(tabs)
+    def worker(i, tab):
+        done[i] = work_queue.run_worker(wq, lambda job: handle_job(tab, job, cache, http))
+
+    try:
+        threads = [threading.Thread(target=worker, args=(i, tab), daemon=True) for i, tab in enumerate(tabs)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        close_tabs(tabs)
+    print(f"worker: заданий выполнено {sum(done)}, очередь {wq.counts()}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--concurrency", type=int, default=config.CRAWL_CONCURRENCY,
+                    help="сколько вкладок браузера обходят идеи параллельно")
+    ap.add_argument("--shards", type=int, default=1,
+                    help="сколько процессов с отдельными профилями Chromium запустить")
+    ap.add_argument("--offline", action="store_true",
+                    help="разобрать страницы из кэша без браузера")
+    ap.add_argument("--no-cache", action="store_true",
+                    help="не читать и не писать кэш страниц")
+    ap.add_argument("--http", action="store_true", default=config.FETCH_MODE == "http",
+                    help="поиск и продавцы через composer-api с куками браузера, браузер — при проверке")
+    ap.add_argument("--restart", action="store_true",
+                    help="забыть незавершённый обход и начать заново; с --enqueue — новый запуск очереди")
+    ap.add_argument("--depth", type=int,
+                    help="сколько товаров брать из поиска (по умолчанию TOP_N_PRODUCTS); "
+                         "больше одной страницы выдачи — страницы грузятся параллельно")
+    ap.add_argument("--enqueue", action="store_true",
+                    help="поставить идеи в общую очередь (config.QUEUE_URL) и выйти")
+    ap.add_argument("--worker", action="store_true",
+                    help="брать задания из общей очереди, пока они есть")
+    ap.add_argument("--export-queue", action="store_true",
+                    help="выгрузить offers из результатов общей очереди")
+    args = ap.parse_args()
+
+    ideas = load_ideas()
+    text_parsing.set_reference_date()
+    if args.depth:
+        config.TOP_N_PRODUCTS = args.depth
+
+    if args.restart:
+        checkpoint.discard_all()
+
+    if args.enqueue or args.worker:
+        wq = work_queue.open_queue()
+        if args.enqueue:
+            if args.restart:
+                print(f"Очередь: запуск {wq.new_run()}")
+            added = wq.enqueue_ideas(ideas)
+            print(f"В очередь: {added} новых идей, {wq.counts()}")
+            if not added and not wq.pending():
+                print("Все идеи уже обойдены в этом запуске очереди; следующий обход — --restart --enqueue")
+        else:
+            page = get_page_instance()
+            try:
+                session_store.ensure_pvz(page, set_pvz)
+            except Exception as e:
+                print(f"Ошибка ПВЗ: {e}")
+            cache = open_cache(args)
+            http = open_http(page, cache) if args.http else None
+            try:
+                crawl_queue(page, wq, args.concurrency, cache, http)
+            finally:
+                print(REGISTRY.summary())
+                print(GOVERNOR.summary())
+                if cache:
+                    cache.close()
+                if http:
+                    http.close()
+                try: page.quit()
+                except: pass
+        wq.close()
+        return
+
+    wq = None
+    if args.export_queue:
+        # все задания очереди завершены (или в dead) — одна выгрузка на весь обход
+        wq = work_queue.open_queue()
+        if wq.pending():
+            print(f"В очереди ещё есть незавершённые задания: {wq.counts()}")
+        ckpt = wq.to_checkpoint()
+    elif args.offline:
+        # повторный разбор кэша не трогает журнал обхода
+        ckpt = Checkpoint()
+        cache = open_cache(args)
+        http = open_http(None, cache)  # ответы composer-api, записанные обходом в HTTP-режиме
+        crawl_serial(None, ideas, ckpt, cache, http)
+        print(cache.stats())
+        cache.close()
+        if http:
+            http.close()
+    elif args.shards > 1:
+        use_cache = config.PAGE_CACHE_ENABLED and not args.no_cache
+        crawl_sharded(ideas, args.shards, args.concurrency, use_cache, args.http)
+        ckpt = Checkpoint(config.CHECKPOINT_JSONL)
+    else:
+        ckpt = Checkpoint(config.CHECKPOINT_JSONL)
+        page = get_page_instance()
+
+        try:
+            session_store.ensure_pvz(page, set_pvz)
+        except Exception as e:
+            print(f"Ошибка ПВЗ: {e}")
+
+        cache = open_cache(args)
+        http = open_http(page, cache) if args.http else None
+        crawl(page, ideas, ckpt, args.concurrency, cache, http)
+        if cache:
+            print(cache.stats())
+            cache.close()
+        if http:
+            http.close()
+
+    ckpt.close()
+    crawled_here = not args.offline and not args.export_queue
+    if args.shards <= 1 and not args.export_queue:
+        print(REGISTRY.summary())
+    if crawled_here and args.shards <= 1:
+        print(GOVERNOR.summary())
+        GOVERNOR.export_metrics()
+    if config.RESOURCE_REPORT:
+        print(RESOURCE_STATS.summary())
+
+    offers = pd.DataFrame(assemble_rows(ideas, ckpt))
+    path = storage.write_table(offers, "offers")
+    print(f"Saved {path}")
+
+    # незавершённый обход не пишем в историю цен: после дообхода его строки попали бы туда дважды
+    if wq:
+        # очередь: только когда заданий не осталось, и один раз на запуск очереди
+        complete = not wq.pending()
+        if complete and wq.history_recorded():
+            print(f"Запуск очереди {wq.run_id()} уже записан в историю цен")
+            complete = False
+    else:
+        complete = checkpoint.discard_if_complete(ckpt, ideas) if crawled_here else True
+
+    if config.PRICE_HISTORY_ENABLED and not args.offline and complete:
+        # повторный разбор кэша — не новое наблюдение, в историю не пишем
+        price_history.record_run(offers)
+        if wq:
+            wq.mark_history_recorded()
+    if wq:
+        wq.close()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
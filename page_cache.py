@@ -0,0 +1,164 @@
+import time
+import zlib
+import sqlite3
+import hashlib
+import threading
+
+import config
+
+# Кэш HTML страниц Ozon (поиск, карточка, снимок модалки "Есть дешевле").
+# Содержимое хранится сжатым и адресуется по sha256, поэтому одинаковые
+# страницы занимают место один раз. Запись pages указывает на blob
+# и помнит время загрузки (для TTL) и последнего обращения (для LRU).
+# Сжатый размер всех blobs ведут триггеры в meta.bytes — в той же транзакции, что и
+# запись: put не суммирует size по всем blobs (size лежит за BLOB, и SUM читал бы
+# цепочку overflow-страниц каждой страницы кэша).
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    sha TEXT PRIMARY KEY,
+    data BLOB NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pages (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    url TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pages_accessed ON pages (accessed_at);
+CREATE INDEX IF NOT EXISTS pages_sha ON pages (sha);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS blobs_bytes_add AFTER INSERT ON blobs BEGIN
+    UPDATE meta SET value = value + NEW.size WHERE key = 'bytes';
+END;
+CREATE TRIGGER IF NOT EXISTS blobs_bytes_sub AFTER DELETE ON blobs BEGIN
+    UPDATE meta SET value = value - OLD.size WHERE key = 'bytes';
+END;
+"""
+
+
+def page_key(kind: str, url: str) -> str:
+    return hashlib.sha1(f"{kind}\n{url}".encode("utf-8")).hexdigest()
+
+
+class PageCache:
+    """
+    kind — тип страницы: "search", "card" или "modal" (TTL задаётся в config.PAGE_CACHE_TTL_SEC).
+    offline=True — режим повторного разбора: TTL игнорируется, браузер не нужен.
+    """
+
+    def __init__(self, path=None, offline=False, ttl=None, max_bytes=None):
+        self.path = path or config.PAGE_CACHE_DB
+        self.offline = offline
+        self.ttl = ttl or config.PAGE_CACHE_TTL_SEC
+        self.max_bytes = max_bytes or config.PAGE_CACHE_MAX_BYTES
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        self._init_bytes()
+        self.hits = 0
+        self.misses = 0
+
+    def _init_bytes(self) -> None:
+        """Кэш без meta.bytes (создан до счётчика): один раз убираем сироты и считаем размер."""
+        with self.conn:
+            if self.conn.execute("SELECT 1 FROM meta WHERE key = 'bytes'").fetchone():
+                return
+            self.conn.execute("DELETE FROM blobs WHERE sha NOT IN (SELECT sha FROM pages)")
+            self.conn.execute(
+                "INSERT OR IGNORE INTO meta (key, value) SELECT 'bytes', COALESCE(SUM(size), 0) FROM blobs"
+            )
+
+    def total_bytes(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT value FROM meta WHERE key = 'bytes'").fetchone()[0]
+
+    def get(self, kind: str, url: str):
+        key = page_key(kind, url)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT p.fetched_at, b.data FROM pages p JOIN blobs b ON b.sha = p.sha WHERE p.key = ?",
+                (key,),
+            ).fetchone()
+
+            now = time.time()
+            if not row or (not self.offline and now - row[0] > self.ttl.get(kind, 0)):
+                self.misses += 1
+                return None
+
+            self.conn.execute("UPDATE pages SET accessed_at = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return zlib.decompress(row[1]).decode("utf-8")
+
+    def put(self, kind: str, url: str, html: str) -> None:
+        if self.offline or html is None:
+            return
+
+        raw = html.encode("utf-8")
+        sha = hashlib.sha256(raw).hexdigest()
+        data = zlib.compress(raw, 6)
+        now = time.time()
+
+        key = page_key(kind, url)
+
+        with self.lock:
+            old = self.conn.execute("SELECT sha FROM pages WHERE key = ?", (key,)).fetchone()
+            self.conn.execute(
+                "INSERT OR IGNORE INTO blobs (sha, data, size) VALUES (?, ?, ?)",
+                (sha, data, len(data)),
+            )
+            self.conn.execute(
+                "INSERT OR REPLACE INTO pages (key, kind, url, sha, fetched_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, kind, url, sha, now, now),
+            )
+            if old and old[0] != sha:
+                self._drop_unused([old[0]])  # страница обновилась — прежний blob больше не нужен
+            self._evict()
+            self.conn.commit()
+
+    def _drop_unused(self, shas) -> None:
+        self.conn.executemany(
+            "DELETE FROM blobs WHERE sha = ? AND NOT EXISTS (SELECT 1 FROM pages WHERE sha = ?)",
+            [(sha, sha) for sha in set(shas)],
+        )
+
+    def _evict(self) -> None:
+        """LRU: выкидываем давно не читанные страницы, пока кэш больше лимита."""
+        while True:
+            total = self.conn.execute("SELECT value FROM meta WHERE key = 'bytes'").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+
+            victims = self.conn.execute(
+                "SELECT key, sha FROM pages ORDER BY accessed_at LIMIT 50"
+            ).fetchall()
+            if not victims:
+                return
+
+            self.conn.executemany("DELETE FROM pages WHERE key = ?", [(k,) for k, _ in victims])
+            self._drop_unused(sha for _, sha in victims)
+
+    def entries(self, kind: str | None = None):
+        """(kind, url) всех сохранённых страниц, старые первыми."""
+        sql = "SELECT kind, url FROM pages"
+        params = ()
+        if kind:
+            sql += " WHERE kind = ?"
+            params = (kind,)
+        with self.lock:
+            return self.conn.execute(sql + " ORDER BY fetched_at", params).fetchall()
+
+    def stats(self) -> str:
+        return f"page cache: hits={self.hits} misses={self.misses}"
+
+    def close(self) -> None:
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,171 @@
+import re
+import json
+import html as htmllib
+
+import config
+from text_parsing import parse_price_rub
+
+# Ozon кладёт состояние виджетов прямо в разметку:
+#   <div id="state-webSellerList-3121879-default-1" data-state='{"sellers": [...]}'>
+# Один page.html и разбор в Python вместо десятков ele()/parent() через CDP.
+
+STATE_RE = re.compile(
+    r"""<div\b[^>]*?\bid="state-(\w+?)-[^"]*"[^>]*?\bdata-state=(?:'([^']*)'|"([^"]*)")"""
+)
+
+NAME_KEYS = ("name", "sellerName", "title")
+LINK_KEYS = ("link", "url", "href", "sellerLink")
+DELIVERY_WORDS = ("доставим", "доставка", "сегодня", "завтра")
+
+
+def states_from_html(page_html):
+    """widget -> список распарсенных state-объектов (виджет может встречаться несколько раз)."""
+    states = {}
+    if not page_html:
+        return states
+
+    for m in STATE_RE.finditer(page_html):
+        raw = m.group(2) if m.group(2) is not None else m.group(3)
+        try:
+            data = json.loads(htmllib.unescape(raw))
+        except ValueError:
+            continue
+        states.setdefault(m.group(1), []).append(data)
+    return states
+
+
+def find_text(obj, pred):
+    """Первая строка во вложенной структуре, для которой pred(строка) истинно."""
+    if isinstance(obj, str):
+        return obj if pred(obj) else None
+    if isinstance(obj, dict):
+        obj = list(obj.values())
+    if isinstance(obj, list):
+        for v in obj:
+            found = find_text(v, pred)
+            if found:
+                return found
+    return None
+
+
+def first_key(d, keys):
+    for k in keys:
+        v = d.get(k)
+        if isinstance(v, str) and v.strip():
+            return v
+    return ""
+
+
+def find_seller_items(obj):
+    """Список продавцов: первый список словарей, где у элементов есть имя и цена."""
+    if isinstance(obj, dict):
+        for v in obj.values():
+            found = find_seller_items(v)
+            if found:
+                return found
+    elif isinstance(obj, list):
+        dicts = [x for x in obj if isinstance(x, dict)]
+        if dicts and all(first_key(x, NAME_KEYS) and find_text(x, lambda t: "₽" in t) for x in dicts):
+            return dicts
+        for v in obj:
+            found = find_seller_items(v)
+            if found:
+                return found
+    return None
+
+
+def offers_from_states(states, parse_delivery_days, norm_text):
+    """
+    Офферы из state виджета webSellerList в формате collect_cheaper_offers.
+    Пустой список — state не найден или формат поменялся (тогда разбираем DOM).
+    """
+    offers = []
+    seen = set()
+
+    for state in states.get("webSellerList", []):
+        for item in find_seller_items(state) or []:
+            offer_shop = norm_text(first_key(item, NAME_KEYS))
+            offer_shop_url = first_key(item, LINK_KEYS)
+            if offer_shop_url.startswith("/"):
+                offer_shop_url = config.BASE_URL.rstrip("/") + offer_shop_url
+            offer_price_rub = parse_price_rub(find_text(item.get("price", item), lambda t: "₽" in t))
+            offer_delivery_text = norm_text(
+                find_text(item, lambda t: any(w in t.lower() for w in DELIVERY_WORDS)) or ""
+            )
+
+            key = (offer_shop, offer_price_rub, offer_delivery_text, offer_shop_url)
+            if offer_shop and key not in seen:
+                seen.add(key)
+                offers.append({
+                    "offer_shop": offer_shop,
+                    "offer_shop_url": offer_shop_url,
+                    "offer_price_rub": offer_price_rub,
+                    "offer_delivery_text": offer_delivery_text,
+                    "offer_delivery_days": parse_delivery_days(offer_delivery_text),
+                })
+
+    return offers
+
+
+def card_from_states(states, norm_text):
+    """(card_shop, card_price) из webCurrentSeller / webPrice; пустые значения — не нашли."""
+    card_shop = ""
+    for state in states.get("webCurrentSeller", []):
+        if isinstance(state, dict):
+            card_shop = norm_text(first_key(state, NAME_KEYS)) or norm_text(
+                find_text(state.get("seller", {}), lambda t: bool(t.strip())) or ""
+            )
+        if card_shop:
+            break
+
+    card_price = None
+    for state in states.get("webPrice", []):
+        if isinstance(state, dict):
+            card_price = parse_price_rub(state.get("cardPrice") or "")
+        if card_price is not None:
+            break
+
+    return card_shop, card_price
+
+
+def states_from_widget_states(widget_states):
+    """То же, что states_from_html, но из поля widgetStates ответа composer-api."""
+    states = {}
+    for widget_id, raw in (widget_states or {}).items():
+        try:
+            data = json.loads(raw) if isinstance(raw, str) else raw
+        except ValueError:
+            continue
+        states.setdefault(widget_id.split("-", 1)[0], []).append(data)
+    return states
+
+
+def iter_texts(obj):
+    if isinstance(obj, str):
+        yield obj
+    elif isinstance(obj, dict):
+        for v in obj.values():
+            yield from iter_texts(v)
+    elif isinstance(obj, list):
+        for v in obj:
+            yield from iter_texts(v)
+
+
+def product_links_from_states(states, top_n, widget="searchResultsV2"):
+    """Ссылки на товары из выдачи поиска в порядке ранжирования, без повторов."""
+    urls = []
+    seen = set()
+    for state in states.get(widget, []):
+        for t in iter_texts(state):
+            if "/product/" not in t:
+                continue
+            u = t.split("?")[0]
+            if u.startswith("/"):
+                u = config.BASE_URL.rstrip("/") + u
+            if u in seen:
+                continue
+            seen.add(u)
+            urls.append(u)
+            if len(urls) >= top_n:
+                return urls
+    return urls
@@ -9,6 +9,13 @@ import pandas as pd
 from playwright.sync_api import sync_playwright, Page, BrowserContext
 
 import config
+from resource_filter import ResourceStats, install_playwright
+from waits import Politeness, pw_wait_network_idle
+from rate_governor import GOVERNOR, playwright_challenge
+import session_store
+
+
+POLITENESS = Politeness()
 
 
 def random_sleep(min_s=1.0, max_s=3.0):
@@ -16,39 +23,132 @@ def random_sleep(min_s=1.0, max_s=3.0):
     time.sleep(random.uniform(min_s, max_s))
 
 
-def inject_stealth(context: BrowserContext):
-    """
-    Внедряем JS-скрипты, скрывающие признаки автоматизации.
-    Заменяет библиотеку playwright-stealth.
-    """
+STEALTH_SCRIPTS = [
     # 1. Скрываем navigator.webdriver
-    context.add_init_script("""
+    """
         Object.defineProperty(navigator, 'webdriver', {
             get: () => undefined
         });
-    """)
-
+    """,
     # 2. Подделываем navigator.plugins (у роботов он часто пустой)
-    context.add_init_script("""
+    """
         Object.defineProperty(navigator, 'plugins', {
             get: () => [1, 2, 3, 4, 5]
         });
-    """)
-
+    """,
     # 3. Добавляем window.chrome (есть в обычном Chrome, нет в чистом Playwright)
-    context.add_init_script("""
+    """
         window.chrome = { runtime: {} };
-    """)
-
+    """,
     # 4. Подделываем разрешения
-    context.add_init_script("""
+    """
         const originalQuery = window.navigator.permissions.query;
         window.navigator.permissions.query = (parameters) => (
             parameters.name === 'notifications' ?
             Promise.resolve({ state: 'granted', onchange: null }) :
             originalQuery(parameters)
         );
-    """)
+    """,
+]
+
+# Запуск браузера с отключением флагов автоматизации
+LAUNCH_OPTIONS = dict(
+    headless=False,
+    channel="chrome",  # Используем обычный Chrome
+    args=[
+        "--disable-blink-features=AutomationControlled",
+        "--no-sandbox",
+        "--disable-infobars"
+    ],
+)
+
+CONTEXT_OPTIONS = dict(
+    locale="ru-RU",
+    user_agent=(
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/121.0.0.0 Safari/537.36"
+    ),
+    viewport={"width": 1920, "height": 1080},
+    device_scale_factor=1,
+)
+
+CONSENT_SELECTORS = [
+    "button:has-text('Принять')",
+    "button:has-text('Согласен')",
+    "button:has-text('Понятно')",
+    "button:has-text('Закрыть')",
+    "[aria-label='Закрыть']",
+]
+
+PVZ_CONFIRM_SELECTORS = [
+    "button:has-text('Выбрать')",
+    "button:has-text('Выбрать этот пункт')",
+    "button:has-text('Подтвердить')",
+    "button:has-text('Заберу отсюда')",
+    "button:has-text('Сделать основным')",
+]
+
+POPUP_SELECTORS = [
+    "button:has-text('Принять')",
+    "[aria-label='Закрыть']",
+    "button:has-text('Закрыть')",
+]
+
+OZON_CARD_PATTERNS = [
+    "text=/по\\s+ozon\\s*карте/i",
+    "text=/ozon\\s*карте/i",
+    "text=/ozon\\s*карта/i",
+    "text=/по\\s+карте/i",
+]
+
+# Тексты блоков вокруг метки "по Ozon карте" одним evaluate, в порядке проверки:
+# ancestor::div[1], ancestor::div[2], ancestor::section[1], ancestor::div[contains(@class,'price')][1]
+PRICE_BOXES_JS = """
+el => {
+    const up = (pred, n) => {
+        let e = el.parentElement, k = 0;
+        for (; e; e = e.parentElement) if (pred(e) && ++k === n) return e;
+        return null;
+    };
+    const isDiv = e => e.tagName === 'DIV';
+    return [
+        up(isDiv, 1),
+        up(isDiv, 2),
+        up(e => e.tagName === 'SECTION', 1),
+        up(e => isDiv(e) && (e.getAttribute('class') || '').includes('price'), 1),
+    ].map(e => e ? e.innerText : null);
+}
+"""
+
+# href всех ссылок на товары за один вызов (вместо nth(i).get_attribute на каждую)
+PRODUCT_HREFS_JS = "els => els.slice(0, 300).map(a => a.getAttribute('href'))"
+
+RUB_PRICE_RE = re.compile(r"(\d[\d\s]*)(?:\s*₽|₽)")
+
+
+def inject_stealth(context: BrowserContext):
+    """
+    Внедряем JS-скрипты, скрывающие признаки автоматизации.
+    Заменяет библиотеку playwright-stealth.
+    """
+    for script in STEALTH_SCRIPTS:
+        context.add_init_script(script)
+
+
+def search_url_for(query: str) -> str:
+    return f"{config.BASE_URL}search/?text={urllib.parse.urlencode({'': query})[1:]}"
+
+
+def normalize_product_href(href: Optional[str]) -> Optional[str]:
+    if not href:
+        return None
+    if href.startswith("/"):
+        href = config.BASE_URL.rstrip("/") + href
+    href = href.split("?")[0]
+    if "/product/" not in href:
+        return None
+    return href
 
 
 def norm_price(text: str) -> str:
@@ -57,6 +157,33 @@ def norm_price(text: str) -> str:
     return re.sub(r"\s+", " ", text).strip()
 
 
+def add_product_links(hrefs, links: List[str], seen: set, limit: int) -> None:
+    for href in hrefs:
+        href = normalize_product_href(href)
+        if not href or href in seen:
+            continue
+        seen.add(href)
+        links.append(href)
+        if len(links) >= limit:
+            break
+
+
+def price_in_text(txt: Optional[str]) -> Optional[str]:
+    if not txt:
+        return None
+    m = RUB_PRICE_RE.search(re.sub(r"\s+", " ", txt))
+    return norm_price(m.group(0)) if m else None
+
+
+def price_near_ozon(body: str) -> Optional[str]:
+    """Цена в окне вокруг первого упоминания Ozon в тексте страницы."""
+    body = re.sub(r"\s+", " ", body)
+    idx = body.lower().find("ozon")
+    if idx == -1:
+        return None
+    return price_in_text(body[max(0, idx - 200): idx + 400])
+
+
 def safe_text(page: Page, selector: str) -> Optional[str]:
     try:
         loc = page.locator(selector).first
@@ -86,22 +213,10 @@ def set_pvz(page: Page, pvz_url: str) -> None:
     page.goto(pvz_url, wait_until="domcontentloaded", timeout=config.NAV_TIMEOUT_MS)
     random_sleep(1.5, 2.5)
 
-    for sel in [
-        "button:has-text('Принять')",
-        "button:has-text('Согласен')",
-        "button:has-text('Понятно')",
-        "button:has-text('Закрыть')",
-        "[aria-label='Закрыть']",
-    ]:
+    for sel in CONSENT_SELECTORS:
         click_if_exists(page, sel)
 
-    for sel in [
-        "button:has-text('Выбрать')",
-        "button:has-text('Выбрать этот пункт')",
-        "button:has-text('Подтвердить')",
-        "button:has-text('Заберу отсюда')",
-        "button:has-text('Сделать основным')",
-    ]:
+    for sel in PVZ_CONFIRM_SELECTORS:
         if click_if_exists(page, sel):
             random_sleep(1.5, 2.0)
             break
@@ -111,11 +226,17 @@ def set_pvz(page: Page, pvz_url: str) -> None:
 
 
 def collect_search_product_links(page: Page, query: str, limit: int) -> List[str]:
-    search_url = f"{config.BASE_URL}search/?text={urllib.parse.urlencode({'': query})[1:]}"
+    search_url = search_url_for(query)
     print(f"Search_url : {search_url}")
     
+    GOVERNOR.acquire()
+    POLITENESS.wait(id(page))
     page.goto(search_url, wait_until="domcontentloaded", timeout=config.NAV_TIMEOUT_MS)
-    random_sleep(2.0, 3.5)
+    try:
+        page.wait_for_selector("a[href*='/product/']", timeout=config.READY_TIMEOUT_SEC * 1000)
+    except Exception:
+        pass
+    GOVERNOR.observe(playwright_challenge(page))
 
     # Движение мышью
     try:
@@ -123,11 +244,7 @@ def collect_search_product_links(page: Page, query: str, limit: int) -> List[str
     except Exception:
         pass
 
-    for sel in [
-        "button:has-text('Принять')",
-        "[aria-label='Закрыть']",
-        "button:has-text('Закрыть')",
-    ]:
+    for sel in POPUP_SELECTORS:
         click_if_exists(page, sel)
 
     links = []
@@ -141,29 +258,12 @@ def collect_search_product_links(page: Page, query: str, limit: int) -> List[str
         random_sleep(config.SCROLL_PAUSE_SEC, config.SCROLL_PAUSE_SEC + 1.5)
 
         try:
-            cnt = product_link_locator.count()
-            print(f"cnt : {cnt}")
+            hrefs = product_link_locator.evaluate_all(PRODUCT_HREFS_JS)
+            print(f"cnt : {len(hrefs)}")
         except Exception:
-            cnt = 0
+            hrefs = []
 
-        for i in range(min(cnt, 300)):
-            try:
-                href = product_link_locator.nth(i).get_attribute("href")
-            except Exception:
-                continue
-            if not href:
-                continue
-            if href.startswith("/"):
-                href = config.BASE_URL.rstrip("/") + href
-            href = href.split("?")[0]
-            if "/product/" not in href:
-                continue
-            if href in seen:
-                continue
-            seen.add(href)
-            links.append(href)
-            if len(links) >= limit:
-                break
+        add_product_links(hrefs, links, seen, limit)
 
         # Скролл
         scroll_y = random.randint(700, 1200)
@@ -205,44 +305,24 @@ def extract_seller_default(page: Page) -> Optional[str]:
 
 
 def extract_ozon_card_price(page: Page) -> Optional[str]:
-    patterns = [
-        "text=/по\\s+ozon\\s*карте/i",
-        "text=/ozon\\s*карте/i",
-        "text=/ozon\\s*карта/i",
-        "text=/по\\s+карте/i",
-    ]
-    rub_price_re = re.compile(r"(\d[\d\s]*)(?:\s*₽|₽)")
-
-    for p in patterns:
+    # окно вокруг "ozon" в тексте страницы от метки не зависит — снимаем body один раз
+    body_checked = False
+    for p in OZON_CARD_PATTERNS:
         try:
             anchor = page.locator(p).first
             if anchor.count() == 0:
                 continue
 
-            for xp in [
-                "xpath=ancestor::div[1]",
-                "xpath=ancestor::div[2]",
-                "xpath=ancestor::section[1]",
-                "xpath=ancestor::div[contains(@class,'price')][1]",
-            ]:
-                try:
-                    box = anchor.locator(xp)
-                    txt = box.inner_text(timeout=2000)
-                    txt = re.sub(r"\s+", " ", txt).strip()
-                    m = rub_price_re.search(txt)
-                    if m:
-                        return norm_price(m.group(0))
-                except Exception:
-                    continue
-            
-            body = page.locator("body").inner_text(timeout=3000)
-            body = re.sub(r"\s+", " ", body)
-            idx = body.lower().find("ozon")
-            if idx != -1:
-                window = body[max(0, idx - 200): idx + 400]
-                m = rub_price_re.search(window)
-                if m:
-                    return norm_price(m.group(0))
+            for txt in anchor.evaluate(PRICE_BOXES_JS, timeout=2000):
+                price = price_in_text(txt)
+                if price:
+                    return price
+
+            if not body_checked:
+                body_checked = True
+                price = price_near_ozon(page.locator("body").inner_text(timeout=3000))
+                if price:
+                    return price
         except Exception:
             continue
 
@@ -257,14 +337,13 @@ class Row:
 
 
 def parse_product(page: Page, url: str) -> Tuple[Optional[str], Optional[str]]:
+    GOVERNOR.acquire()
+    POLITENESS.wait(id(page))
     page.goto(url, wait_until="domcontentloaded", timeout=config.NAV_TIMEOUT_MS)
-    random_sleep(2.0, 4.0)
+    pw_wait_network_idle(page)
+    GOVERNOR.observe(playwright_challenge(page))
 
-    for sel in [
-        "button:has-text('Принять')",
-        "[aria-label='Закрыть']",
-        "button:has-text('Закрыть')",
-    ]:
+    for sel in POPUP_SELECTORS:
         click_if_exists(page, sel)
 
     seller = extract_seller_default(page)
@@ -278,45 +357,49 @@ def read_articles_xlsx(path: str) -> List[str]:
     return [x for x in col if x]
 
 
+def write_rows(out_rows: List[Row]) -> None:
+    out_df = pd.DataFrame([r.__dict__ for r in out_rows])
+    out_df.rename(
+        columns={
+            "article": "Артикул",
+            "seller": "Селлер",
+            "ozon_card_price": "Цена_по_карте_Ozon",
+        },
+        inplace=True,
+    )
+    out_df.to_excel(config.OUTPUT_XLSX, index=False)
+
+
 def main():
     articles = read_articles_xlsx(config.INPUT_XLSX)
     out_rows: List[Row] = []
 
     with sync_playwright() as p:
-        # Запуск браузера с отключением флагов автоматизации
-        browser = p.chromium.launch(
-            headless=False,
-            channel="chrome",  # Используем обычный Chrome
-            args=[
-                "--disable-blink-features=AutomationControlled",
-                "--no-sandbox",
-                "--disable-infobars"
-            ]
-        )
-        
-        context = browser.new_context(
-            locale="ru-RU",
-            user_agent=(
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/121.0.0.0 Safari/537.36"
-            ),
-            viewport={"width": 1920, "height": 1080},
-            device_scale_factor=1,
-        )
-        
+        browser = p.chromium.launch(**LAUNCH_OPTIONS)
+        # куки и localStorage с выбранным ПВЗ из прошлого запуска, если снимок ещё годен
+        state = session_store.playwright_state()
+        context = browser.new_context(**CONTEXT_OPTIONS, storage_state=state)
+
         # Внедряем защиту от обнаружения (вместо библиотеки)
         inject_stealth(context)
 
+        resource_stats = ResourceStats()
+        if config.RESOURCE_FILTER_ENABLED:
+            install_playwright(context, resource_stats)
+
         context.set_default_navigation_timeout(config.NAV_TIMEOUT_MS)
         context.set_default_timeout(config.ACTION_TIMEOUT_MS)
 
         page = context.new_page()
         
-        try:
-            set_pvz(page, config.PVZ_URL)
-        except Exception as e:
-            print(f"Ошибка установки ПВЗ: {e}")
+        if state:
+            print("Сессия с ПВЗ восстановлена из снимка")
+        else:
+            try:
+                set_pvz(page, config.PVZ_URL)
+                session_store.save_playwright(context)
+            except Exception as e:
+                print(f"Ошибка установки ПВЗ: {e}")
 
         for article in articles:
             try:
@@ -331,7 +414,9 @@ def main():
                         seller, price = parse_product(page, url)
                     except Exception:
                         seller, price = None, None
+                    resource_stats.report(id(page), url)
 
+                    # пауза до следующей карточки — POLITENESS.wait в parse_product
                     out_rows.append(
                         Row(
                             article=article,
@@ -339,21 +424,15 @@ def main():
                             ozon_card_price=price or "",
                         )
                     )
-                    random_sleep(1.0, 3.0)
             except Exception as e:
                 print(f"Ошибка при обработке {article}: {e}")
                 continue
 
-        out_df = pd.DataFrame([r.__dict__ for r in out_rows])
-        out_df.rename(
-            columns={
-                "article": "Артикул",
-                "seller": "Селлер",
-                "ozon_card_price": "Цена_по_карте_Ozon",
-            },
-            inplace=True,
-        )
-        out_df.to_excel(config.OUTPUT_XLSX, index=False)
+        write_rows(out_rows)
+        print(GOVERNOR.summary())
+        GOVERNOR.export_metrics()
+        if config.RESOURCE_REPORT:
+            print(resource_stats.summary())
 
         context.close()
         browser.close()
@@ -0,0 +1,329 @@
+import re
+import random
+import asyncio
+from typing import List, Optional, Tuple
+
+from playwright.async_api import async_playwright, Page, BrowserContext
+
+import config
+from resource_filter import ResourceStats, install_playwright_async
+from waits import Politeness, pw_wait_network_idle_async
+from rate_governor import GOVERNOR, playwright_challenge_async
+import session_store
+from parser_ozon import (
+    STEALTH_SCRIPTS, LAUNCH_OPTIONS, CONTEXT_OPTIONS,
+    CONSENT_SELECTORS, PVZ_CONFIRM_SELECTORS, POPUP_SELECTORS,
+    OZON_CARD_PATTERNS, PRICE_BOXES_JS, PRODUCT_HREFS_JS,
+    Row, search_url_for, add_product_links, price_in_text, price_near_ozon,
+    read_articles_xlsx, write_rows,
+)
+
+
+POLITENESS = Politeness()
+
+
+async def random_sleep(min_s=1.0, max_s=3.0):
+    """Случайная задержка, не блокирующая остальные страницы пула"""
+    await asyncio.sleep(random.uniform(min_s, max_s))
+
+
+async def inject_stealth(context: BrowserContext):
+    for script in STEALTH_SCRIPTS:
+        await context.add_init_script(script)
+
+
+class PagePool:
+    """
+    Пул страниц одного BrowserContext (общие куки, ПВЗ и stealth-скрипты).
+    Семафор ограничивает число одновременно занятых страниц,
+    освободившиеся страницы переиспользуются, а не открываются заново.
+    """
+
+    def __init__(self, context: BrowserContext, size: int):
+        self.context = context
+        self.resource_stats = ResourceStats()
+        self.sem = asyncio.Semaphore(size)
+        self.free: List[Page] = []
+        self.pages: List[Page] = []
+
+    async def acquire(self) -> Page:
+        await self.sem.acquire()
+        if self.free:
+            return self.free.pop()
+        page = await self.context.new_page()
+        self.pages.append(page)
+        return page
+
+    def release(self, page: Page) -> None:
+        self.free.append(page)
+        self.sem.release()
+
+    async def close(self) -> None:
+        for page in self.pages:
+            try:
+                await page.close()
+            except Exception:
+                pass
+
+
+async def safe_text(page: Page, selector: str) -> Optional[str]:
+    try:
+        loc = page.locator(selector).first
+        if await loc.count() == 0:
+            return None
+        t = await loc.inner_text(timeout=1500)
+        return re.sub(r"\s+", " ", t).strip()
+    except Exception:
+        return None
+
+
+async def click_if_exists(page: Page, selector: str) -> bool:
+    try:
+        loc = page.locator(selector).first
+        if await loc.count() == 0:
+            return False
+        await loc.hover(timeout=1000)
+        await asyncio.sleep(random.uniform(0.2, 0.5))
+        await loc.click(timeout=2000)
+        return True
+    except Exception:
+        return False
+
+
+async def set_pvz(page: Page, pvz_url: str) -> None:
+    await page.goto(pvz_url, wait_until="domcontentloaded", timeout=config.NAV_TIMEOUT_MS)
+    await random_sleep(1.5, 2.5)
+
+    for sel in CONSENT_SELECTORS:
+        await click_if_exists(page, sel)
+
+    for sel in PVZ_CONFIRM_SELECTORS:
+        if await click_if_exists(page, sel):
+            await random_sleep(1.5, 2.0)
+            break
+
+    await page.goto(config.BASE_URL, wait_until="domcontentloaded", timeout=config.NAV_TIMEOUT_MS)
+    await random_sleep(1.5, 2.5)
+
+
+async def collect_search_product_links(page: Page, query: str, limit: int) -> List[str]:
+    search_url = search_url_for(query)
+    print(f"Search_url : {search_url}")
+
+    await GOVERNOR.acquire_async()
+    await POLITENESS.wait_async(id(page))
+    await page.goto(search_url, wait_until="domcontentloaded", timeout=config.NAV_TIMEOUT_MS)
+    try:
+        await page.wait_for_selector("a[href*='/product/']", timeout=config.READY_TIMEOUT_SEC * 1000)
+    except Exception:
+        pass
+    await GOVERNOR.observe_async(await playwright_challenge_async(page))
+
+    try:
+        await page.mouse.move(random.randint(100, 500), random.randint(100, 500))
+    except Exception:
+        pass
+
+    for sel in POPUP_SELECTORS:
+        await click_if_exists(page, sel)
+
+    links = []
+    seen = set()
+    product_link_locator = page.locator("a[href*='/product/']")
+
+    stable_rounds = 0
+    last_count = 0
+
+    while len(links) < limit and stable_rounds < 4:
+        await random_sleep(config.SCROLL_PAUSE_SEC, config.SCROLL_PAUSE_SEC + 1.5)
+
+        try:
+            hrefs = await product_link_locator.evaluate_all(PRODUCT_HREFS_JS)
+        except Exception:
+            hrefs = []
+
+        add_product_links(hrefs, links, seen, limit)
+
+        await page.mouse.wheel(0, random.randint(700, 1200))
+
+        if len(links) == last_count:
+            stable_rounds += 1
+        else:
+            stable_rounds = 0
+            last_count = len(links)
+
+    return links[:limit]
+
+
+async def extract_seller_default(page: Page) -> Optional[str]:
+    try:
+        anchor = page.locator("text=Продавец").first
+        if await anchor.count() > 0:
+            parent = anchor.locator("xpath=ancestor::*[self::div or self::section][1]")
+            txt = await parent.inner_text(timeout=2000)
+            txt = re.sub(r"\s+", " ", txt).strip()
+            m = re.search(r"Продавец\s*[:\-]?\s*(.+?)(?:\s{2,}|$)", txt)
+            if m:
+                cand = m.group(1).strip()
+                if 2 <= len(cand) <= 120:
+                    return cand
+    except Exception:
+        pass
+
+    for sel in [
+        "a[href*='/seller/']",
+        "a[href*='/shop/']",
+    ]:
+        t = await safe_text(page, sel)
+        if t and len(t) <= 120:
+            return t
+
+    return None
+
+
+async def extract_ozon_card_price(page: Page) -> Optional[str]:
+    body_checked = False
+    for p in OZON_CARD_PATTERNS:
+        try:
+            anchor = page.locator(p).first
+            if await anchor.count() == 0:
+                continue
+
+            for txt in await anchor.evaluate(PRICE_BOXES_JS, timeout=2000):
+                price = price_in_text(txt)
+                if price:
+                    return price
+
+            if not body_checked:
+                body_checked = True
+                price = price_near_ozon(await page.locator("body").inner_text(timeout=3000))
+                if price:
+                    return price
+        except Exception:
+            continue
+
+    return None
+
+
+async def parse_product(page: Page, url: str) -> Tuple[Optional[str], Optional[str]]:
+    await GOVERNOR.acquire_async()
+    await POLITENESS.wait_async(id(page))
+    await page.goto(url, wait_until="domcontentloaded", timeout=config.NAV_TIMEOUT_MS)
+    await pw_wait_network_idle_async(page)
+    await GOVERNOR.observe_async(await playwright_challenge_async(page))
+
+    for sel in POPUP_SELECTORS:
+        await click_if_exists(page, sel)
+
+    seller = await extract_seller_default(page)
+    price = await extract_ozon_card_price(page)
+    return seller, price
+
+
+async def process_product(pool: PagePool, article: str, url: str) -> Row:
+    page = await pool.acquire()
+    try:
+        seller, price = await parse_product(page, url)
+    except Exception:
+        seller, price = None, None
+    finally:
+        pool.resource_stats.report(id(page), url)
+        pool.release(page)
+
+    # пауза до следующего перехода этой страницы — POLITENESS.wait_async в parse_product
+    return Row(article=article, seller=seller or "", ozon_card_price=price or "")
+
+
+async def process_article(pool: PagePool, article: str) -> List[Row]:
+    """
+    Поиск занимает страницу только на время поиска: пока карточки одного
+    артикула разбираются, свободные страницы уже ищут следующие артикулы.
+    """
+    page = await pool.acquire()
+    try:
+        links = await collect_search_product_links(page, article, config.MAX_PRODUCTS_PER_QUERY)
+    except Exception as e:
+        print(f"Ошибка при обработке {article}: {e}")
+        return []
+    finally:
+        pool.release(page)
+
+    if not links:
+        print(f"Не найдено товаров по артикулу {article}")
+        await random_sleep(5, 10)
+
+    return list(await asyncio.gather(*(process_product(pool, article, url) for url in links)))
+
+
+async def process_articles(pool: PagePool, articles: List[str], workers: int) -> List[List[Row]]:
+    """
+    Не больше workers артикулов одновременно: иначе поиски всех артикулов разом
+    занимают пул, и карточки уже найденных товаров ждут в конце очереди семафора.
+    Результат — в порядке артикулов, как в последовательном parser_ozon.main.
+    """
+    results: List[List[Row]] = [[] for _ in articles]
+    todo: asyncio.Queue = asyncio.Queue()
+    for item in enumerate(articles):
+        todo.put_nowait(item)
+
+    async def worker():
+        while True:
+            try:
+                i, article = todo.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            results[i] = await process_article(pool, article)
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return results
+
+
+async def run(articles: List[str], pages: int) -> List[Row]:
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(**LAUNCH_OPTIONS)
+        state = session_store.playwright_state()
+        context = await browser.new_context(**CONTEXT_OPTIONS, storage_state=state)
+
+        await inject_stealth(context)
+
+        context.set_default_navigation_timeout(config.NAV_TIMEOUT_MS)
+        context.set_default_timeout(config.ACTION_TIMEOUT_MS)
+
+        pool = PagePool(context, pages)
+        if config.RESOURCE_FILTER_ENABLED:
+            await install_playwright_async(context, pool.resource_stats)
+
+        if state:
+            print("Сессия с ПВЗ восстановлена из снимка")
+        else:
+            page = await pool.acquire()
+            try:
+                await set_pvz(page, config.PVZ_URL)
+                await session_store.save_playwright_async(context)
+            except Exception as e:
+                print(f"Ошибка установки ПВЗ: {e}")
+            finally:
+                pool.release(page)
+
+        per_article = await process_articles(pool, articles, pages)
+
+        if config.RESOURCE_REPORT:
+            print(pool.resource_stats.summary())
+
+        await pool.close()
+        await context.close()
+        await browser.close()
+
+    return [row for rows in per_article for row in rows]
+
+
+def main():
+    articles = read_articles_xlsx(config.INPUT_XLSX)
+    out_rows = asyncio.run(run(articles, config.PLAYWRIGHT_PAGES))
+    write_rows(out_rows)
+    print(GOVERNOR.summary())
+    GOVERNOR.export_metrics()
+
+
+if __name__ == "__main__":
+    main()
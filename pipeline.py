@@ -0,0 +1,266 @@
+import math
+import time
+import queue
+import argparse
+import threading
+
+import pandas as pd
+
+import config
+import storage
+import checkpoint
+import price_history
+import session_store
+from aggregate import with_profit
+from checkpoint import Checkpoint
+from rate_governor import GOVERNOR
+from product_registry import REGISTRY
+from ozon_parser import (
+    get_page_instance, set_pvz, open_cache, open_http, load_ideas,
+    new_tab, open_search_tabs, close_tabs,
+    find_top_product_urls, parse_card_once, card_rows, assemble_rows,
+)
+
+# Потоковый обход в одном процессе: поиск -> карточки -> статистика.
+# Между стадиями ограниченные очереди (config.PIPELINE_QUEUE_SIZE): если карточки
+# не успевают, поиск ждёт, а не набирает ссылки впрок. Статистика по идее
+# считается на лету, и частичный output_stats пишется каждые STATS_FLUSH_SEC,
+# пока обход ещё идёт. Итоговая выгрузка offers — та же, что у ozon_parser.
+
+DONE = object()
+
+
+def iter_product_urls(page, query, cache=None, http=None):
+    yield from find_top_product_urls(page, query, top_n=config.TOP_N_PRODUCTS, cache=cache, http=http)
+
+
+def iter_offer_rows(page, idea_id, query, product_url, cache=None, http=None):
+    card_shop, card_price, offers = parse_card_once(page, product_url, cache=cache, http=http)
+    yield from card_rows(idea_id, query, product_url, card_shop, card_price, offers)
+
+
+class OnlineAggregator:
+    """
+    Текущие min/max/mean/std/RMS цены и min/max доставки по idea_id.
+    Храним только n, сумму и сумму квадратов — память не растёт с числом офферов.
+    Перцентилей здесь нет: их считает aggregate.py по полной выгрузке.
+    """
+
+    def __init__(self, ideas: pd.DataFrame):
+        self.ideas = ideas
+        self.lock = threading.Lock()
+        self.acc = {}
+
+    def add(self, row):
+        price = row.get("offer_price_rub")
+        days = row.get("offer_delivery_days")
+        with self.lock:
+            a = self.acc.setdefault(row["idea_id"], {
+                "n": 0, "sum": 0.0, "sum_sq": 0.0, "min": None, "max": None, "dmin": None, "dmax": None,
+            })
+            if price is not None:
+                p = float(price)
+                a["n"] += 1
+                a["sum"] += p
+                a["sum_sq"] += p * p
+                a["min"] = p if a["min"] is None else min(a["min"], p)
+                a["max"] = p if a["max"] is None else max(a["max"], p)
+            if days is not None:
+                a["dmin"] = days if a["dmin"] is None else min(a["dmin"], days)
+                a["dmax"] = days if a["dmax"] is None else max(a["dmax"], days)
+
+    def stats(self) -> pd.DataFrame:
+        with self.lock:
+            items = [(idea_id, dict(a)) for idea_id, a in self.acc.items()]
+
+        rows = []
+        for idea_id, a in items:
+            n = a["n"]
+            mean = a["sum"] / n if n else None
+            std = None
+            if n > 1:
+                std = math.sqrt(max(a["sum_sq"] - a["sum"] * a["sum"] / n, 0.0) / (n - 1))
+            rows.append({
+                "idea_id": idea_id,
+                "offers_count": n,
+                "min_price": a["min"],
+                "max_price": a["max"],
+                "mean_price": mean,
+                "std_price": std,
+                "min_delivery_days": a["dmin"],
+                "max_delivery_days": a["dmax"],
+                "rms_price": math.sqrt(a["sum_sq"] / n) if n else None,
+            })
+        return pd.DataFrame(rows, columns=[
+            "idea_id", "offers_count", "min_price", "max_price", "mean_price", "std_price",
+            "min_delivery_days", "max_delivery_days", "rms_price",
+        ])
+
+    def snapshot(self) -> pd.DataFrame:
+        """Идеи + текущая статистика + прибыль (колонки как у aggregate.py)."""
+        return with_profit(self.ideas, self.stats())
+
+
+def stream_offers(page, ideas, ckpt, search_workers=1, card_workers=1, cache=None, http=None, queue_size=None):
+    """
+    Генератор строк выгрузки по мере разбора карточек (порядок — как закончатся).
+    ideas — [(idea_id, query)], page — браузер (None при разборе кэша).
+    Сделанное по журналу ckpt не повторяется, но его строки тоже отдаются.
+    """
+    queue_size = queue_size or config.PIPELINE_QUEUE_SIZE
+    REGISTRY.seed_from_checkpoint(ckpt)
+    searches = queue.Queue()
+    cards = queue.Queue(maxsize=queue_size)
+    rows = queue.Queue(maxsize=queue_size * config.TOP_N_PRODUCTS)
+
+    for idea in ideas:
+        searches.put(idea)
+
+    n_tabs = search_workers + card_workers
+    if page is None:
+        tabs = [None] * n_tabs
+    else:
+        tabs = [page] + [new_tab(page) for _ in range(n_tabs - 1)]
+        for tab in tabs[:search_workers]:
+            open_search_tabs(tab)  # глубокий поиск — только у вкладок поиска
+
+    left = {"search": search_workers, "card": card_workers}
+    left_lock = threading.Lock()
+
+    def finished(stage):
+        with left_lock:
+            left[stage] -= 1
+            return left[stage] == 0
+
+    def search_worker(tab):
+        while True:
+            try:
+                idea_id, query = searches.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if idea_id not in ckpt.searches:
+                    print(f"[{idea_id}] query={query}")
+                    ckpt.record_search(idea_id, list(iter_product_urls(tab, query, cache, http)))
+                for product_url in ckpt.searches[idea_id]:
+                    cards.put((idea_id, query, product_url))  # ждёт, если карточки отстают
+            except Exception as e:
+                print(f"[{idea_id}] ошибка search: {e}")
+
+        if finished("search"):
+            for _ in range(card_workers):
+                cards.put(DONE)
+
+    def card_worker(tab):
+        while True:
+            job = cards.get()
+            if job is DONE:
+                break
+            idea_id, query, product_url = job
+            try:
+                out = ckpt.cards.get((idea_id, product_url))
+                if out is None:
+                    out = list(iter_offer_rows(tab, idea_id, query, product_url, cache, http))
+                    ckpt.record_card(idea_id, product_url, out)
+                for row in out:
+                    rows.put(row)
+            except Exception as e:
+                print(f"[{idea_id}] ошибка card: {e}")
+
+        if finished("card"):
+            rows.put(DONE)
+
+    threads = [threading.Thread(target=search_worker, args=(tab,), daemon=True) for tab in tabs[:search_workers]]
+    threads += [threading.Thread(target=card_worker, args=(tab,), daemon=True) for tab in tabs[search_workers:]]
+    for t in threads:
+        t.start()
+
+    while True:
+        row = rows.get()
+        if row is DONE:
+            break
+        yield row
+
+    # сюда доходим, только если генератор дочитали: иначе воркеры ещё работают
+    for t in threads:
+        t.join()
+    if page is not None:
+        close_tabs(tabs)
+
+
+def write_stats(agg, final=False):
+    try:
+        path = storage.write_table(agg.snapshot(), "stats")
+        print(f"{'Saved' if final else 'Partial stats'} {path}")
+    except Exception as e:
+        # например, output_stats.xlsx открыт в Excel — попробуем в следующий раз
+        print(f"Не удалось записать статистику: {e}")
+
+
+def run(page, ideas, ckpt, agg, search_workers=1, card_workers=1, cache=None, http=None):
+    last_flush = time.time()
+    for row in stream_offers(page, ideas, ckpt, search_workers, card_workers, cache, http):
+        agg.add(row)
+        if time.time() - last_flush >= config.STATS_FLUSH_SEC:
+            write_stats(agg)
+            last_flush = time.time()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--search-workers", type=int, default=config.PIPELINE_SEARCH_WORKERS,
+                    help="сколько вкладок ищут товары")
+    ap.add_argument("--card-workers", type=int, default=config.PIPELINE_CARD_WORKERS,
+                    help="сколько вкладок разбирают карточки")
+    ap.add_argument("--offline", action="store_true",
+                    help="разобрать страницы из кэша без браузера")
+    ap.add_argument("--no-cache", action="store_true",
+                    help="не читать и не писать кэш страниц")
+    ap.add_argument("--http", action="store_true", default=config.FETCH_MODE == "http",
+                    help="поиск и продавцы через composer-api с куками браузера, браузер — при проверке")
+    args = ap.parse_args()
+
+    ideas = load_ideas()
+    agg = OnlineAggregator(storage.read_table("ideas"))
+    cache = open_cache(args)
+    page = http = None
+
+    if args.offline:
+        ckpt = Checkpoint()
+        http = open_http(None, cache)  # ответы composer-api из кэша
+    else:
+        ckpt = Checkpoint(config.CHECKPOINT_JSONL)
+        page = get_page_instance()
+        try:
+            session_store.ensure_pvz(page, set_pvz)
+        except Exception as e:
+            print(f"Ошибка ПВЗ: {e}")
+        http = open_http(page, cache) if args.http else None
+
+    try:
+        run(page, ideas, ckpt, agg, args.search_workers, args.card_workers, cache, http)
+    finally:
+        ckpt.close()
+        if cache:
+            print(cache.stats())
+            cache.close()
+        if http:
+            http.close()
+
+    print(REGISTRY.summary())
+    if not args.offline:
+        print(GOVERNOR.summary())
+        GOVERNOR.export_metrics()
+
+    offers = pd.DataFrame(assemble_rows(ideas, ckpt))
+    path = storage.write_table(offers, "offers")
+    print(f"Saved {path}")
+    write_stats(agg, final=True)
+
+    if not args.offline and checkpoint.discard_if_complete(ckpt, ideas):
+        if config.PRICE_HISTORY_ENABLED:
+            price_history.record_run(offers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import math
+import time
+import sqlite3
+import argparse
+from datetime import datetime
+
+import pandas as pd
+
+import config
+import storage
+
+# История цен между запусками ozon_parser (выгрузка offers каждый раз перезаписывается).
+# Только дописываем: наблюдение = (товар, магазин, время сбора) -> цена, дни доставки.
+# URL товаров и магазинов хранятся один раз в справочниках, в наблюдениях — их id.
+#
+# daily — сводка по идее за день: n, sum, sum_sq, min, max (цены) и min/max доставки.
+# Обновляется только по наблюдениям с seq больше отметки rollup_seq, поэтому
+# пересчёта всей истории нет; mean = sum / n, rms = sqrt(sum_sq / n).
+
+OBSERVATIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS observations (
+    seq INTEGER PRIMARY KEY,
+    product_id INTEGER NOT NULL,
+    shop_id INTEGER NOT NULL,
+    scraped_at INTEGER NOT NULL,
+    idea_id INTEGER NOT NULL,
+    price_rub INTEGER NOT NULL,
+    delivery_days INTEGER,
+    UNIQUE (product_id, shop_id, scraped_at, idea_id, price_rub)
+);
+"""
+
+SCHEMA = OBSERVATIONS_TABLE + """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS shops (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS daily (
+    idea_id INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    n INTEGER NOT NULL,
+    sum REAL NOT NULL,
+    sum_sq REAL NOT NULL,
+    min_price REAL,
+    max_price REAL,
+    min_delivery_days INTEGER,
+    max_delivery_days INTEGER,
+    PRIMARY KEY (idea_id, day)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# Ключ наблюдения включает идею и цену: у всех строк запуска один scraped_at, а один товар
+# встречается в нескольких идеях (product_registry) и у одного магазина бывает несколько
+# цен. Отбрасываются только точные повторы (повторная запись той же выгрузки).
+OBSERVATION_KEY = ("product_id", "shop_id", "scraped_at", "idea_id", "price_rub")
+
+# новые наблюдения -> (идея, день); день — по местному времени сбора
+NEW_ROWS_SQL = """
+SELECT idea_id, date(scraped_at, 'unixepoch', 'localtime') AS day,
+       COUNT(*), SUM(price_rub), SUM(price_rub * price_rub),
+       MIN(price_rub), MAX(price_rub), MIN(delivery_days), MAX(delivery_days)
+FROM observations
+WHERE seq > ? AND seq <= ?
+GROUP BY idea_id, day
+"""
+
+UPSERT_DAILY_SQL = """
+INSERT INTO daily (idea_id, day, n, sum, sum_sq, min_price, max_price, min_delivery_days, max_delivery_days)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (idea_id, day) DO UPDATE SET
+    n = n + excluded.n,
+    sum = sum + excluded.sum,
+    sum_sq = sum_sq + excluded.sum_sq,
+    min_price = MIN(min_price, excluded.min_price),
+    max_price = MAX(max_price, excluded.max_price),
+    min_delivery_days = COALESCE(MIN(min_delivery_days, excluded.min_delivery_days),
+                                 min_delivery_days, excluded.min_delivery_days),
+    max_delivery_days = COALESCE(MAX(max_delivery_days, excluded.max_delivery_days),
+                                 max_delivery_days, excluded.max_delivery_days)
+"""
+
+
+class PriceHistory:
+    def __init__(self, path=None):
+        self.path = path or config.PRICE_HISTORY_DB
+        self.conn = sqlite3.connect(self.path, timeout=30)
+        self.conn.executescript(SCHEMA)
+        self._migrate_observation_key()
+        self.product_ids = {}
+        self.shop_ids = {}
+
+    def _migrate_observation_key(self):
+        """Базы со старым ключом (product_id, shop_id, scraped_at) пересобираются с сохранением seq."""
+        for _, name, unique, *_ in self.conn.execute("PRAGMA index_list(observations)").fetchall():
+            if not unique:
+                continue
+            cols = tuple(r[2] for r in self.conn.execute(f"PRAGMA index_info('{name}')"))
+            if cols == OBSERVATION_KEY:
+                continue
+            self.conn.execute("BEGIN")
+            self.conn.execute("ALTER TABLE observations RENAME TO observations_old")
+            self.conn.execute(OBSERVATIONS_TABLE)
+            self.conn.execute("INSERT INTO observations SELECT * FROM observations_old")
+            self.conn.execute("DROP TABLE observations_old")
+            self.conn.commit()
+            return
+
+    def _id(self, table, cache, url, name=None):
+        if url in cache:
+            return cache[url]
+        if table == "shops":
+            self.conn.execute("INSERT OR IGNORE INTO shops (url, name) VALUES (?, ?)", (url, name or ""))
+        else:
+            self.conn.execute("INSERT OR IGNORE INTO products (url) VALUES (?)", (url,))
+        cache[url] = self.conn.execute(f"SELECT id FROM {table} WHERE url = ?", (url,)).fetchone()[0]
+        return cache[url]
+
+    def append(self, offers: pd.DataFrame, scraped_at=None) -> int:
+        """
+        Дописывает офферы одного запуска (схема выгрузки offers).
+        Строки без цены (карточка без "Есть дешевле") не пишутся.
+        Возвращает число новых наблюдений.
+        """
+        scraped_at = int(scraped_at or time.time())
+        price = pd.to_numeric(offers["offer_price_rub"], errors="coerce")
+        days = pd.to_numeric(offers["offer_delivery_days"], errors="coerce")
+        idea = pd.to_numeric(offers["idea_id"], errors="coerce")
+
+        rows = []
+        for product_url, shop_url, shop, idea_id, p, d in zip(
+            offers["product_url"], offers["offer_shop_url"], offers["offer_shop"], idea, price, days
+        ):
+            if pd.isna(p) or pd.isna(idea_id) or not isinstance(product_url, str) or not product_url:
+                continue
+            # у магазина без ссылки ключом служит имя
+            shop_key = shop_url if isinstance(shop_url, str) and shop_url else f"name:{shop}"
+            rows.append((
+                self._id("products", self.product_ids, product_url),
+                self._id("shops", self.shop_ids, shop_key, shop if isinstance(shop, str) else ""),
+                scraped_at, int(idea_id), int(p), None if pd.isna(d) else int(d),
+            ))
+
+        before = self.conn.total_changes
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO observations "
+            "(product_id, shop_id, scraped_at, idea_id, price_rub, delivery_days) VALUES (?, ?, ?, ?, ?, ?)",
+            rows,
+        )
+        self.conn.commit()
+        return self.conn.total_changes - before
+
+    def update_rollups(self) -> int:
+        """Досчитывает daily по наблюдениям после отметки; возвращает, сколько их учтено."""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'rollup_seq'").fetchone()
+        done = row[0] if row else 0
+        last = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM observations").fetchone()[0]
+        if last <= done:
+            return 0
+
+        with self.conn:
+            groups = self.conn.execute(NEW_ROWS_SQL, (done, last)).fetchall()
+            self.conn.executemany(UPSERT_DAILY_SQL, groups)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('rollup_seq', ?)", (last,)
+            )
+        return sum(g[2] for g in groups)
+
+    def daily(self, idea_id=None) -> pd.DataFrame:
+        sql = "SELECT * FROM daily"
+        params = ()
+        if idea_id is not None:
+            sql += " WHERE idea_id = ?"
+            params = (idea_id,)
+        df = pd.read_sql_query(sql + " ORDER BY idea_id, day", self.conn, params=params)
+        df["mean_price"] = df["sum"] / df["n"]
+        df["rms_price"] = (df["sum_sq"] / df["n"]).apply(math.sqrt)
+        return df.drop(columns=["sum", "sum_sq"]).rename(columns={"n": "offers_count"})
+
+    def series(self, product_url) -> pd.DataFrame:
+        """Цены по магазинам одного товара во времени."""
+        df = pd.read_sql_query(
+            "SELECT o.scraped_at, s.name AS offer_shop, s.url AS offer_shop_url, "
+            "o.price_rub AS offer_price_rub, o.delivery_days AS offer_delivery_days "
+            "FROM observations o "
+            "JOIN products p ON p.id = o.product_id JOIN shops s ON s.id = o.shop_id "
+            "WHERE p.url = ? ORDER BY o.scraped_at, s.name",
+            self.conn, params=(product_url,),
+        )
+        df["scraped_at"] = df["scraped_at"].apply(datetime.fromtimestamp)
+        return df
+
+    def close(self):
+        self.conn.close()
+
+
+def record_run(offers: pd.DataFrame):
+    """Дописывает выгрузку только что завершённого обхода и досчитывает сводки."""
+    hist = PriceHistory()
+    try:
+        added = hist.append(offers)
+        print(f"price history: +{added} observations, rollup +{hist.update_rollups()}")
+    finally:
+        hist.close()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--import-offers", action="store_true",
+                    help="дописать последнюю выгрузку offers (если не записана при обходе)")
+    ap.add_argument("--idea", type=int, help="показать дневную сводку одной идеи")
+    args = ap.parse_args()
+
+    hist = PriceHistory()
+    if args.import_offers:
+        print(f"observations +{hist.append(storage.read_table('offers'))}")
+    print(f"rollup +{hist.update_rollups()}")
+
+    daily = hist.daily(args.idea)
+    storage.write_table(daily, "price_daily")
+    print(daily.tail(20).to_string(index=False))
+    hist.close()
+
+
+if __name__ == "__main__":
+    main()
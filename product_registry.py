@@ -0,0 +1,74 @@
+import time
+import threading
+
+# Реестр карточек на один запуск: разные запросы часто выводят одни и те же товары,
+# а разбор карточки с модалкой "Есть дешевле" — самая дорогая часть обхода.
+# Каждый product_url разбирается один раз, результат (магазин, цена, офферы)
+# достаётся всем идеям, которые его нашли. Если карточку уже разбирает другая
+# вкладка, вторая ждёт её результат, а не открывает ту же страницу параллельно.
+
+OFFER_KEYS = ("offer_shop", "offer_shop_url", "offer_price_rub", "offer_delivery_days")
+
+
+class ProductRegistry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.results = {}    # product_url -> (card_shop, card_price, offers)
+        self.cost = {}       # product_url -> секунд на разбор
+        self.inflight = {}   # product_url -> threading.Event
+        self.hits = 0
+        self.misses = 0
+        self.saved_sec = 0.0
+
+    def _hit(self, product_url):
+        self.hits += 1
+        self.saved_sec += self.cost.get(product_url, 0.0)
+        return self.results[product_url]
+
+    def get_or_parse(self, product_url, parse):
+        """parse() вызывается только для первого обращения к URL; ошибки не запоминаются."""
+        while True:
+            with self.lock:
+                if product_url in self.results:
+                    return self._hit(product_url)
+                event = self.inflight.get(product_url)
+                if event is None:
+                    event = self.inflight[product_url] = threading.Event()
+                    break
+            # разбирает другая вкладка: ждём; если у неё не вышло — попробуем сами
+            event.wait()
+
+        t0 = time.time()
+        try:
+            result = parse()
+            with self.lock:
+                self.results[product_url] = result
+                self.cost[product_url] = time.time() - t0
+                self.misses += 1
+            return result
+        finally:
+            with self.lock:
+                self.inflight.pop(product_url).set()
+
+    def seed_from_rows(self, product_url, rows):
+        """Результат из журнала обхода (строки выгрузки card_rows) — после перезапуска."""
+        if not rows:
+            return
+        offers = [{k: r[k] for k in OFFER_KEYS} for r in rows if r.get("offer_shop")]
+        with self.lock:
+            self.results.setdefault(product_url, (rows[0]["card_shop"], rows[0]["card_price_ozon_bank"], offers))
+
+    def seed_from_checkpoint(self, ckpt):
+        for (_, product_url), rows in list(ckpt.cards.items()):
+            self.seed_from_rows(product_url, rows)
+
+    def summary(self) -> str:
+        with self.lock:
+            total = self.hits + self.misses
+            rate = self.hits / total if total else 0.0
+            return (f"product registry: unique={self.misses} reused={self.hits} "
+                    f"hit_rate={rate:.0%} saved≈{self.saved_sec:.0f}s")
+
+
+# Один реестр на процесс (шарды делят идеи, а не товары, поэтому у каждого свой)
+REGISTRY = ProductRegistry()
@@ -0,0 +1,225 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import threading
+from contextlib import contextmanager
+
+import config
+
+# Общий регулятор частоты запросов к Ozon для всех вкладок/страниц/HTTP-клиента процесса.
+#  - token bucket: не больше rate запросов в секунду (с запасом burst);
+#  - AIMD: каждый удачный запрос прибавляет RATE_INCREASE_RPS, проверка/капча
+#    умножает rate на RATE_DECREASE_FACTOR, ошибка — на RATE_ERROR_FACTOR;
+#  - circuit breaker: после BREAKER_THRESHOLD проверок подряд все запросы
+#    ждут BREAKER_COOLDOWN_SEC, затем пропускается пробный запрос.
+#
+# Состояние (rate, токены, breaker) хранится в RATE_SHARED_DB: шарды (--shards) и воркеры
+# очереди (--worker) на одной машине делят один бюджет запросов и одну паузу после капчи,
+# а не умножают RATE_*_RPS на число процессов. Каждое изменение — короткая транзакция
+# BEGIN IMMEDIATE. Счётчики метрик — свои у каждого процесса. Файл SQLite по сетевому
+# диску не делим: на каждой машине свой, и RATE_*_RPS задаются на машину.
+# RATE_SHARED_DB = None — регулятор только в памяти процесса.
+
+STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS governor (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    rate REAL NOT NULL,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL,
+    consecutive_blocks INTEGER NOT NULL,
+    open_until REAL NOT NULL
+);
+"""
+STATE_FIELDS = ("rate", "tokens", "updated", "consecutive_blocks", "open_until")
+
+CHALLENGE_MARKERS = ("captcha", "доступ ограничен", "подтвердите, что вы не робот")
+
+DRISSION_PROBE_JS = "return document.title + ' ' + (document.body ? document.body.innerText.slice(0, 3000) : '');"
+
+
+class Blocked(Exception):
+    """Страница так и осталась проверкой/капчей после всех повторов."""
+
+
+def is_challenge_text(text):
+    t = (text or "").lower()
+    return any(m in t for m in CHALLENGE_MARKERS)
+
+
+def drission_challenge(page):
+    """Проверка на капчу без выгрузки всего page.html."""
+    try:
+        return is_challenge_text(page.run_js(DRISSION_PROBE_JS))
+    except Exception:
+        return is_challenge_text(page.title)
+
+
+def playwright_challenge(page):
+    try:
+        return is_challenge_text(page.title() + " " + page.locator("body").inner_text(timeout=2000)[:3000])
+    except Exception:
+        return False
+
+
+async def playwright_challenge_async(page):
+    try:
+        title = await page.title()
+        body = await page.locator("body").inner_text(timeout=2000)
+        return is_challenge_text(title + " " + body[:3000])
+    except Exception:
+        return False
+
+
+class RateGovernor:
+    def __init__(self, rate=None, shared_path=None):
+        self.rate = config.RATE_START_RPS if rate is None else rate
+        self.tokens = float(config.RATE_BURST)
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+        self.consecutive_blocks = 0
+        self.open_until = 0.0
+
+        self.shared_path = shared_path
+        self.conn = None
+        self.conn_pid = None
+
+        self.counters = {
+            "requests": 0, "successes": 0, "challenges": 0, "errors": 0,
+            "breaker_opens": 0, "waited_sec": 0.0,
+        }
+
+    def _connect(self):
+        # соединение своё у каждого процесса (в том числе после fork)
+        if self.conn_pid != os.getpid():
+            self.conn = sqlite3.connect(self.shared_path, timeout=30, check_same_thread=False,
+                                        isolation_level=None)
+            self.conn.executescript(STATE_SCHEMA)
+            self.conn_pid = os.getpid()
+        return self.conn
+
+    @contextmanager
+    def _state(self):
+        """Блокировка состояния; с RATE_SHARED_DB — ещё и чтение/запись общей строки в одной транзакции."""
+        with self.lock:
+            if not self.shared_path:
+                yield
+                return
+
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(f"SELECT {', '.join(STATE_FIELDS)} FROM governor WHERE id = 1").fetchone()
+                now = time.time()
+                if row and (now - row[2] < config.RATE_SHARED_IDLE_RESET_SEC or row[4] > now):
+                    self.rate, self.tokens, self.updated, self.consecutive_blocks, self.open_until = row
+                else:
+                    # давно никто не ходил (прошлый запуск) — с исходного rate
+                    self.rate, self.tokens, self.updated = config.RATE_START_RPS, float(config.RATE_BURST), now
+                    self.consecutive_blocks, self.open_until = 0, 0.0
+                yield
+            finally:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO governor (id, {', '.join(STATE_FIELDS)}) VALUES (1, ?, ?, ?, ?, ?)",
+                    (self.rate, self.tokens, self.updated, self.consecutive_blocks, self.open_until),
+                )
+                conn.execute("COMMIT")
+
+    def _reserve(self):
+        """Забирает токен и возвращает 0 или сколько подождать до следующей попытки."""
+        with self._state():
+            now = time.time()
+            if now < self.open_until:
+                return self.open_until - now
+
+            self.tokens = min(config.RATE_BURST, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                self.counters["requests"] += 1
+                return 0
+            wait = (1 - self.tokens) / self.rate
+            self.counters["waited_sec"] += wait
+            return wait
+
+    def acquire(self):
+        while True:
+            wait = self._reserve()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    # из event loop: _reserve/observe держат threading.Lock и транзакцию SQLite с busy timeout,
+    # поэтому идут в отдельном потоке — занятый соседним процессом RATE_SHARED_DB не стопорит
+    # остальные корутины; ждём токен уже через asyncio.sleep
+    async def acquire_async(self):
+        while True:
+            wait = await asyncio.to_thread(self._reserve)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    def success(self):
+        with self._state():
+            self.counters["successes"] += 1
+            self.consecutive_blocks = 0
+            self.rate = min(config.RATE_MAX_RPS, self.rate + config.RATE_INCREASE_RPS)
+
+    def error(self):
+        with self._state():
+            self.counters["errors"] += 1
+            self.rate = max(config.RATE_MIN_RPS, self.rate * config.RATE_ERROR_FACTOR)
+
+    def challenge(self):
+        with self._state():
+            self.counters["challenges"] += 1
+            self.consecutive_blocks += 1
+            self.rate = max(config.RATE_MIN_RPS, self.rate * config.RATE_DECREASE_FACTOR)
+            self.tokens = 0
+
+            if self.consecutive_blocks >= config.BREAKER_THRESHOLD:
+                self.open_until = time.time() + config.BREAKER_COOLDOWN_SEC
+                self.counters["breaker_opens"] += 1
+                # после паузы — один пробный запрос: новая проверка снова откроет breaker
+                self.consecutive_blocks = config.BREAKER_THRESHOLD - 1
+                print(f"Слишком много проверок подряд: пауза {config.BREAKER_COOLDOWN_SEC} с, "
+                      f"rate={self.rate:.2f} rps")
+
+    def observe(self, challenged):
+        if challenged:
+            self.challenge()
+        else:
+            self.success()
+        return challenged
+
+    async def observe_async(self, challenged):
+        return await asyncio.to_thread(self.observe, challenged)
+
+    @property
+    def breaker_open(self):
+        return time.time() < self.open_until
+
+    def metrics(self):
+        with self.lock:
+            m = dict(self.counters)
+            m["rate_rps"] = round(self.rate, 3)
+            m["breaker_open"] = time.time() < self.open_until
+            m["challenge_rate"] = round(m["challenges"] / m["requests"], 4) if m["requests"] else 0.0
+            return m
+
+    def export_metrics(self, path=None):
+        with open(path or config.RATE_METRICS_JSON, "w", encoding="utf-8") as f:
+            json.dump(self.metrics(), f, ensure_ascii=False, indent=2)
+
+    def summary(self):
+        m = self.metrics()
+        return (f"rate governor: rate={m['rate_rps']} rps requests={m['requests']} "
+                f"challenges={m['challenges']} errors={m['errors']} breaker_opens={m['breaker_opens']} "
+                f"waited={m['waited_sec']:.1f}s")
+
+
+# Один регулятор на процесс: его делят все вкладки, страницы и HTTP-клиент,
+# а через RATE_SHARED_DB — и все процессы обхода на этой машине
+GOVERNOR = RateGovernor(shared_path=config.RATE_SHARED_DB)
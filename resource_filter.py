@@ -0,0 +1,134 @@
+import threading
+from urllib.parse import urlparse
+
+import config
+
+# Нам нужен только текст страниц, поэтому картинки, видео, шрифты и сторонняя
+# аналитика не грузятся. Playwright: context.route (видит тип ресурса),
+# DrissionPage: CDP Network.setBlockedURLs (только по шаблонам URL).
+
+TYPE_URL_PATTERNS = {
+    "image": ["*.jpg*", "*.jpeg*", "*.png*", "*.webp*", "*.gif*", "*.svg*", "*.avif*", "*.ico*"],
+    "media": ["*.mp4*", "*.webm*", "*.m3u8*", "*.mp3*"],
+    "font": ["*.woff*", "*.woff2*", "*.ttf*", "*.otf*", "*.eot*"],
+}
+
+
+def host_matches(host, domains):
+    return any(host == d or host.endswith("." + d) for d in domains)
+
+
+def should_block(resource_type, url):
+    host = urlparse(url).hostname or ""
+    if host_matches(host, config.BLOCK_DOMAINS):
+        return True
+    if resource_type in config.BLOCK_RESOURCE_TYPES:
+        return True
+    if resource_type == "script" and config.BLOCK_THIRD_PARTY_SCRIPTS:
+        return not host_matches(host, config.ALLOW_DOMAINS)
+    return False
+
+
+class ResourceStats:
+    """
+    Счётчик заблокированных запросов по страницам. Размер заблокированного
+    ресурса неизвестен (он не скачан), поэтому экономия — оценка по
+    config.TYPICAL_RESOURCE_BYTES.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pages = {}   # ключ страницы -> {тип: количество}
+        self.total = {}
+
+    def add(self, page_key, resource_type, n=1):
+        with self.lock:
+            per_page = self.pages.setdefault(page_key, {})
+            per_page[resource_type] = per_page.get(resource_type, 0) + n
+            self.total[resource_type] = self.total.get(resource_type, 0) + n
+
+    def take(self, page_key):
+        """Счётчики страницы с момента прошлого take (после очередного goto)."""
+        with self.lock:
+            return self.pages.pop(page_key, {})
+
+    @staticmethod
+    def saved_bytes(counts):
+        return sum(config.TYPICAL_RESOURCE_BYTES.get(t, config.TYPICAL_RESOURCE_BYTES["other"]) * n
+                   for t, n in counts.items())
+
+    def report(self, page_key, url):
+        counts = self.take(page_key)
+        if config.RESOURCE_REPORT and counts:
+            print(f"  {url}: заблокировано {sum(counts.values())}, "
+                  f"сэкономлено ~{self.saved_bytes(counts) // 1024} КБ")
+        return counts
+
+    def summary(self):
+        with self.lock:
+            n = sum(self.total.values())
+            return f"resource filter: blocked={n} saved~{self.saved_bytes(self.total) // 1024} KB {self.total}"
+
+
+# ---------- Playwright ----------
+
+def install_playwright(context, stats):
+    def handler(route):
+        req = route.request
+        if should_block(req.resource_type, req.url):
+            stats.add(id(req.frame.page), req.resource_type)
+            route.abort()
+        else:
+            route.continue_()
+
+    context.route("**/*", handler)
+
+
+async def install_playwright_async(context, stats):
+    async def handler(route):
+        req = route.request
+        if should_block(req.resource_type, req.url):
+            stats.add(id(req.frame.page), req.resource_type)
+            await route.abort()
+        else:
+            await route.continue_()
+
+    await context.route("**/*", handler)
+
+
+# ---------- DrissionPage ----------
+
+def blocked_url_patterns():
+    patterns = []
+    for t in config.BLOCK_RESOURCE_TYPES:
+        patterns.extend(TYPE_URL_PATTERNS.get(t, []))
+    for d in config.BLOCK_DOMAINS:
+        patterns.append(f"*://{d}/*")
+        patterns.append(f"*://*.{d}/*")
+    return patterns
+
+
+def install_drission(page):
+    """Для вкладки/страницы DrissionPage; CDP-настройка действует на одну вкладку."""
+    page.set.blocked_urls(blocked_url_patterns())
+
+
+# CDP не сообщает о заблокированных URL, поэтому считаем то, что страница пыталась показать
+DRISSION_COUNT_JS = """
+return {
+    image: document.images.length,
+    media: document.querySelectorAll('video, audio').length,
+};
+"""
+
+
+def report_drission(page, stats, url):
+    if not config.RESOURCE_REPORT:
+        return {}
+    try:
+        counts = {t: n for t, n in page.run_js(DRISSION_COUNT_JS).items() if n and t in config.BLOCK_RESOURCE_TYPES}
+    except Exception:
+        return {}
+    for t, n in counts.items():
+        stats.add(id(page), t, n)
+    return stats.report(id(page), url)
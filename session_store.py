@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import hashlib
+
+import config
+
+# Сохранённая сессия Ozon с выбранным ПВЗ, чтобы не проходить set_pvz на каждом старте.
+#   sessions/<sha1(PVZ_URL)[:12]>.playwright.json — storage_state Playwright
+#   sessions/<sha1(PVZ_URL)[:12]>.drission.json   — куки DrissionPage (+ user agent)
+#   sessions/<sha1(PVZ_URL)[:12]>.<profile>.drission.json — снимок своего профиля (шарда)
+# Снимок годен SESSION_TTL_SEC и пока в нём есть непросроченные куки ozon.ru;
+# проверка — только по файлу, без переходов. Иначе — обычный set_pvz и новый снимок.
+# Без profile снимок общий для всех скриптов и воркеров с тем же PVZ_URL. Шарды передают
+# profile: у каждого свой профиль Chromium и свои куки антибота, общий снимок сводил бы
+# их к одной сессии.
+
+COOKIE_PARAMS = ("name", "value", "domain", "path", "secure", "httpOnly", "sameSite", "expires")
+
+
+def session_key(pvz_url=None):
+    return hashlib.sha1((pvz_url or config.PVZ_URL).encode("utf-8")).hexdigest()[:12]
+
+
+def session_path(kind, pvz_url=None, profile=None):
+    name = f"{session_key(pvz_url)}.{profile}" if profile else session_key(pvz_url)
+    return os.path.join(config.SESSION_DIR, f"{name}.{kind}.json")
+
+
+def cookies_alive(cookies, now=None):
+    """Есть ли куки ozon, которые ещё не истекли (expires -1/0 — сессионные)."""
+    now = now or time.time()
+    for c in cookies or []:
+        if "ozon" not in (c.get("domain") or ""):
+            continue
+        expires = c.get("expires", -1)
+        if expires is None or expires <= 0 or expires > now:
+            return True
+    return False
+
+
+def load_json(path):
+    """Содержимое снимка, если он свежий; иначе None."""
+    if not config.SESSION_REUSE or not os.path.exists(path):
+        return None
+    if time.time() - os.path.getmtime(path) > config.SESSION_TTL_SEC:
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return None
+    return data if cookies_alive(data.get("cookies")) else None
+
+
+def save_json(path, data):
+    # через временный файл: шарды могут сохранять снимок одновременно
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def discard(pvz_url=None, profile=None):
+    for kind in ("playwright", "drission"):
+        try: os.remove(session_path(kind, pvz_url, profile))
+        except FileNotFoundError: pass
+
+
+# ---------- DrissionPage ----------
+
+def save_drission(page, pvz_url=None, profile=None):
+    cookies = [
+        {k: c[k] for k in COOKIE_PARAMS if k in c}
+        for c in page.cookies(all_domains=True, all_info=True)
+    ]
+    save_json(session_path("drission", pvz_url, profile), {"cookies": cookies, "user_agent": page.user_agent})
+
+
+def load_drission(page, pvz_url=None, profile=None):
+    data = load_json(session_path("drission", pvz_url, profile))
+    if not data:
+        return False
+    cookies = []
+    for c in data["cookies"]:
+        c = dict(c)
+        if c.get("expires", -1) <= 0:
+            c.pop("expires", None)  # сессионная кука
+        cookies.append(c)
+    try:
+        page.run_cdp("Network.setCookies", cookies=cookies)
+    except Exception as e:
+        print(f"Не удалось восстановить сессию: {e}")
+        return False
+    return True
+
+
+def ensure_pvz(page, set_pvz, pvz_url=None, profile=None):
+    """
+    Куки сохранённой сессии или, если снимка нет/он устарел, set_pvz и новый снимок.
+    profile — свой снимок для профиля (шарда). True — сессия восстановлена без переходов.
+    """
+    pvz_url = pvz_url or config.PVZ_URL
+    if load_drission(page, pvz_url, profile):
+        print("Сессия с ПВЗ восстановлена из снимка")
+        return True
+
+    set_pvz(page, pvz_url)
+    try:
+        save_drission(page, pvz_url, profile)
+    except Exception as e:
+        print(f"Не удалось сохранить сессию: {e}")
+    return False
+
+
+# ---------- Playwright ----------
+
+def playwright_state(pvz_url=None, profile=None):
+    """Путь к storage_state для new_context(storage_state=...) или None, если снимка нет."""
+    path = session_path("playwright", pvz_url, profile)
+    return path if load_json(path) else None
+
+
+def save_playwright(context, pvz_url=None, profile=None):
+    save_json(session_path("playwright", pvz_url, profile), context.storage_state())
+
+
+async def save_playwright_async(context, pvz_url=None, profile=None):
+    save_json(session_path("playwright", pvz_url, profile), await context.storage_state())
@@ -0,0 +1,118 @@
+import os
+import glob
+from datetime import date
+
+import pandas as pd
+
+import config
+
+# Хранилище данных между этапами (idea_generator -> ozon_parser -> aggregate).
+# Основной формат — Parquet (или Feather), с типизированными колонками и разбиением
+# по дате запуска:  data/<таблица>/run_date=YYYY-MM-DD/part-0.parquet
+# xlsx — только экспорт для людей (config.EXPORT_XLSX) и запасной вход,
+# если колоночных файлов ещё нет (например, input.xlsx, заполненный руками).
+
+SCHEMAS = {
+    "ideas": {
+        "idea_id": "Int64",
+        "seed": "string",
+        "title": "string",
+        "query": "string",
+        "description": "string",
+        "material_cost_rub": "float64",
+        "crawl_id": "Int64",
+    },
+    "offers": {
+        "idea_id": "Int64",
+        "query": "string",
+        "product_url": "string",
+        "card_shop": "string",
+        "card_price_ozon_bank": "Int64",
+        "offer_shop": "string",
+        "offer_shop_url": "string",
+        "offer_price_rub": "Int64",
+        "offer_delivery_days": "Int64",
+    },
+}
+
+LEGACY_XLSX = {
+    "ideas": config.INPUT_XLSX,
+    "offers": config.OUTPUT_OFFERS_XLSX,
+    "stats": config.OUTPUT_STATS_XLSX,
+}
+
+SUFFIX = {"parquet": ".parquet", "feather": ".feather"}
+
+
+def xlsx_path(name: str) -> str:
+    return LEGACY_XLSX.get(name, f"{name}.xlsx")
+
+
+def apply_schema(df: pd.DataFrame, name: str) -> pd.DataFrame:
+    df = df.copy()
+    for col, dtype in SCHEMAS.get(name, {}).items():
+        if col not in df.columns:
+            continue
+        if dtype == "string":
+            df[col] = df[col].astype("string")
+        else:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype)
+    return df
+
+
+def partition_dir(name: str, run_date: date) -> str:
+    return os.path.join(config.DATA_DIR, name, f"run_date={run_date.isoformat()}")
+
+
+def partitions(name: str):
+    """Разделы таблицы по возрастанию даты."""
+    return sorted(glob.glob(os.path.join(config.DATA_DIR, name, "run_date=*")))
+
+
+def write_table(df: pd.DataFrame, name: str, run_date: date | None = None) -> str:
+    run_date = run_date or date.today()
+    df = apply_schema(df, name)
+
+    if config.STORAGE_FORMAT == "xlsx":
+        path = xlsx_path(name)
+        df.to_excel(path, index=False)
+        return path
+
+    out_dir = partition_dir(name, run_date)
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, "part-0" + SUFFIX[config.STORAGE_FORMAT])
+
+    # через временный файл: читатель (например, частичной статистики) не увидит недописанный
+    tmp = path + ".tmp"
+    if config.STORAGE_FORMAT == "feather":
+        df.reset_index(drop=True).to_feather(tmp)
+    else:
+        df.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+    if name in config.EXPORT_XLSX:
+        df.to_excel(xlsx_path(name), index=False)
+
+    return path
+
+
+def read_table(name: str, columns=None, run_date: date | None = None) -> pd.DataFrame:
+    """
+    Читает раздел за run_date (по умолчанию — последний). columns — только нужные
+    колонки: Parquet/Feather не читают с диска остальные.
+    """
+    if config.STORAGE_FORMAT != "xlsx":
+        if run_date:
+            dirs = [partition_dir(name, run_date)]
+        else:
+            dirs = partitions(name)[-1:]
+
+        for d in dirs:
+            path = os.path.join(d, "part-0" + SUFFIX[config.STORAGE_FORMAT])
+            if os.path.exists(path):
+                if config.STORAGE_FORMAT == "feather":
+                    return pd.read_feather(path, columns=columns)
+                return pd.read_parquet(path, columns=columns)
+
+    df = pd.read_excel(xlsx_path(name), usecols=columns)
+    return apply_schema(df, name)
@@ -0,0 +1,80 @@
+import os
+import json
+from datetime import date
+from urllib.parse import quote, urlencode
+from urllib.request import urlopen
+
+import pytest
+from DrissionPage.common import make_session_ele
+
+import config
+import fixtures
+import ozon_parser
+import text_parsing
+from fixtures import FixtureServer
+
+# Записанный корпус fixtures/ (обезличенные поиск, карточка, модалка и ответ composer-api):
+# разбор без браузера и раздача локальным сервером.
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), config.FIXTURES_DIR)
+PRODUCT_URL = "https://www.ozon.ru/product/organayzer-dlya-kabeley-nabor-10-sht-1000000001/"
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    return {kind: (url, html) for kind, url, html in fixtures.iter_fixtures(fixtures_dir=FIXTURES_DIR)}
+
+
+@pytest.fixture
+def reference_date():
+    yield text_parsing.set_reference_date(date(2025, 12, 30))
+    text_parsing.set_reference_date()
+
+
+def test_manifest_covers_every_kind(corpus):
+    assert set(corpus) == {"search", "card", "modal", "api"}
+
+
+def test_search_page(corpus):
+    urls = ozon_parser.extract_product_urls(make_session_ele(corpus["search"][1]), 10)
+    assert urls[0] == PRODUCT_URL
+    assert len(urls) == len(set(urls)) == 4
+    assert ozon_parser.extract_product_urls(make_session_ele(corpus["search"][1]), 2) == urls[:2]
+
+
+@pytest.mark.parametrize("mode", ["dom", "state"])
+def test_card_page(corpus, monkeypatch, mode):
+    monkeypatch.setattr(config, "EXTRACT_MODE", mode)
+    assert corpus["card"][0] == PRODUCT_URL
+    assert ozon_parser.card_from_html(corpus["card"][1]) == ("Магазин Альфа", 1099)
+
+
+def test_seller_modal(corpus, reference_date):
+    offers = ozon_parser.offers_from_html(corpus["modal"][1])
+    assert [(o["offer_shop"], o["offer_price_rub"], o["offer_delivery_days"]) for o in offers] == [
+        ("Магазин Бета", 949, 4),
+        ("Магазин Гамма", 989, 1),
+        ("Магазин Дельта", 1049, 6),
+    ]
+    assert offers[0]["offer_shop_url"] == "https://www.ozon.ru/seller/magazin-beta-100002/"
+    # построчный разбор по DOM даёт то же, что пакетный по снимку
+    assert ozon_parser.collect_cheaper_offers(make_session_ele(corpus["modal"][1])) == offers
+
+
+def test_server_serves_corpus(corpus):
+    with FixtureServer(FIXTURES_DIR) as srv:
+        # браузер кодирует кириллицу в пути — маршрут тот же
+        search_url = corpus["search"][0]
+        route = "/search/?" + search_url.split("?", 1)[1].replace(" ", "%20")
+        html = urlopen(srv.base_url + quote(route, safe="/?=&%")).read().decode("utf-8")
+        assert "<script" not in html
+        assert "https://www.ozon.ru" not in html and srv.base_url in html
+
+        modal = urlopen(srv.url_for("modal", PRODUCT_URL)).read().decode("utf-8")
+        assert "webSellerList" in modal
+
+        api_url = f"{srv.base_url}{config.COMPOSER_API_PATH}?{urlencode({'url': corpus['api'][0]})}"
+        with urlopen(api_url) as resp:
+            assert resp.headers["Content-Type"].startswith("application/json")
+            data = json.load(resp)
+        assert data == json.loads(corpus["api"][1])
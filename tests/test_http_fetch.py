@@ -0,0 +1,147 @@
+import json
+from urllib.parse import quote
+
+import pytest
+
+import config
+import fixtures
+import http_fetch
+import ozon_parser
+from fixtures import FixtureServer
+from http_fetch import OzonHttp, ChallengeDetected, NotCached
+from page_cache import PageCache
+from rate_governor import RateGovernor
+from text_parsing import norm_text, delivery_days_from_text
+
+# OzonHttp против fixtures.FixtureServer: записанные ответы composer-api вместо Ozon.
+
+QUERY = "органайзер для кабелей"
+SEARCH_PATH = f"/search/?text={quote(QUERY)}&from_global=true"
+PRODUCT_URL = "https://www.ozon.ru/product/organayzer-dlya-kabeley-123456/"
+CARD_PATH = "/product/organayzer-dlya-kabeley-123456/"
+SELLERS_PATH = config.SELLER_LIST_PATH.format(product_id="123456")
+
+
+def sellers_page(prices, next_page=None):
+    sellers = [
+        {"name": f"Магазин {p}", "link": f"/seller/shop-{p}/", "price": {"price": f"{p} ₽"},
+         "delivery": {"text": "Доставим завтра"}}
+        for p in prices
+    ]
+    data = {"widgetStates": {"webSellerList-3121879-default-1": json.dumps({"sellers": sellers})}}
+    if next_page:
+        data["nextPage"] = next_page
+    return data
+
+
+RESPONSES = {
+    SEARCH_PATH: {"widgetStates": {"searchResultsV2-311178-default-1": json.dumps({"items": [
+        {"action": {"link": "/product/organayzer-dlya-kabeley-123456/?at=abc"}},
+        {"action": {"link": "/product/organayzer-dlya-kabeley-123456/?at=def"}},
+        {"action": {"link": "/product/podstavka-654321/"}},
+    ]})}},
+    CARD_PATH: {"widgetStates": {
+        "webCurrentSeller-1-default-1": json.dumps({"name": "Продавец карточки"}),
+        "webPrice-2-default-1": json.dumps({"cardPrice": "1 099 ₽"}),
+    }},
+    SELLERS_PATH: sellers_page([900, 950], SELLERS_PATH + "&page=2"),
+    SELLERS_PATH + "&page=2": sellers_page([990, 1200], SELLERS_PATH + "&page=3"),
+    # страницы 3 нет: к ней идут, только если не сработал потолок/лимит
+}
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    # свой регулятор в памяти: общий RATE_SHARED_DB и пауза после "проверки" не должны
+    # достаться настоящему обходу
+    monkeypatch.setattr(http_fetch, "GOVERNOR", RateGovernor(rate=1000))
+    fx_dir = tmp_path / "fixtures"
+    (fx_dir / "api").mkdir(parents=True)
+    manifest = []
+    for path, data in RESPONSES.items():
+        name = fixtures.fixture_file("api", path)
+        (fx_dir / name).write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        manifest.append({"kind": "api", "url": path, "file": name})
+    (fx_dir / fixtures.MANIFEST).write_text(json.dumps(manifest), encoding="utf-8")
+    with FixtureServer(str(fx_dir)) as srv:
+        yield srv
+
+
+def parse_card(http):
+    return http.parse_card(PRODUCT_URL, norm_text, delivery_days_from_text)
+
+
+def test_search_json(server):
+    http = OzonHttp([], base_url=server.base_url)
+    assert http.find_top_product_urls(QUERY, 5) == [
+        "https://www.ozon.ru/product/organayzer-dlya-kabeley-123456/",
+        "https://www.ozon.ru/product/podstavka-654321/",
+    ]
+    assert http.find_top_product_urls(QUERY, 1) == ["https://www.ozon.ru/product/organayzer-dlya-kabeley-123456/"]
+    http.close()
+
+
+def test_card_pages_sellers_until_ceiling(server, monkeypatch):
+    monkeypatch.setattr(config, "OFFERS_PRICE_CEILING_RUB", 1000)
+    http = OzonHttp([], base_url=server.base_url)
+    card_shop, card_price, offers = parse_card(http)
+    assert (card_shop, card_price) == ("Продавец карточки", 1099)
+    # вторая страница уже дороже потолка — третью не запрашиваем (её и нет среди записанных)
+    assert [off["offer_price_rub"] for off in offers] == [900, 950, 990, 1200]
+    assert offers[0]["offer_shop_url"] == "https://www.ozon.ru/seller/shop-900/"
+    assert offers[0]["offer_delivery_days"] == 1
+    http.close()
+
+
+def test_card_stops_at_offer_cap(server, monkeypatch):
+    monkeypatch.setattr(config, "OFFERS_MAX_PER_PRODUCT", 2)
+    http = OzonHttp([], base_url=server.base_url)
+    _, _, offers = parse_card(http)
+    assert [off["offer_price_rub"] for off in offers] == [900, 950]
+    http.close()
+
+
+def test_enough_offers(monkeypatch):
+    offers = [{"offer_price_rub": 900}, {"offer_price_rub": None}]
+    assert not OzonHttp.enough_offers(offers)
+    monkeypatch.setattr(config, "OFFERS_MAX_PER_PRODUCT", 2)
+    assert OzonHttp.enough_offers(offers)
+    monkeypatch.setattr(config, "OFFERS_MAX_PER_PRODUCT", None)
+    monkeypatch.setattr(config, "OFFERS_PRICE_CEILING_RUB", 800)
+    assert OzonHttp.enough_offers(offers)
+
+
+def test_challenge_pauses_http_and_falls_back_to_browser(server, monkeypatch):
+    http = OzonHttp([], base_url=server.base_url)
+    # незаписанный путь: сервер отвечает HTML, а не JSON — как страница проверки Ozon
+    with pytest.raises(ChallengeDetected):
+        http.find_top_product_urls("нет такого", 5)
+    assert not http.available
+    with pytest.raises(ChallengeDetected):
+        http.find_top_product_urls(QUERY, 5)  # пауза: в сеть не идём
+
+    visited = []
+    monkeypatch.setattr(ozon_parser, "navigate", lambda page, url, ready: visited.append(url))
+    monkeypatch.setattr(ozon_parser, "extract_product_urls", lambda page, top_n: ["из браузера"])
+    assert ozon_parser.search_page_urls(object(), QUERY, 1, 5, http=http) == ["из браузера"]
+    assert visited == [ozon_parser.search_url_for(QUERY, 1)]
+    http.close()
+
+
+def test_offline_replays_recorded_json(server, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "OFFERS_PRICE_CEILING_RUB", 1000)
+    path = str(tmp_path / "pages.sqlite")
+    cache = PageCache(path)
+    http = OzonHttp([], base_url=server.base_url, cache=cache)
+    online = parse_card(http)
+    http.close()
+    cache.close()
+    server.stop()  # дальше — без сети
+
+    cache = PageCache(path, offline=True)
+    http = OzonHttp([], cache=cache)
+    assert parse_card(http) == online
+    with pytest.raises(NotCached):
+        http.find_top_product_urls(QUERY, 5)
+    cache.close()
+    http.close()
@@ -0,0 +1,159 @@
+import json
+import time
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+from langchain_openai import ChatOpenAI
+
+import config
+import idea_generator
+from idea_generator import LLMCache, generate_all
+
+# generate_all против локального фейкового OpenAI-совместимого сервера:
+# лимит одновременных запросов, 429 с Retry-After и ответы из LLMCache без HTTP.
+
+
+class FakeOpenAI:
+    """POST /v1/chat/completions: каждый ответ — одна идея с seed из промпта."""
+
+    def __init__(self, delay=0.05, rate_limited=0, retry_after="0.05"):
+        self.delay = delay
+        self.rate_limited = rate_limited  # сколько первых запросов получат 429
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.in_flight = 0
+        self.peak = 0
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with fake.lock:
+                    fake.calls += 1
+                    limited = fake.calls <= fake.rate_limited
+                    fake.in_flight += 1
+                    fake.peak = max(fake.peak, fake.in_flight)
+                try:
+                    time.sleep(fake.delay)
+                    if limited:
+                        self.reply(429, {"error": {"message": "rate limit", "type": "requests"}},
+                                   {"Retry-After": fake.retry_after})
+                    else:
+                        self.reply(200, fake.completion(body))
+                finally:
+                    with fake.lock:
+                        fake.in_flight -= 1
+
+            def reply(self, code, obj, headers=None):
+                data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+
+    @staticmethod
+    def completion(body):
+        prompt = body["messages"][-1]["content"]
+        seed = next(line[len("seed: "):] for line in prompt.splitlines() if line.startswith("seed: "))
+        content = json.dumps({"items": [{"title": seed, "query": seed, "description": "", "material_cost_rub": 10}]},
+                             ensure_ascii=False)
+        return {
+            "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def make_server():
+    servers = []
+
+    def make(**kw):
+        servers.append(FakeOpenAI(**kw))
+        return servers[-1]
+
+    yield make
+    for s in servers:
+        s.close()
+
+
+def make_llm(server):
+    return ChatOpenAI(base_url=server.base_url, model="fake-model", api_key="test",
+                      temperature=0.7, max_retries=0)
+
+
+def seeds(n):
+    return [{"seed": f"seed {i}", "material_cost_rub": 10} for i in range(n)]
+
+
+def run(llm, seed_list, cache):
+    return asyncio.run(generate_all(llm, seed_list, cache))
+
+
+def test_concurrency_limit(make_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "LLM_CONCURRENCY", 2)
+    server = make_server(delay=0.1)
+    cache = LLMCache(str(tmp_path / "llm.sqlite"))
+
+    results = run(make_llm(server), seeds(6), cache)
+
+    assert [items[0]["title"] for items in results] == [f"seed {i}" for i in range(6)]
+    assert server.calls == 6
+    assert server.peak == 2
+    cache.close()
+
+
+def test_rate_limit_retry_after(make_server, tmp_path, monkeypatch):
+    # экспоненциальная пауза была бы долгой — тест проходит быстро, только если взят Retry-After
+    monkeypatch.setattr(config, "LLM_BACKOFF_SEC", 30)
+    server = make_server(rate_limited=1, retry_after="0.05")
+    cache = LLMCache(str(tmp_path / "llm.sqlite"))
+    delays = []
+    retry_delay = idea_generator.retry_delay
+    monkeypatch.setattr(idea_generator, "retry_delay", lambda e, attempt: delays.append(retry_delay(e, attempt)) or delays[-1])
+
+    t0 = time.time()
+    results = run(make_llm(server), seeds(1), cache)
+
+    assert results == [[{"title": "seed 0", "query": "seed 0", "description": "", "material_cost_rub": 10}]]
+    assert server.calls == 2
+    assert delays == [0.05]
+    assert time.time() - t0 < 5
+    cache.close()
+
+
+def test_second_run_served_from_cache(make_server, tmp_path):
+    server = make_server()
+    path = str(tmp_path / "llm.sqlite")
+    cache = LLMCache(path)
+    first = run(make_llm(server), seeds(4), cache)
+    cache.close()
+    assert server.calls == 4
+
+    server.close()  # второй запуск не должен ходить в сеть вовсе
+    cache = LLMCache(path)
+    second = run(make_llm(server), seeds(4), cache)
+    assert second == first
+    assert (cache.hits, cache.misses) == (4, 0)
+    assert server.calls == 4
+    cache.close()
@@ -0,0 +1,42 @@
+import os
+import sqlite3
+
+import page_cache
+from page_cache import PageCache
+
+# Счётчик meta.bytes против честной суммы size по blobs при записи, обновлении и вытеснении.
+
+
+def real_bytes(cache):
+    return cache.conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+
+def test_byte_total_follows_puts_and_eviction(tmp_path):
+    cache = PageCache(str(tmp_path / "pages.sqlite"), max_bytes=100_000)
+    for i in range(200):
+        cache.put("card", f"https://www.ozon.ru/product/{i % 80}/", os.urandom(1500).hex())
+        assert cache.total_bytes() == real_bytes(cache) <= 100_000
+
+    # одинаковые страницы — один blob; обновлённая страница не оставляет сироту
+    cache.put("card", "a", "x" * 5000)
+    cache.put("card", "b", "x" * 5000)
+    cache.put("card", "a", "y" * 5000)
+    assert cache.total_bytes() == real_bytes(cache)
+    orphans = cache.conn.execute("SELECT count(*) FROM blobs WHERE sha NOT IN (SELECT sha FROM pages)").fetchone()[0]
+    assert orphans == 0
+    assert cache.get("card", "a") == "y" * 5000
+    cache.close()
+
+
+def test_old_cache_without_counter(tmp_path):
+    path = str(tmp_path / "pages.sqlite")
+    conn = sqlite3.connect(path)
+    conn.executescript(page_cache.SCHEMA.split("CREATE INDEX IF NOT EXISTS pages_sha")[0])
+    conn.execute("INSERT INTO blobs (sha, data, size) VALUES ('orphan', x'00', 7)")
+    conn.commit()
+    conn.close()
+
+    cache = PageCache(path)
+    cache.put("search", "https://www.ozon.ru/search/?text=x", "<html></html>")
+    assert cache.total_bytes() == real_bytes(cache) > 0
+    cache.close()
@@ -0,0 +1,53 @@
+import time
+import asyncio
+import threading
+
+import config
+from rate_governor import RateGovernor
+
+# Регулятор с общим состоянием в SQLite: бюджет один на процессы, event loop не блокируется.
+
+
+def test_async_acquire_does_not_block_event_loop(tmp_path):
+    gov = RateGovernor(rate=1000, shared_path=str(tmp_path / "gov.sqlite"))
+    gov.acquire()  # база создана, соединение этого процесса открыто
+
+    # другой процесс держит транзакцию — в этом процессе то же самое даёт занятый lock
+    held = threading.Event()
+
+    def hold():
+        with gov._state():
+            held.set()
+            time.sleep(0.3)
+
+    ticks = []
+
+    async def ticker():
+        while len(ticks) < 5:
+            ticks.append(time.time())
+            await asyncio.sleep(0.02)
+
+    async def main():
+        t = threading.Thread(target=hold)
+        t.start()
+        held.wait()
+        start = time.time()
+        await asyncio.gather(gov.acquire_async(), ticker())
+        await gov.observe_async(False)
+        t.join()
+        return start
+
+    start = asyncio.run(main())
+    # ticker успел отработать, пока acquire_async ждал занятое состояние
+    assert ticks[-1] - start < 0.25
+    assert gov.counters["requests"] == 2 and gov.counters["successes"] == 1
+
+
+def test_shared_state_between_instances(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "BREAKER_THRESHOLD", 1)
+    path = str(tmp_path / "gov.sqlite")
+    a = RateGovernor(shared_path=path)
+    b = RateGovernor(shared_path=path)
+    a.acquire()
+    a.challenge()
+    assert b._reserve() > 0  # пауза после капчи видна и второму
@@ -0,0 +1,88 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+import text_parsing
+
+# Разбор строк цены и доставки без сети: табличные случаи и совпадение пакетного
+# разбора (parse_prices / delivery_days) с построчным.
+
+# (строка, ожидаемое) — разметка Ozon с тонкими/неразрывными пробелами
+PRICE_CASES = [
+    ("1\u2009234 ₽", 1234),
+    ("12\xa0990\xa0₽", 12990),
+    ("990₽", 990),
+    ("от 1 050 ₽ за шт.", 1050),
+    ("Цена по карте Ozon Банк 2\u202f499 ₽", 2499),
+    ("нет в наличии", None),
+    ("", None),
+]
+REFERENCE_DATE = date(2025, 12, 30)
+DELIVERY_CASES = [
+    ("Доставим сегодня", 0),
+    ("Доставим завтра", 1),
+    ("Доставим 31 декабря", 1),
+    ("Доставим 2\xa0января", 3),
+    ("доставим 30 декабря", 0),
+    ("Доставим 29 февраля", None),  # 2026 — не високосный
+    ("Доставим 5 дней", None),
+    ("", None),
+]
+
+# строки из карточек продавцов записанной модалки "Есть дешевле" (div.pdp_l9b и "Доставим ...")
+MODAL_PRICES = [
+    "1\u2009049\u2009₽ 1\u2009390\u2009₽ −24%",
+    "1\u2009049\u2009₽",
+    "987\u2009₽ с Ozon Картой",
+    "12\u2009490\u2009₽ 15\u2009000\u2009₽",
+    "Нет в наличии",
+]
+MODAL_DELIVERIES = [
+    "Доставим 3 января",
+    "Доставим 3 января",
+    "Доставим завтра, 31 декабря",
+    "Доставим сегодня",
+    "Доставим 14\xa0февраля",
+    "Доставка со склада продавца",
+]
+
+
+def plain(value):
+    return None if pd.isna(value) else value
+
+
+@pytest.mark.parametrize("text, want", PRICE_CASES)
+def test_parse_price_rub(text, want):
+    assert text_parsing.parse_price_rub(text) == want
+
+
+@pytest.mark.parametrize("text, want", DELIVERY_CASES)
+def test_delivery_days_from_text(text, want):
+    assert text_parsing.delivery_days_from_text(text, REFERENCE_DATE) == want
+
+
+def test_parse_prices_matches_scalar():
+    texts = MODAL_PRICES + [t for t, _ in PRICE_CASES] + [None]
+    batch = text_parsing.parse_prices(texts)
+    assert [plain(v) for v in batch] == [text_parsing.parse_price_rub(t) for t in texts]
+
+
+def test_delivery_days_matches_scalar():
+    texts = MODAL_DELIVERIES + [t for t, _ in DELIVERY_CASES] + [None]
+    batch = text_parsing.delivery_days(texts, REFERENCE_DATE)
+    assert [plain(v) for v in batch] == [text_parsing.delivery_days_from_text(t, REFERENCE_DATE) for t in texts]
+
+
+def test_batch_keeps_series_index():
+    s = pd.Series(["990 ₽", "нет"], index=[10, 20])
+    assert list(text_parsing.parse_prices(s).index) == [10, 20]
+
+
+def test_reference_date_is_used_by_default():
+    text_parsing.set_reference_date(REFERENCE_DATE)
+    try:
+        assert text_parsing.delivery_days_from_text("Доставим 2 января") == 3
+        assert plain(text_parsing.delivery_days(["Доставим 2 января"])[0]) == 3
+    finally:
+        text_parsing.set_reference_date()
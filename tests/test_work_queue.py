@@ -0,0 +1,141 @@
+import time
+import multiprocessing as mp
+
+import pytest
+
+import work_queue
+from work_queue import SQLiteWorkQueue
+
+# Очередь под несколькими локальными процессами-воркерами на временной базе SQLite.
+
+WORKERS = 4
+
+
+def open_test_queue(path, **kw):
+    kw.setdefault("lease_sec", 30)
+    kw.setdefault("max_attempts", 3)
+    kw.setdefault("retry_sec", 0)
+    return SQLiteWorkQueue(path, **kw)
+
+
+def worker_main(path, out, fail_url=None, queue_kw=None):
+    """Процесс-воркер: обрабатывает задания, пока они есть, и сообщает (worker, job.id, kind)."""
+    wq = open_test_queue(path, **(queue_kw or {}))
+    name = work_queue.worker_name()
+
+    def handle(job):
+        out.put((name, job.id, job.kind))
+        time.sleep(0.005)  # держим аренду, чтобы воркеры толкались за задания
+        if job.product_url == fail_url:
+            raise RuntimeError("карточка не разбирается")
+        if job.kind == "search":
+            return [f"https://www.ozon.ru/product/{job.idea_id}-{i}/" for i in range(3)]
+        return [{"idea_id": job.idea_id, "product_url": job.product_url}]
+
+    work_queue.run_worker(wq, handle, worker=name, idle_sec=0.02)
+    wq.close()
+
+
+def lease_and_exit(path, queue_kw):
+    """Воркер, который взял задание и упал, не подтвердив его."""
+    wq = open_test_queue(path, **queue_kw)
+    wq.lease(work_queue.worker_name())
+    wq.close()
+
+
+def run_workers(path, n=WORKERS, **kw):
+    out = mp.Queue()
+    procs = [mp.Process(target=worker_main, args=(path, out), kwargs=kw) for _ in range(n)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+        assert p.exitcode == 0
+    handled = []
+    while not out.empty():
+        handled.append(out.get())
+    return handled
+
+
+def test_each_job_leased_once(tmp_path):
+    path = str(tmp_path / "q.sqlite")
+    wq = open_test_queue(path)
+    wq.enqueue_ideas([(i, f"запрос {i}") for i in range(20)])
+
+    handled = run_workers(path)
+
+    ids = [job_id for _, job_id, _ in handled]
+    assert len(ids) == len(set(ids)) == 20 + 20 * 3
+    assert len({name for name, _, _ in handled}) > 1
+    assert wq.counts() == {"search:done": 20, "card:done": 60}
+    ckpt = wq.to_checkpoint()
+    assert len(ckpt.searches) == 20 and len(ckpt.cards) == 60
+    wq.close()
+
+
+def test_expired_lease_is_leased_again(tmp_path):
+    path = str(tmp_path / "q.sqlite")
+    queue_kw = {"lease_sec": 0.2}
+    wq = open_test_queue(path, **queue_kw)
+    wq.enqueue([("card", 1, "q", "https://www.ozon.ru/product/1/")])
+
+    p = mp.Process(target=lease_and_exit, args=(path, queue_kw))
+    p.start()
+    p.join(30)
+    assert wq.counts() == {"card:leased": 1}
+    time.sleep(0.3)
+
+    handled = run_workers(path, queue_kw=queue_kw)
+
+    assert len(handled) == 1
+    assert wq.counts() == {"card:done": 1}
+    assert wq.conn.execute("SELECT attempts FROM jobs").fetchone()[0] == 2
+    wq.close()
+
+
+def test_failing_job_goes_to_dead_letters(tmp_path):
+    path = str(tmp_path / "q.sqlite")
+    bad = "https://www.ozon.ru/product/bad/"
+    wq = open_test_queue(path)
+    wq.enqueue([("card", 1, "q", bad)] + [("card", 1, "q", f"https://www.ozon.ru/product/{i}/") for i in range(10)])
+
+    handled = run_workers(path, fail_url=bad)
+
+    assert sum(1 for _, job_id, _ in handled if job_id == 1) == 3
+    assert wq.counts() == {"card:dead": 1, "card:done": 10}
+    dead = wq.dead_letters()
+    assert [(d["product_url"], d["attempts"]) for d in dead] == [(bad, 3)]
+    assert "не разбирается" in dead[0]["last_error"]
+    wq.close()
+
+
+def test_stale_ack_and_fail_are_ignored(tmp_path):
+    path = str(tmp_path / "q.sqlite")
+    wq = open_test_queue(path, lease_sec=0.1)
+    wq.enqueue([("card", 1, "q", "https://www.ozon.ru/product/1/")])
+
+    stale = wq.lease("A")
+    time.sleep(0.2)
+    fresh = wq.lease("B")
+    assert fresh.id == stale.id and fresh.attempts == 2
+
+    assert wq.fail(stale, "A", RuntimeError("поздно")) is False
+    wq.ack(stale, "A")
+    assert wq.counts() == {"card:leased": 1}
+    assert wq.conn.execute("SELECT worker FROM jobs").fetchone()[0] == "B"
+
+    wq.complete(fresh, "B", [])
+    assert wq.counts() == {"card:done": 1}
+    wq.close()
+
+
+def test_backend_must_implement_interface():
+    with pytest.raises(TypeError):
+        work_queue.WorkQueue()
+
+    class Partial(work_queue.WorkQueue):
+        def enqueue(self, jobs):
+            return 0
+
+    with pytest.raises(TypeError):
+        Partial()
@@ -0,0 +1,134 @@
+import re
+from datetime import date
+from functools import lru_cache
+
+import pandas as pd
+
+# Разбор строк цены и доставки Ozon — один модуль для ozon_parser, drission_page,
+# page_state и HTTP-режима. Регулярки собраны один раз, пробелы нормализуются
+# одним str.translate, "сегодня" берётся из опорной даты запуска, а не date.today()
+# на каждый оффер. Для офлайн-разбора целых колонок — parse_prices/delivery_days.
+
+RU_MONTHS = {
+    "января": 1, "февраля": 2, "марта": 3, "апреля": 4, "мая": 5, "июня": 6,
+    "июля": 7, "августа": 8, "сентября": 9, "октября": 10, "ноября": 11, "декабря": 12
+}
+
+# тонкий и неразрывные пробелы -> обычный
+SPACES = str.maketrans({"\u2009": " ", "\xa0": " ", "\u202f": " "})
+DROP_SPACES = str.maketrans("", "", " \u2009\xa0\u202f")
+
+WS_RE = re.compile(r"\s+")
+PRICE_RE = re.compile(r"(\d[\d\s]*)\s*₽")
+DAY_MONTH_RE = re.compile(r"(\d{1,2})\s+([а-я]+)")
+
+_reference = {"date": None}
+
+
+def set_reference_date(d: date | None = None) -> date:
+    """Опорная дата для "дней до доставки"; по умолчанию — сегодня на момент вызова."""
+    _reference["date"] = d or date.today()
+    return _reference["date"]
+
+
+def reference_date() -> date:
+    return _reference["date"] or set_reference_date()
+
+
+def norm_text(text):
+    if not text:
+        return ""
+    return WS_RE.sub(" ", text).strip()
+
+
+def parse_price_rub(text: str):
+    if not text:
+        return None
+    m = PRICE_RE.search(text.translate(SPACES))
+    if not m:
+        return None
+    return int(m.group(1).translate(DROP_SPACES))
+
+
+@lru_cache(maxsize=1024)
+def days_until(day: int, month: int, today: date):
+    """Дней от today до ближайшего day.month (в этом году или, если прошло, в следующем)."""
+    try:
+        d = date(today.year, month, day)
+        if d < today:
+            d = date(today.year + 1, month, day)
+    except ValueError:
+        return None
+    return (d - today).days
+
+
+def delivery_days_from_text(text: str, today: date | None = None):
+    if not text:
+        return None
+    t = text.lower().translate(SPACES)
+
+    if "сегодня" in t:
+        return 0
+    if "завтра" in t:
+        return 1
+
+    m = DAY_MONTH_RE.search(t)
+    if not m:
+        return None
+
+    mon = RU_MONTHS.get(m.group(2))
+    if not mon:
+        return None
+    return days_until(int(m.group(1)), mon, today or reference_date())
+
+
+# ---------- batch: целая колонка строк за раз ----------
+# В колонке офферов строки сильно повторяются ("Доставим 5 ноября" у сотен продавцов),
+# поэтому разбираем только уникальные значения, векторно через str.extract
+# (на pyarrow-строках, если он установлен), и раскладываем обратно по кодам.
+
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    STRING_DTYPE = "string"
+
+
+def _by_unique(texts, parse) -> pd.Series:
+    codes, uniq = pd.factorize(pd.Series(texts, dtype=object))
+    prepared = pd.Series([str(t).lower().translate(SPACES) for t in uniq], dtype=STRING_DTYPE)
+    parsed = pd.array(parse(prepared), dtype="Int64")
+    out = parsed.take(codes, allow_fill=True)  # код -1 (None/NaN) -> <NA>
+    return pd.Series(out, index=texts.index if isinstance(texts, pd.Series) else None)
+
+
+def _prices(s: pd.Series) -> pd.Series:
+    digits = s.str.extract(PRICE_RE.pattern, expand=False).str.replace(" ", "", regex=False)
+    return pd.to_numeric(digits, errors="coerce")
+
+
+def _delivery_days(s: pd.Series, today: date) -> pd.Series:
+    parts = s.str.extract(DAY_MONTH_RE.pattern)
+    parts.index = range(len(s))
+    day = pd.to_numeric(parts[0], errors="coerce").astype("float64")
+    month = pd.to_numeric(parts[1].astype(object).map(RU_MONTHS), errors="coerce").astype("float64")
+
+    ymd = pd.DataFrame({"year": today.year, "month": month, "day": day})
+    d = pd.to_datetime(ymd, errors="coerce")
+    d = d.where(~(d < pd.Timestamp(today)), pd.to_datetime(ymd.assign(year=today.year + 1), errors="coerce"))
+
+    out = (d - pd.Timestamp(today)).dt.days.astype("Float64")
+    out = out.mask(s.str.contains("завтра", regex=False).fillna(False).to_numpy(), 1)
+    out = out.mask(s.str.contains("сегодня", regex=False).fillna(False).to_numpy(), 0)
+    return out
+
+
+def parse_prices(texts) -> pd.Series:
+    """Колонка сырых строк цены -> Int64 рублей (<NA> там, где цены нет)."""
+    return _by_unique(texts, _prices)
+
+
+def delivery_days(texts, today: date | None = None) -> pd.Series:
+    """Колонка строк "Доставим 5 ноября" / "завтра" -> Int64 дней от опорной даты."""
+    today = today or reference_date()
+    return _by_unique(texts, lambda s: _delivery_days(s, today))
@@ -0,0 +1,168 @@
+import time
+import random
+import asyncio
+import threading
+
+import config
+import rate_governor
+from rate_governor import GOVERNOR, Blocked
+
+# Ожидание готовности страницы по конкретным сигналам вместо random_sleep:
+# появился виджет, перестал расти список ссылок, затихла сеть.
+# Вежливость (пауза между переходами) считается отдельно — Politeness.
+# navigate — переход DrissionPage с регулятором, вежливостью и ожиданием готовности;
+# общий для ozon_parser и drission_page.
+
+PRODUCT_LINKS_JS = "return document.querySelectorAll('a[href*=\"/product/\"]').length;"
+SELLER_CARDS_JS = "return this.querySelectorAll('div.pdp_mb0').length;"
+# карточки продавцов после первых done — в порядке документа (descendant:: считает позицию по всему списку)
+NEW_SELLER_CARDS_XPATH = (
+    "xpath:./descendant::div[contains(concat(' ', normalize-space(@class), ' '), ' pdp_mb0 ')][position() > {done}]"
+)
+
+
+class Politeness:
+    """
+    Минимальный интервал между переходами одной вкладки (ключ — id вкладки).
+    Время загрузки и разбора страницы засчитывается в интервал,
+    поэтому спим только остаток, а не фиксированную паузу сверху.
+    """
+
+    def __init__(self, min_interval=None, jitter=None):
+        self.min_interval = config.POLITENESS_MIN_INTERVAL_SEC if min_interval is None else min_interval
+        self.jitter = config.POLITENESS_JITTER_SEC if jitter is None else jitter
+        self.lock = threading.Lock()
+        self.last = {}
+
+    def delay(self, key):
+        with self.lock:
+            due = self.last.get(key, 0.0) + self.min_interval + random.uniform(0, self.jitter)
+        return due - time.time()
+
+    def mark(self, key):
+        with self.lock:
+            self.last[key] = time.time()
+
+    def wait(self, key):
+        delay = self.delay(key)
+        if delay > 0:
+            time.sleep(delay)
+        self.mark(key)
+
+    async def wait_async(self, key):
+        delay = self.delay(key)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        self.mark(key)
+
+
+POLITENESS = Politeness()  # пауза между переходами navigate — у каждой вкладки своя
+
+
+def navigate(page, url, ready):
+    """
+    Переход через общий регулятор частоты (rate_governor.GOVERNOR) и бюджет вежливости вкладки,
+    затем ready(page). Проверка/капча замедляет весь обход; после CHALLENGE_RETRIES повторов — Blocked.
+    """
+    for attempt in range(config.CHALLENGE_RETRIES + 1):
+        GOVERNOR.acquire()
+        POLITENESS.wait(id(page))
+        try:
+            page.get(url)
+        except Exception:
+            GOVERNOR.error()
+            raise
+        ready(page)
+
+        if not GOVERNOR.observe(rate_governor.drission_challenge(page)):
+            return
+        print(f"Проверка/капча на {url} (попытка {attempt + 1})")
+
+    raise Blocked(url)
+
+def wait_until(check, timeout=None, poll=None):
+    """Опрашивает check() до истинного значения; возвращает его или None по таймауту."""
+    timeout = config.READY_TIMEOUT_SEC if timeout is None else timeout
+    poll = config.READY_POLL_SEC if poll is None else poll
+    end = time.time() + timeout
+    while True:
+        try:
+            v = check()
+        except Exception:
+            v = None
+        if v or time.time() >= end:
+            return v
+        time.sleep(poll)
+
+
+def wait_count_stable(count, min_count=1, timeout=None, stable_polls=2):
+    """Ждёт, пока count() >= min_count и не меняется stable_polls опросов подряд."""
+    state = {"last": -1, "same": 0}
+
+    def check():
+        n = count()
+        if n == state["last"]:
+            state["same"] += 1
+        else:
+            state["last"], state["same"] = n, 0
+        return n >= min_count and state["same"] >= stable_polls
+
+    wait_until(check, timeout)
+    return max(state["last"], 0)
+
+
+# ---------- DrissionPage ----------
+
+def wait_doc(page, timeout=None):
+    try:
+        page.wait.doc_loaded(timeout=config.READY_TIMEOUT_SEC if timeout is None else timeout)
+    except Exception:
+        pass
+
+
+def wait_search_ready(page, min_links=1):
+    """Выдача готова, когда ссылки на товары появились и их число перестало расти."""
+    wait_doc(page)
+    return wait_count_stable(lambda: page.run_js(PRODUCT_LINKS_JS), min_count=min_links)
+
+
+def wait_card_ready(page):
+    """Карточка готова, когда отрисован блок цены (или есть кнопка "Есть дешевле")."""
+    wait_doc(page)
+    return wait_until(lambda: page.ele('css:div[data-widget="webPrice"]', timeout=0)
+                      or page.ele('text:Есть дешевле', timeout=0))
+
+
+def seller_card_count(root):
+    return root.run_js(SELLER_CARDS_JS)
+
+
+def new_seller_cards(root, done):
+    """Только дописанные после "Показать ещё" карточки; уже разобранные не трогаем."""
+    return root.eles(NEW_SELLER_CARDS_XPATH.format(done=done), timeout=0) or []
+
+
+def wait_seller_cards(root):
+    """Список "Есть дешевле" готов, когда в нём появились карточки продавцов."""
+    return wait_until(lambda: root.run_js(SELLER_CARDS_JS))
+
+
+def wait_more_cards(root, prev_count):
+    """После "Показать ещё": ждём, пока карточек станет больше, чем было."""
+    return bool(wait_until(lambda: root.run_js(SELLER_CARDS_JS) > prev_count))
+
+
+# ---------- Playwright ----------
+
+def pw_wait_network_idle(page, timeout=None):
+    try:
+        page.wait_for_load_state("networkidle", timeout=(config.READY_TIMEOUT_SEC if timeout is None else timeout) * 1000)
+    except Exception:
+        pass
+
+
+async def pw_wait_network_idle_async(page, timeout=None):
+    try:
+        await page.wait_for_load_state("networkidle", timeout=(config.READY_TIMEOUT_SEC if timeout is None else timeout) * 1000)
+    except Exception:
+        pass
@@ -0,0 +1,375 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+
+import config
+from checkpoint import Checkpoint
+
+# Очередь заданий обхода для нескольких процессов и машин.
+#   search (idea_id, query)              -> список product_url, по нему ставятся card-задания
+#   card   (idea_id, query, product_url) -> строки выгрузки (ozon_parser.card_rows)
+#
+# Задание выдаётся в аренду (lease) на QUEUE_LEASE_SEC: не подтверждённое за это время
+# (воркер упал, машину выключили) снова выдаётся другому воркеру. Каждая выдача — попытка;
+# после QUEUE_MAX_ATTEMPTS неудач задание уходит в dead (dead letter) и больше не выдаётся.
+# Все шаги идемпотентны: повторная постановка игнорируется, результат — upsert по
+# (idea_id, product_url), поэтому повтор после истёкшей аренды ничего не дублирует.
+#
+# WorkQueue — интерфейс; бэкенд выбирается по QUEUE_URL ("sqlite:///work_queue.sqlite"),
+# другие хранилища добавляются в BACKENDS. SQLite-бэкенд — только для процессов одной
+# машины: WAL держит индекс в общей памяти (-shm), а блокировки на сетевых дисках
+# (NFS, SMB) ненадёжны. Для нескольких машин нужен сетевой бэкенд в BACKENDS.
+#
+#   python ozon_parser.py --enqueue          — поставить идеи из ideas
+#   python ozon_parser.py --worker [...]     — сколько угодно процессов
+#   python ozon_parser.py --export-queue     — выгрузка offers из результатов очереди
+#   python work_queue.py [--dead]            — состояние очереди
+#
+# Задания и результаты принадлежат одному запуску (run_id): повторный --enqueue тех же идей
+# ничего не добавляет. Следующий обход (например, ночной) начинается с
+#   python ozon_parser.py --restart --enqueue
+# — new_run() стирает задания и результаты прошлого запуска и увеличивает run_id. Воркеры
+# прошлого запуска к этому моменту должны быть остановлены.
+
+
+@dataclass
+class Job:
+    id: int
+    kind: str            # "search" | "card"
+    idea_id: int
+    query: str
+    product_url: str     # "" у search
+    attempts: int
+
+
+def job_key(kind, idea_id, product_url=""):
+    return f"{kind}\n{idea_id}\n{product_url}"
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+
+class WorkQueue(ABC):
+    """Интерфейс очереди; complete собран из примитивов, которые реализует бэкенд."""
+
+    @abstractmethod
+    def enqueue(self, jobs):
+        """jobs: [(kind, idea_id, query, product_url)]; уже поставленные игнорируются. -> сколько новых."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def lease(self, worker):
+        """Следующее готовое задание (Job) в аренду worker или None, если готовых нет."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def ack(self, job, worker):
+        """Задание выполнено; ack по аренде, которую уже передали другому, игнорируется."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def fail(self, job, worker, error):
+        raise NotImplementedError
+
+    @abstractmethod
+    def put_result(self, job, result):
+        raise NotImplementedError
+
+    @abstractmethod
+    def pending(self):
+        """Сколько заданий ещё не завершено (готовы, в аренде или ждут повтора)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def counts(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def dead_letters(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def to_checkpoint(self):
+        """Результаты в виде Checkpoint (в памяти) — для ozon_parser.assemble_rows."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_meta(self, key):
+        """Целое из служебной таблицы очереди или None."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def set_meta(self, key, value):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    @abstractmethod
+    def new_run(self):
+        """Забыть задания и результаты текущего запуска и начать следующий. -> новый run_id."""
+        raise NotImplementedError
+
+    def enqueue_ideas(self, ideas):
+        return self.enqueue([("search", idea_id, query, "") for idea_id, query in ideas])
+
+    def run_id(self):
+        """Номер запуска очереди (обхода), с 1."""
+        return self.get_meta("run") or 1
+
+    def history_recorded(self):
+        """Выгрузка этого запуска уже записана в историю цен (--export-queue повторно)."""
+        return self.get_meta("history_run") == self.run_id()
+
+    def mark_history_recorded(self):
+        self.set_meta("history_run", self.run_id())
+
+    def complete(self, job, worker, result):
+        # порядок важен при падении между шагами: результат, потом дочерние задания, потом ack —
+        # незавершённое задание переиграется, а оба первых шага идемпотентны
+        self.put_result(job, result)
+        if job.kind == "search":
+            self.enqueue([("card", job.idea_id, job.query, u) for u in result])
+        self.ack(job, worker)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    idea_id INTEGER NOT NULL,
+    query TEXT NOT NULL,
+    product_url TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'ready',  -- ready | leased | done | dead
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL DEFAULT 0, -- ready: не раньше; leased: конец аренды
+    worker TEXT,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, available_at);
+CREATE TABLE IF NOT EXISTS searches (
+    idea_id INTEGER PRIMARY KEY,
+    product_urls TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cards (
+    idea_id INTEGER NOT NULL,
+    product_url TEXT NOT NULL,
+    rows TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (idea_id, product_url)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    Одна база SQLite на всех воркеров одной машины (WAL не работает на сетевых дисках).
+    Выдача — в транзакции BEGIN IMMEDIATE, поэтому одно задание не достаётся двоим.
+    """
+
+    def __init__(self, path, lease_sec=None, max_attempts=None, retry_sec=None):
+        self.path = path
+        self.lease_sec = lease_sec or config.QUEUE_LEASE_SEC
+        self.max_attempts = max_attempts or config.QUEUE_MAX_ATTEMPTS
+        self.retry_sec = config.QUEUE_RETRY_SEC if retry_sec is None else retry_sec
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def _tx(self, fn):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn(self.conn)
+            except:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            return out
+
+    def enqueue(self, jobs):
+        def tx(c):
+            before = c.total_changes
+            c.executemany(
+                "INSERT OR IGNORE INTO jobs (key, kind, idea_id, query, product_url) VALUES (?, ?, ?, ?, ?)",
+                [(job_key(k, i, u), k, i, q, u) for k, i, q, u in jobs],
+            )
+            return c.total_changes - before
+        return self._tx(tx)
+
+    def lease(self, worker):
+        def tx(c):
+            now = time.time()
+            # аренда истекла на последней попытке — в dead, не выдаём
+            c.execute(
+                "UPDATE jobs SET state = 'dead', last_error = coalesce(last_error, 'lease expired') "
+                "WHERE state = 'leased' AND available_at < ? AND attempts >= ?",
+                (now, self.max_attempts),
+            )
+            # сначала карточки: поиск без обработки своих карточек только растит очередь
+            row = c.execute(
+                "SELECT id, kind, idea_id, query, product_url, attempts FROM jobs "
+                "WHERE state IN ('ready', 'leased') AND available_at <= ? "
+                "ORDER BY kind = 'search', id LIMIT 1",
+                (now,),
+            ).fetchone()
+            if not row:
+                return None
+            c.execute(
+                "UPDATE jobs SET state = 'leased', attempts = attempts + 1, available_at = ?, worker = ? WHERE id = ?",
+                (now + self.lease_sec, worker, row[0]),
+            )
+            return Job(*row[:5], attempts=row[5] + 1)
+        return self._tx(tx)
+
+    def ack(self, job, worker):
+        # аренда истекла и задание уже у другого воркера — его результат тот же, ack за ним
+        self._tx(lambda c: c.execute(
+            "UPDATE jobs SET state = 'done', worker = NULL WHERE id = ? AND state = 'leased' AND worker = ?",
+            (job.id, worker),
+        ))
+
+    def fail(self, job, worker, error):
+        def tx(c):
+            dead = job.attempts >= self.max_attempts
+            # аренду могли уже передать другому — тогда это не наша неудача
+            cur = c.execute(
+                "UPDATE jobs SET state = ?, available_at = ?, worker = NULL, last_error = ? "
+                "WHERE id = ? AND state = 'leased' AND worker = ?",
+                ("dead" if dead else "ready", time.time() + self.retry_sec * job.attempts,
+                 str(error)[:500], job.id, worker),
+            )
+            return dead and cur.rowcount > 0
+        return self._tx(tx)
+
+    def put_result(self, job, result):
+        def tx(c):
+            if job.kind == "search":
+                c.execute(
+                    "INSERT INTO searches (idea_id, product_urls) VALUES (?, ?) "
+                    "ON CONFLICT (idea_id) DO UPDATE SET product_urls = excluded.product_urls",
+                    (job.idea_id, json.dumps(result, ensure_ascii=False)),
+                )
+            else:
+                c.execute(
+                    "INSERT INTO cards (idea_id, product_url, rows, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (idea_id, product_url) DO UPDATE SET rows = excluded.rows, updated_at = excluded.updated_at",
+                    (job.idea_id, job.product_url, json.dumps(result, ensure_ascii=False), time.time()),
+                )
+        self._tx(tx)
+
+    def pending(self):
+        with self.lock:
+            return self.conn.execute("SELECT count(*) FROM jobs WHERE state IN ('ready', 'leased')").fetchone()[0]
+
+    def counts(self):
+        with self.lock:
+            rows = self.conn.execute("SELECT kind, state, count(*) FROM jobs GROUP BY kind, state").fetchall()
+        return {f"{kind}:{state}": n for kind, state, n in rows}
+
+    def dead_letters(self):
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT kind, idea_id, query, product_url, attempts, last_error FROM jobs WHERE state = 'dead' ORDER BY id"
+            ).fetchall()
+        return [dict(zip(("kind", "idea_id", "query", "product_url", "attempts", "last_error"), r)) for r in rows]
+
+    def to_checkpoint(self):
+        ckpt = Checkpoint()
+        with self.lock:
+            for idea_id, urls in self.conn.execute("SELECT idea_id, product_urls FROM searches"):
+                ckpt.searches[idea_id] = json.loads(urls)
+            for idea_id, url, rows in self.conn.execute("SELECT idea_id, product_url, rows FROM cards"):
+                ckpt.cards[(idea_id, url)] = json.loads(rows)
+        return ckpt
+
+    def new_run(self):
+        def tx(c):
+            run = (c.execute("SELECT value FROM meta WHERE key = 'run'").fetchone() or (1,))[0] + 1
+            c.execute("DELETE FROM jobs")
+            c.execute("DELETE FROM searches")
+            c.execute("DELETE FROM cards")
+            c.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('run', ?)", (run,))
+            return run
+        return self._tx(tx)
+
+    def get_meta(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        self._tx(lambda c: c.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)))
+
+    def close(self):
+        self.conn.close()
+
+
+BACKENDS = {"sqlite": SQLiteWorkQueue}
+
+
+def open_queue(url=None):
+    """QUEUE_URL вида "<бэкенд>://<адрес>": sqlite:///work_queue.sqlite -> SQLiteWorkQueue("work_queue.sqlite")."""
+    url = url or config.QUEUE_URL
+    scheme, _, rest = url.partition("://")
+    if scheme not in BACKENDS:
+        raise ValueError(f"неизвестный бэкенд очереди: {scheme}")
+    return BACKENDS[scheme](rest[1:] if rest.startswith("/") else rest)
+
+
+def run_worker(wq, handle, worker=None, idle_sec=None, stop=None):
+    """
+    Берёт задания, пока они есть: handle(job) -> результат (список URL / строки выгрузки).
+    Если готовых нет, но часть ещё в аренде у других — ждёт (карточки от их поиска,
+    повторы после истечения аренды). Выход — когда незавершённых не осталось.
+    """
+    worker = worker or worker_name()
+    idle_sec = config.QUEUE_IDLE_SEC if idle_sec is None else idle_sec
+    done = 0
+    while not (stop and stop.is_set()):
+        job = wq.lease(worker)
+        if job is None:
+            if not wq.pending():
+                break
+            time.sleep(idle_sec)
+            continue
+        try:
+            result = handle(job)
+        except Exception as e:
+            dead = wq.fail(job, worker, e)
+            print(f"[{job.idea_id}] ошибка {job.kind} (попытка {job.attempts}{', в dead' if dead else ''}): {e}")
+            continue
+        wq.complete(job, worker, result)
+        done += 1
+    return done
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--queue", default=config.QUEUE_URL)
+    ap.add_argument("--dead", action="store_true", help="показать задания в dead")
+    args = ap.parse_args()
+
+    wq = open_queue(args.queue)
+    print(f"запуск {wq.run_id()}: {wq.counts()}")
+    if args.dead:
+        for d in wq.dead_letters():
+            print(d)
+    wq.close()
+
+
+if __name__ == "__main__":
+    main()